@@ -0,0 +1,72 @@
+"""
+Time preparing every glyph for a BoardTiles request.
+
+Compares the per-point Python loop Brain.process_letter_points used to run
+over the 'xlist'/'ylist' dictionaries with the array-backed glyphs from the
+glyph atlas, for all 31 characters.
+
+Run with ``python3 benchmarks/bench_letter_points.py`` from a sourced
+workspace.
+"""
+
+import tempfile
+import timeit
+
+from drawing.glyph_atlas import LETTERS, load_glyph_atlas
+
+
+def legacy_process_letter_points(xcoord, ycoord):
+    """Process a letter with the loop Brain used before the glyph atlas."""
+    board_x = []
+    board_y = []
+    board_bool = []
+    for i in range(0, len(xcoord)):
+        if not (0.0001 > xcoord[i] > -0.0001) \
+                or not (0.0001 > ycoord[i] > 0.0001):
+            board_x.append(xcoord[i])
+            board_y.append(ycoord[i])
+            board_bool.append(True)
+        elif i != len(xcoord):
+            board_x.append(xcoord[i+1])
+            board_y.append(ycoord[i+1])
+            board_bool.append(False)
+        else:
+            board_x.append(xcoord[i])
+            board_y.append(ycoord[i])
+            board_bool.append(False)
+    return board_x, board_y, board_bool
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        atlas = load_glyph_atlas(cache_dir=cache_dir)
+
+    legacy = {letter: {'xlist': atlas[letter].x.tolist(),
+                       'ylist': atlas[letter].y.tolist()}
+              for letter in LETTERS}
+
+    # the old loop never lifted the pen, so only the points are compared
+    for letter in LETTERS:
+        x, y, _ = atlas[letter].tile_arrays()
+        assert (list(x), list(y)) == legacy_process_letter_points(
+            legacy[letter]['xlist'], legacy[letter]['ylist'])[:2]
+
+    def run_legacy():
+        for letter in LETTERS:
+            legacy_process_letter_points(
+                legacy[letter]['xlist'], legacy[letter]['ylist'])
+
+    def run_arrays():
+        for letter in LETTERS:
+            atlas[letter].tile_arrays()
+
+    points = sum(len(atlas[letter]) for letter in LETTERS)
+    print(f"{len(LETTERS)} glyphs, {points} points")
+    for name, func in (('python loop', run_legacy), ('arrays', run_arrays)):
+        number, _ = timeit.Timer(func).autorange()
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{name:>12}: {best * 1e6:9.1f} us per alphabet")
+
+
+if __name__ == '__main__':
+    main()
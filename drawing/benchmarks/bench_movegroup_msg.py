@@ -0,0 +1,149 @@
+"""
+Profile building the MoveGroup goal of one plan.
+
+Compares the way Path_Plan_Execute.create_movegroup_msg used to build every
+goal from scratch, reading the clock for every header, with patching the
+prebuilt goal from movegroup_goal_template. For each it reports the time
+and, with tracemalloc, the peak memory allocated while building the goal of
+one plan and the number of new blocks it leaves allocated.
+
+Run with ``python3 benchmarks/bench_movegroup_msg.py`` from a sourced
+workspace.
+"""
+
+import timeit
+import tracemalloc
+
+from drawing.path_plan_execute import (movegroup_goal_template,
+                                       patch_movegroup_goal)
+from geometry_msgs.msg import Quaternion, Vector3
+from moveit_msgs.action import MoveGroup
+from moveit_msgs.msg import (Constraints, JointConstraint,
+                             MotionPlanRequest, OrientationConstraint,
+                             PlanningOptions, PlanningScene, RobotState,
+                             WorkspaceParameters)
+from rclpy.clock import Clock, ClockType
+from sensor_msgs.msg import JointState
+from std_msgs.msg import Header
+
+FRAME_ID = 'panda_link0'
+GROUP_NAME = 'panda_manipulator'
+ROBOT_NAME = 'panda'
+JOINT_NAMES = [f'panda_joint{i}' for i in range(1, 8)]
+
+
+def legacy_goal(clock, start_state, goal_joint_state):
+    """Build a goal the way create_movegroup_msg did before the template."""
+    movegroup_goal_msg = MoveGroup.Goal()
+    movegroup_goal_msg.request = MotionPlanRequest(
+        reference_trajectories=[],
+        pipeline_id='move_group',
+        planner_id='',
+        group_name=GROUP_NAME,
+        num_planning_attempts=10,
+        allowed_planning_time=5.0,
+        max_velocity_scaling_factor=0.1,
+        max_acceleration_scaling_factor=0.1,
+        max_cartesian_speed=0.0
+    )
+    movegroup_goal_msg.request.workspace_parameters = WorkspaceParameters(
+        header=Header(stamp=clock.now().to_msg(), frame_id=FRAME_ID),
+        min_corner=Vector3(x=-1.0, y=-1.0, z=-1.0),
+        max_corner=Vector3(x=1.0, y=1.0, z=1.0))
+    movegroup_goal_msg.request.start_state = RobotState(
+        joint_state=JointState(
+            header=Header(stamp=clock.now().to_msg(), frame_id=FRAME_ID),
+            name=start_state.name,
+            position=start_state.position,
+            velocity=start_state.velocity,
+            effort=start_state.effort))
+
+    joint_constraints = []
+    for i, joint_state_name in enumerate(goal_joint_state.name):
+        joint_constraint = JointConstraint()
+        joint_constraint.joint_name = joint_state_name
+        joint_constraint.position = goal_joint_state.position[i]
+        joint_constraint.tolerance_above = 0.05
+        joint_constraint.tolerance_below = 0.05
+        joint_constraint.weight = 1.0
+        joint_constraints.append(joint_constraint)
+    movegroup_goal_msg.request.goal_constraints = [
+        Constraints(name='goal_constraints',
+                    joint_constraints=joint_constraints)]
+
+    orientation_constraint = OrientationConstraint()
+    orientation_constraint.header = Header(stamp=clock.now().to_msg())
+    orientation_constraint.orientation = Quaternion(
+        x=1.0, y=0.0, z=0.0, w=0.0)
+    orientation_constraint.link_name = 'panda_hand_tcp'
+    orientation_constraint.absolute_x_axis_tolerance = 0.1
+    orientation_constraint.absolute_y_axis_tolerance = 0.1
+    orientation_constraint.absolute_z_axis_tolerance = 0.1
+    orientation_constraint.weight = 1.0
+    constraints = Constraints()
+    constraints.orientation_constraints = [orientation_constraint]
+    movegroup_goal_msg.request.trajectory_constraints.constraints = [
+        Constraints(name='', orientation_constraints=[orientation_constraint])]
+
+    movegroup_goal_msg.planning_options = PlanningOptions(
+        planning_scene_diff=PlanningScene(
+            robot_state=RobotState(
+                joint_state=JointState(
+                    header=Header(stamp=clock.now().to_msg())),
+                is_diff=True),
+            robot_model_name=ROBOT_NAME),
+        plan_only=True,
+        look_around=False,
+        look_around_attempts=0,
+        max_safe_execution_cost=0.0,
+        replan=False)
+    return movegroup_goal_msg
+
+
+def allocations(build, count=100):
+    """Return the peak bytes and the blocks allocated by one build."""
+    tracemalloc.start()
+    peak = 0
+    for _ in range(count):
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        goal = build()
+        _, top = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        peak = max(peak, top - start)
+        del goal
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff
+                 for stat in after.compare_to(before, 'filename')
+                 if stat.count_diff > 0)
+    return peak, blocks
+
+
+def main():
+    clock = Clock(clock_type=ClockType.SYSTEM_TIME)
+    start_state = JointState(
+        name=JOINT_NAMES + ['panda_finger_joint1', 'panda_finger_joint2'],
+        position=[0.0, -0.785, 0.0, -2.356, 0.0, 1.571, 0.785, 0.04, 0.04],
+        velocity=[0.0] * 9, effort=[0.0] * 9)
+    goal_joint_state = JointState(
+        name=JOINT_NAMES,
+        position=[0.1, -0.5, 0.0, -2.0, 0.0, 1.5, 0.785])
+    template = movegroup_goal_template(FRAME_ID, GROUP_NAME, ROBOT_NAME)
+
+    builders = (
+        ('rebuilt', lambda: legacy_goal(clock, start_state,
+                                        goal_joint_state)),
+        ('template', lambda: patch_movegroup_goal(
+            template, clock.now().to_msg(), start_state, goal_joint_state)),
+    )
+    for name, build in builders:
+        number, _ = timeit.Timer(build).autorange()
+        best = min(timeit.repeat(build, number=number, repeat=5)) / number
+        peak, blocks = allocations(build)
+        print(f"{name:>10}: {best * 1e6:8.1f} us, {peak:8d} B peak, "
+              f"{blocks:5d} new blocks per plan")
+
+
+if __name__ == '__main__':
+    main()
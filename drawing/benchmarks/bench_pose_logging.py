@@ -0,0 +1,81 @@
+"""
+Time where_to_write with pose dumps switched on and off.
+
+Each run computes the poses of one request the way Tags.tile_poses does and
+then logs them in one of three ways: the per-point loop Tags used to run,
+which formatted the whole growing pose list at info level for every
+waypoint, a PoseDump with log_pose_dumps switched on and the logger at debug
+level, and a PoseDump with dumps switched off.
+
+Run with ``python3 benchmarks/bench_pose_logging.py 2>/dev/null`` from a
+sourced workspace, so the dumps themselves do not flood the terminal.
+"""
+
+import timeit
+
+from drawing.grid import transform_stack, transforms_to_poses
+from drawing.pose_logging import PoseDump
+from drawing.tags import PEN_ROTATION
+import numpy as np
+import rclpy.logging
+from rclpy.logging import LoggingSeverity
+
+
+def tile_poses(Trl, xs, ys, onboard):
+    """Compute the poses of one request with one batched transform."""
+    translations = np.empty((len(xs), 3))
+    translations[:, 0] = xs
+    translations[:, 1] = ys
+    translations[:, 2] = np.where(onboard, 0.004, 0.1)
+    return transforms_to_poses(
+        transform_stack(Trl, PEN_ROTATION, translations))
+
+
+def legacy_logging(logger, poses):
+    """Log the poses with the loop Tags used before pose dumps."""
+    for i, pos in enumerate(poses):
+        logger.info(f"pose is: {pos}")
+        logger.info(f"Now the list is: {poses[:i + 1]}")
+
+
+def main():
+    rng = np.random.default_rng(0)
+    Trl = np.eye(4)
+    Trl[:3, 3] = [0.5, 0.1, 0.3]
+
+    logger = rclpy.logging.get_logger('bench_pose_logging')
+    logger.set_level(LoggingSeverity.DEBUG)
+    dumps_on = PoseDump(logger, enabled=True)
+    dumps_off = PoseDump(logger, enabled=False)
+
+    def legacy(poses):
+        legacy_logging(logger, poses)
+
+    def enabled(poses):
+        dumps_on("pose list", poses)
+
+    def disabled(poses):
+        dumps_off("pose list", poses)
+
+    for count in (10, 100, 1000):
+        xs = rng.uniform(0.0, 0.1, count).tolist()
+        ys = rng.uniform(0.0, 0.1, count).tolist()
+        onboard = (rng.uniform(size=count) > 0.1).tolist()
+
+        print(f"{count} waypoints")
+        for name, log in (('per point', legacy), ('dumps on', enabled),
+                          ('dumps off', disabled)):
+            # the per point loop is quadratic, so keep it short at 1000
+            if name == 'per point' and count > 100:
+                print(f"{name:>12}: {'skipped':>10}")
+                continue
+
+            def run():
+                log(tile_poses(Trl, xs, ys, onboard))
+            number, _ = timeit.Timer(run).autorange()
+            best = min(timeit.repeat(run, number=number, repeat=3)) / number
+            print(f"{name:>12}: {best * 1e3:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Time handing a 500-point trajectory from Drawing to the executor.
+
+Compares three ways of getting a planned trajectory to the point where the
+executor publishes it one point at a time:
+
+  + split: the old execute_individual_trajectories loop, building a message
+    for every point, serializing the request and publishing every message.
+  + split lazily: the same request, built from a CompactTrajectory.
+  + whole: sending the planned trajectory as one message, and letting the
+    executor build each point message from a CompactTrajectory as it goes.
+
+Run with ``python3 benchmarks/bench_trajectory_split.py`` from a sourced
+workspace.
+"""
+
+import timeit
+
+from brain_interfaces.srv import ExecuteJointTrajectories
+from drawing.trajectory import CompactTrajectory
+import numpy as np
+from rclpy.serialization import deserialize_message, serialize_message
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+
+JOINT_NAMES = [f'panda_joint{i}' for i in range(1, 8)]
+
+
+def planned_trajectory(count):
+    """Return a JointTrajectory like the planners return."""
+    rng = np.random.default_rng(0)
+    return JointTrajectory(
+        joint_names=JOINT_NAMES,
+        points=[JointTrajectoryPoint(
+            positions=rng.uniform(-1.0, 1.0, 7).tolist(),
+            velocities=rng.uniform(-0.1, 0.1, 7).tolist(),
+            accelerations=rng.uniform(-0.1, 0.1, 7).tolist())
+            for _ in range(count)])
+
+
+def legacy_split(joint_trajectory):
+    """Split a trajectory the way execute_individual_trajectories used to."""
+    joint_trajectories = []
+    for point in joint_trajectory.points:
+        temp = JointTrajectoryPoint()
+        temp.positions = point.positions
+        temp.velocities = point.velocities
+        temp.accelerations = point.accelerations
+        temp.effort = point.effort
+        temp.time_from_start.nanosec = 100000000  # 0.1 seconds
+        split = JointTrajectory()
+        split.joint_names = joint_trajectory.joint_names
+        split.points = [temp]
+        joint_trajectories.append(split)
+    return joint_trajectories
+
+
+def hand_over(joint_trajectories):
+    """Send a request through serialization, and publish every point."""
+    request = ExecuteJointTrajectories.Request(
+        joint_trajectories=joint_trajectories)
+    received = deserialize_message(serialize_message(request),
+                                   ExecuteJointTrajectories.Request)
+    queue = CompactTrajectory.from_msgs(received.joint_trajectories)
+    while queue:
+        serialize_message(queue.pop(0))
+
+
+def main():
+    joint_trajectory = planned_trajectory(500)
+    runs = (
+        ('split', lambda: hand_over(legacy_split(joint_trajectory))),
+        ('split lazily', lambda: hand_over(
+            list(CompactTrajectory.from_msgs([joint_trajectory])))),
+        ('whole', lambda: hand_over([joint_trajectory])),
+    )
+
+    print("500 points")
+    for name, run in runs:
+        number, _ = timeit.Timer(run).autorange()
+        best = min(timeit.repeat(run, number=number, repeat=5)) / number
+        print(f"{name:>14}: {best * 1e3:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
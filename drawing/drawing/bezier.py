@@ -0,0 +1,149 @@
+"""
+Flatten font outlines into polylines the pen can follow.
+
+TextToPath returns the outline of a character as vertices and matplotlib
+path codes. Quadratic and cubic segments carry off-curve control points, so
+the vertices cannot be drawn as they are. The curves are flattened here
+with vectorized De Casteljau evaluation, using as many samples as Wang's
+formula says are needed to stay within a tolerance of the true curve, and
+every MOVETO starts a new contour so the pen can be lifted between them.
+
+The codes match matplotlib.path.Path, but are defined here so flattening a
+path does not need matplotlib to be imported.
+"""
+
+import numpy as np
+
+STOP = 0
+MOVETO = 1
+LINETO = 2
+CURVE3 = 3
+CURVE4 = 4
+CLOSEPOLY = 79
+
+
+def de_casteljau(control_points, t):
+    """
+    Evaluate a Bezier curve at many parameters at once.
+
+    Args
+    ----
+    control_points (numpy array): A (K, 2) array of control points.
+    t (numpy array): The N curve parameters to evaluate, in [0, 1].
+
+    Returns
+    -------
+    points (numpy array): The (N, 2) points on the curve.
+
+    """
+    t = np.asarray(t, dtype=float)[:, None, None]
+    points = np.broadcast_to(
+        control_points, (len(t),) + control_points.shape)
+    while points.shape[1] > 1:
+        points = points[:, :-1] + t * (points[:, 1:] - points[:, :-1])
+    return points[:, 0]
+
+
+def segment_count(control_points, tolerance):
+    """
+    Return how many line segments a Bezier curve should be split into.
+
+    Uses Wang's formula, which bounds the distance between the curve and
+    its uniformly sampled polyline by the largest second difference of the
+    control points.
+
+    Args
+    ----
+    control_points (numpy array): A (K, 2) array of control points.
+    tolerance (float): The largest allowed distance from the curve.
+
+    Returns
+    -------
+    count (int): The number of segments, at least 1.
+
+    """
+    degree = len(control_points) - 1
+    if degree < 2 or tolerance <= 0.0:
+        return 1
+    second = control_points[:-2] - 2 * control_points[1:-1] + \
+        control_points[2:]
+    largest = np.max(np.hypot(second[:, 0], second[:, 1]))
+    scale = degree * (degree - 1) / 8
+    return max(1, int(np.ceil(np.sqrt(scale * largest / tolerance))))
+
+
+def flatten_curve(control_points, tolerance):
+    """
+    Flatten one Bezier curve.
+
+    Args
+    ----
+    control_points (numpy array): A (K, 2) array of control points.
+    tolerance (float): The largest allowed distance from the curve.
+
+    Returns
+    -------
+    points (numpy array): The sampled points, excluding the first control
+    point, which the caller already has.
+
+    """
+    count = segment_count(control_points, tolerance)
+    t = np.arange(1, count + 1) / count
+    return de_casteljau(control_points, t)
+
+
+def flatten_path(vertices, codes, tolerance):
+    """
+    Flatten a matplotlib path into its contours.
+
+    Args
+    ----
+    vertices (numpy array): The (N, 2) vertices of the path.
+    codes (sequence): The N path codes.
+    tolerance (float): The largest allowed distance from the curves, in
+    the same units as the vertices.
+
+    Returns
+    -------
+    contours (list): One (M, 2) array of points per contour.
+
+    """
+    vertices = np.asarray(vertices, dtype=float)
+    codes = np.asarray(codes)
+    contours = []
+    current = []
+    pen = None
+
+    def finish():
+        if len(current) > 1:
+            contours.append(np.concatenate(current))
+
+    i = 0
+    while i < len(codes):
+        code = codes[i]
+        if code == MOVETO:
+            finish()
+            pen = vertices[i]
+            current = [pen[None]]
+            i += 1
+        elif code == LINETO:
+            pen = vertices[i]
+            current.append(pen[None])
+            i += 1
+        elif code in (CURVE3, CURVE4):
+            degree = code - 1
+            control_points = np.vstack((pen, vertices[i:i + degree]))
+            current.append(flatten_curve(control_points, tolerance))
+            pen = vertices[i + degree - 1]
+            i += degree
+        elif code == CLOSEPOLY:
+            if current and np.any(pen != current[0][0]):
+                pen = current[0][0]
+                current.append(pen[None])
+            i += 1
+        elif code == STOP:
+            break
+        else:
+            raise ValueError(f"Unknown path code {code}")
+    finish()
+    return contours
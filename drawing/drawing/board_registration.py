@@ -0,0 +1,224 @@
+"""
+Place the board from every AprilTag on it that the camera can see.
+
+Every tag is stuck to the board at a known offset, so each averaged tag pose
+gives its own estimate of where the board is. BoardRegistration fuses them
+into one board frame, in the least-squares sense:
+
+  + the rotation is the weighted average of the rotations the tags give,
+    which minimizes the sum of squared chordal distances to them.
+  + the origin is then the weighted mean of the origins the tags give,
+    which minimizes the sum of squared distances between where the tags
+    are seen and where the board puts them.
+
+The residual is the weighted root mean square of those distances. It is 0
+for a single tag, and grows when the tags disagree. The same measure, for
+an existing board frame and a fresh set of tag poses, tells how far the
+board has drifted since it was registered.
+
+BoardFrame holds the registered board frame and its inverse, worked out
+once whenever the board moves, and converts points between the robot base
+frame and the board frame in batches. Lists of poses are converted through
+their positions, stacked with grid.pose_positions. Their orientations pass
+through unchanged: poses are only ever moved along the board normal, which
+does not turn them.
+
+Quaternions are x, y, z, w, the order TF uses.
+"""
+
+import numpy as np
+import transforms3d as tf
+
+from drawing.calibration import average_quaternions
+
+
+class BoardRegistration:
+    """Where the board is, from the poses of the tags on it."""
+
+    def __init__(self, tag_offsets):
+        """
+        Initialize the registration.
+
+        Args
+        ----
+        tag_offsets (dict): The x, y position of the board origin in the
+        frame of each tag on the board, by tag frame. The tags are taken to
+        lie flat on the board, lined up with it.
+
+        Returns
+        -------
+        None
+
+        """
+        # the position of every tag in the board frame
+        self.tag_positions = {
+            tag: -np.array([x, y, 0.0]) for tag, (x, y) in tag_offsets.items()}
+
+    @property
+    def tags(self):
+        """The frames of the tags on the board."""
+        return list(self.tag_positions)
+
+    def register(self, observations):
+        """
+        Fuse tag poses into one board frame.
+
+        Args
+        ----
+        observations (dict): The position, quaternion and weight of each
+        tag seen, in the robot base frame, by tag frame. Tags that are not
+        on the board are ignored.
+
+        Returns
+        -------
+        board (numpy array): The 4x4 transform of the board in the robot
+        base frame, or None if no tag on the board was seen.
+        residual (float): How far, in m, the tags are from where the board
+        puts them, or inf if no tag on the board was seen.
+
+        """
+        seen = [tag for tag in observations if tag in self.tag_positions]
+        if not seen:
+            return None, np.inf
+
+        positions = np.array([observations[tag][0] for tag in seen])
+        quaternions = np.array([observations[tag][1] for tag in seen])
+        weights = np.array([observations[tag][2] for tag in seen],
+                           dtype=float)
+        offsets = np.array([self.tag_positions[tag] for tag in seen])
+
+        # the tags lie flat on the board, so each one has the rotation of
+        # the board
+        rotation = tf.quaternions.quat2mat(
+            np.roll(average_quaternions(quaternions, weights), 1))
+        origins = positions - offsets @ rotation.T
+        board = np.eye(4)
+        board[:3, :3] = rotation
+        board[:3, 3] = np.average(origins, axis=0, weights=weights)
+
+        return board, self.residual(board, observations)
+
+    def residual(self, board, observations):
+        """
+        Measure how well a board frame agrees with tag poses.
+
+        Args
+        ----
+        board (numpy array): The 4x4 transform of the board in the robot
+        base frame.
+        observations (dict): The position, quaternion and weight of each
+        tag seen, by tag frame.
+
+        Returns
+        -------
+        residual (float): The weighted root mean square distance, in m,
+        between where the tags are seen and where the board puts them, or
+        inf if no tag on the board was seen.
+
+        """
+        seen = [tag for tag in observations if tag in self.tag_positions]
+        if not seen:
+            return np.inf
+        positions = np.array([observations[tag][0] for tag in seen])
+        weights = np.array([observations[tag][2] for tag in seen],
+                           dtype=float)
+        offsets = np.array([self.tag_positions[tag] for tag in seen])
+
+        predicted = offsets @ board[:3, :3].T + board[:3, 3]
+        errors = np.sum((positions - predicted) ** 2, axis=1)
+        return float(np.sqrt(np.average(errors, weights=weights)))
+
+
+class BoardFrame:
+    """
+    The board frame in the robot base frame, and its inverse.
+
+    Only positions are converted; orientations pass through unchanged.
+    """
+
+    def __init__(self, matrix=None):
+        """
+        Initialize the frame.
+
+        Args
+        ----
+        matrix (numpy array): The 4x4 transform of the board in the robot
+        base frame. Defaults to the identity.
+
+        Returns
+        -------
+        None
+
+        """
+        self.set(np.eye(4) if matrix is None else matrix)
+
+    def set(self, matrix):
+        """
+        Move the board, and work out the inverse transform once.
+
+        Args
+        ----
+        matrix (numpy array): The 4x4 transform of the board in the robot
+        base frame.
+
+        Returns
+        -------
+        None
+
+        """
+        self.matrix = np.array(matrix, dtype=float)
+        rotation = self.matrix[:3, :3]
+        self.inverse = np.eye(4)
+        self.inverse[:3, :3] = rotation.T
+        self.inverse[:3, 3] = -rotation.T @ self.matrix[:3, 3]
+
+    def to_board(self, points):
+        """
+        Express points given in the robot base frame in the board frame.
+
+        Args
+        ----
+        points (numpy array): The (N, 3) points in the robot base frame.
+
+        Returns
+        -------
+        points (numpy array): The (N, 3) points in the board frame.
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return points @ self.inverse[:3, :3].T + self.inverse[:3, 3]
+
+    def from_board(self, points):
+        """
+        Express points given in the board frame in the robot base frame.
+
+        Args
+        ----
+        points (numpy array): The (N, 3) points in the board frame.
+
+        Returns
+        -------
+        points (numpy array): The (N, 3) points in the robot base frame.
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return points @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+
+    def at_depth(self, points, depth):
+        """
+        Move points along the board normal to a depth in the board frame.
+
+        Args
+        ----
+        points (numpy array): The (N, 3) points in the robot base frame.
+        depth (float): The z to move them to in the board frame, in m.
+
+        Returns
+        -------
+        points (numpy array): The (N, 3) moved points in the robot base
+        frame.
+
+        """
+        onboard = self.to_board(points)
+        onboard[:, 2] = depth
+        return self.from_board(onboard)
@@ -3,6 +3,18 @@ The brain node.
 
 Interfaces with all other nodes to evaulate data.
 
+Parameters
+----------
+  + font_family (string) - The font the letters are written in.
+  + board_scale (double) - The scale of the letters on the board.
+  + glyph_cache_dir (string) - The directory the glyph atlas is cached in.
+  + stroke_tolerance (double) - The chord error, in meters, allowed when\
+  simplifying letter strokes. 0 disables simplification.
+  + stroke_spacing (double) - The largest distance, in meters, between two\
+  waypoints of a simplified stroke. 0 disables resampling.
+  + optimize_stroke_order (bool) - Whether to reorder strokes within a\
+  letter, and tiles within a turn, to shorten pen-up travel.
+
 PUBLISHERS:
   + /ocr_run (Bool) - The message to initiate the OCR pipeline.
 
@@ -10,10 +22,12 @@ SUBSCRIBERS:
   + /writer (LetterMsg) - The data sent from hangman for a given play.
 
 CLIENTS:
-  + /where_to_write (BoardTiles) - The data sent to retrieve a tile pose.
+  + /where_to_write_batch (BoardTilesBatch) - The data sent to retrieve the\
+  tile poses of a whole turn.
   + /moveit_mp (MovePose) - The data to move to specific pose.
   + /cartesian_mp (Cartesian) - The data sent for a cartesian move.
   + /kickstart_service (Empty) - The data sent to initialize the board.
+
 """
 
 import rclpy
@@ -21,14 +35,16 @@ from rclpy.node import Node
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
 from std_srvs.srv import Empty
 from std_msgs.msg import Bool
-from matplotlib.font_manager import FontProperties
-from matplotlib.textpath import TextToPath
-from brain_interfaces.srv import BoardTiles, MovePose, Cartesian
-from brain_interfaces.msg import LetterMsg
+from brain_interfaces.srv import BoardTilesBatch, MovePose, Cartesian
+from brain_interfaces.msg import LetterMsg, BoardTile
 from geometry_msgs.msg import Pose, Point, Quaternion
+from drawing.glyph_atlas import (load_glyph_atlas, DEFAULT_FONT,
+                                 DEFAULT_CACHE_DIR)
+from drawing.simplify import simplify_glyph
+from drawing.stroke_order import order_glyph, order_strokes
+from drawing.grid import board_grid
 
 from enum import Enum, auto
-import numpy as np
 
 
 class State(Enum):
@@ -50,6 +66,26 @@ class Brain(Node):
     def __init__(self):
         super().__init__("brain")
 
+        # declare parameters
+        self.declare_parameter('font_family', DEFAULT_FONT)
+        self.declare_parameter('board_scale', 1.0)
+        self.declare_parameter('glyph_cache_dir', DEFAULT_CACHE_DIR)
+        self.declare_parameter('stroke_tolerance', 0.0005)
+        self.declare_parameter('stroke_spacing', 0.0)
+        self.declare_parameter('optimize_stroke_order', True)
+
+        # get parameters
+        self.font_family = self.get_parameter(
+            'font_family').get_parameter_value().string_value
+        self.glyph_cache_dir = self.get_parameter(
+            'glyph_cache_dir').get_parameter_value().string_value
+        self.stroke_tolerance = self.get_parameter(
+            'stroke_tolerance').get_parameter_value().double_value
+        self.stroke_spacing = self.get_parameter(
+            'stroke_spacing').get_parameter_value().double_value
+        self.optimize_stroke_order = self.get_parameter(
+            'optimize_stroke_order').get_parameter_value().bool_value
+
         self.timer_callback_group = MutuallyExclusiveCallbackGroup()
 
         self.create_timer(0.01, self.timer_callback, self.timer_callback_group)
@@ -66,7 +102,8 @@ class Brain(Node):
 
         # Create clients
         self.board_service_client = self.create_client(
-            BoardTiles, '/where_to_write', callback_group=self.tile_cb_group)
+            BoardTilesBatch, '/where_to_write_batch',
+            callback_group=self.tile_cb_group)
         self.movepose_client = self.create_client(
             MovePose, '/moveit_mp', callback_group=self.mp_callback_group)
         self.cartesian_mp_client = self.create_client(
@@ -94,9 +131,12 @@ class Brain(Node):
             orientation=Quaternion(x=1.0, y=0.0, z=0.0, w=0.0)
         )
         self.alphabet = {}
-        self.board_scale = 1.0
+        self.board_scale = self.get_parameter(
+            'board_scale').get_parameter_value().double_value
         self.scale_factor = 0.001 * self.board_scale
         self.shape_list = []
+        self.shape_poses = []
+        self.grid = board_grid()
         self.current_mp_pose = Pose()
         self.current_traj_poses = []
         self.current_shape_poses = []
@@ -108,62 +148,24 @@ class Brain(Node):
         self.create_letters()
 
     def create_letters(self):
-        """Create the dictionary of bubble letters."""
-        letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0|-/_'
-        for i in range(0, len(letters)):
-            letter = letters[i]
-            if letter == '0':  # Head of man
-                xvec = []
-                yvec = []
-                q = 25
-                for t in range(0, q+1):
-                    x = 35*np.cos(2*np.pi*t/q)
-                    y = 35+35*np.sin(2*np.pi*t/q)
-                    xvec.append(x*self.scale_factor * self.board_scale)
-                    yvec.append(y*self.scale_factor * self.board_scale)
-                point_dict = {letter: {'xlist': xvec, 'ylist': yvec}}
-                self.alphabet.update(point_dict)
-            elif letter == '|':  # Body of man
-                xlist = [0.0, 0.0, 0.0]
-                ylist = [0.1 * self.board_scale, 0.05 *
-                         self.board_scale, 0.002 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
-                self.alphabet.update(point_dict)
-            elif letter == '-':  # Arms of man
-                xlist = [0.05 * self.board_scale, 0.1 *
-                         self.board_scale, 0.15 * self.board_scale]
-                ylist = [0.05 * self.board_scale, 0.05 *
-                         self.board_scale, 0.05 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
-                self.alphabet.update(point_dict)
-            elif letter == '/':  # Leg of man 1
-                xlist = [0.1 * self.board_scale, 0.075 *
-                         self.board_scale, 0.05 * self.board_scale]
-                ylist = [0.1 * self.board_scale, 0.06 *
-                         self.board_scale, 0.02 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
-                self.alphabet.update(point_dict)
-            elif letter == '_':  # Leg of man 2
-                xlist = [0.0 * self.board_scale, 0.025 *
-                         self.board_scale, 0.05 * self.board_scale]
-                ylist = [0.1 * self.board_scale, 0.06 *
-                         self.board_scale, 0.02 * self.board_scale]
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
-                self.alphabet.update(point_dict)
-            else:  # All letters of alphabet
-                fp = FontProperties(
-                    family="Liberation Sans Narrow", style="normal")
-                verts, codes = TextToPath().get_text_path(fp, letters[i])
-                xlist = []
-                ylist = []
-                for j in range(0, len(verts) - 1):
-                    if verts[j][0] > 0:
-                        xlist.append(
-                            verts[j][0] * self.scale_factor * self.board_scale)
-                        ylist.append(
-                            verts[j][1] * self.scale_factor * self.board_scale)
-                point_dict = {letter: {'xlist': xlist, 'ylist': ylist}}
-                self.alphabet.update(point_dict)
+        """
+        Create the dictionary of bubble letters.
+
+        The geometry comes from the glyph atlas, which is only rendered
+        with matplotlib when its cache is missing or out of date. Each
+        stroke is then simplified so fewer waypoints have to be planned,
+        and the strokes are ordered to shorten pen-up travel.
+        """
+        atlas = load_glyph_atlas(
+            self.font_family, self.board_scale, self.scale_factor,
+            self.glyph_cache_dir, self.get_logger())
+        for letter, glyph in atlas.glyphs.items():
+            if self.stroke_tolerance > 0.0:
+                glyph = simplify_glyph(
+                    glyph, self.stroke_tolerance, self.stroke_spacing)
+            if self.optimize_stroke_order:
+                glyph = order_glyph(glyph)
+            self.alphabet[letter] = glyph
 
     def process_letter_points(self, letter):
         """
@@ -174,31 +176,12 @@ class Brain(Node):
 
         Returns
         -------
-        board_x (List) : The list of x points on the board plane
-        board_y (List) : The list of y points on the board plane
+        board_x (array) : The array of x points on the board plane
+        board_y (array) : The array of y points on the board plane
         board_bool (List) : The list of boolean values on the board
 
         """
-        xcoord = self.alphabet[letter]['xlist']
-        ycoord = self.alphabet[letter]['ylist']
-        board_x = []
-        board_y = []
-        board_bool = []
-        for i in range(0, len(xcoord)):
-            if not (0.0001 > xcoord[i] > -0.0001) \
-                    or not (0.0001 > ycoord[i] > 0.0001):
-                board_x.append(xcoord[i])
-                board_y.append(ycoord[i])
-                board_bool.append(True)
-            elif i != len(xcoord):
-                board_x.append(xcoord[i+1])
-                board_y.append(ycoord[i+1])
-                board_bool.append(False)
-            else:
-                board_x.append(xcoord[i])
-                board_y.append(ycoord[i])
-                board_bool.append(False)
-        return board_x, board_y, board_bool
+        return self.alphabet[letter].tile_arrays()
 
     def hangman_callback(self, msg: LetterMsg):
         """
@@ -220,8 +203,9 @@ class Brain(Node):
         self.ocr_pub.publish(False)
 
         self.shape_list = []
+        self.shape_poses = []
         for i in range(0, len(self.last_message.positions)):
-            tile_origin = BoardTiles.Request()
+            tile_origin = BoardTile()
             tile_origin.mode = self.last_message.mode[i]
             tile_origin.position = self.last_message.positions[i]
 
@@ -230,10 +214,57 @@ class Brain(Node):
                 self.process_letter_points(self.last_message.letters[i])
             self.shape_list.append(tile_origin)
 
+        if self.optimize_stroke_order:
+            self.shape_list = self.order_shapes(self.shape_list)
+
         # switches to calibrate state
         self.state = State.LETTER
 
-    async def letter_writer(self, shape: BoardTiles.Request()):
+    def order_shapes(self, shapes):
+        """
+        Order the shapes of a turn to shorten pen-up travel.
+
+        Each shape is drawn as a whole, so only the order of the shapes
+        changes, not the direction they are drawn in.
+
+        Args:
+        ----
+        shapes (BoardTile[]) : The shapes in message order
+
+        Returns
+        -------
+        shapes (BoardTile[]) : The shapes in drawing order
+
+        """
+        if len(shapes) < 2:
+            return shapes
+        starts = []
+        ends = []
+        for shape in shapes:
+            origin = self.grid.tile_origin(shape.mode, shape.position)
+            starts.append([origin[0] + shape.x[0], origin[1] + shape.y[0]])
+            ends.append([origin[0] + shape.x[-1], origin[1] + shape.y[-1]])
+        order, _ = order_strokes(starts, ends, reversible=False)
+        return [shapes[i] for i in order]
+
+    async def request_shape_poses(self, shapes):
+        """
+        Get the poses of every shape of a turn in one service call.
+
+        Args:
+        ----
+        shapes (BoardTile[]) : The shapes to be written
+
+        Returns
+        -------
+        poses (TilePoses[]) : The poses of each shape, in the same order
+
+        """
+        request = BoardTilesBatch.Request(tiles=shapes)
+        resp = await self.board_service_client.call_async(request)
+        return list(resp.tiles)
+
+    async def letter_writer(self, shape: BoardTile, poses):
         """
         Write the letters on the board.
 
@@ -241,12 +272,12 @@ class Brain(Node):
 
         Args:
         ----
-        shape (BoardTiles.Request()) : The poses in BoardTiles form
+        shape (BoardTile) : The points of the shape in BoardTile form
+        poses (TilePoses) : The poses of the shape from where_to_write
 
         """
-        resp = await self.board_service_client.call_async(shape)
-        pose1 = resp.initial_pose
-        pose_list = resp.pose_list
+        pose1 = poses.initial_pose
+        pose_list = poses.pose_list
 
         request2 = MovePose.Request()
         request2.target_pose = pose1
@@ -268,6 +299,7 @@ class Brain(Node):
         await self.cartesian_mp_client.call_async(request3)
 
         self.shape_list.pop(0)
+        self.shape_poses.pop(0)
 
     async def timer_callback(self):
         """Timer running at a specified frequency."""
@@ -290,8 +322,13 @@ class Brain(Node):
 
         elif self.state == State.LETTER:
             if self.shape_list:
+                # Fetches the poses of every shape of the turn at once
+                if not self.shape_poses:
+                    self.shape_poses = await self.request_shape_poses(
+                        self.shape_list)
                 # Creates the correct data type for the next shape
-                await self.letter_writer(self.shape_list[0])
+                await self.letter_writer(
+                    self.shape_list[0], self.shape_poses[0])
 
             else:
                 request4 = Cartesian.Request()
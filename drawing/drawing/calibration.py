@@ -0,0 +1,176 @@
+"""
+Average the poses of the AprilTags seen during calibration.
+
+Calibrating the board used to take whatever pose of a tag TF had after a
+fixed wait, even if the tag had not been seen yet or the camera was still
+moving. TagAverage collects fresh observations of one tag instead, one per
+detection, and averages them once the outliers are dropped:
+
+  + positions further than outlier_distance from their median are dropped.
+  + orientations further than outlier_angle from their average are dropped.
+  + orientations are averaged with the method of Markley et al., as the
+    eigenvector of the largest eigenvalue of the sum of q q^T, which does
+    not care about the sign of each quaternion.
+
+The average has converged once there are enough inliers and the standard
+error of the mean position and orientation is below tolerance.
+
+Quaternions are x, y, z, w, the order TF uses.
+"""
+
+import numpy as np
+
+
+def average_quaternions(quaternions, weights=None):
+    """
+    Average unit quaternions.
+
+    Args
+    ----
+    quaternions (numpy array): The (N, 4) x, y, z, w quaternions.
+    weights (numpy array): The N weights of the quaternions, if not equal.
+
+    Returns
+    -------
+    quaternion (numpy array): The x, y, z, w average, with w >= 0.
+
+    """
+    q = np.asarray(quaternions, dtype=float).reshape(-1, 4)
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    if weights is None:
+        weights = np.ones(len(q))
+    _, vectors = np.linalg.eigh((q * weights[:, None]).T @ q)
+    average = vectors[:, -1]
+    return average if average[3] >= 0.0 else -average
+
+
+def quaternion_angles(quaternions, quaternion):
+    """
+    Return the angles between quaternions and one other quaternion.
+
+    Args
+    ----
+    quaternions (numpy array): The (N, 4) x, y, z, w quaternions.
+    quaternion (numpy array): The x, y, z, w quaternion to compare to.
+
+    Returns
+    -------
+    angles (numpy array): The N angles of rotation between them, in rad.
+
+    """
+    dots = np.abs(np.asarray(quaternions) @ np.asarray(quaternion))
+    return 2.0 * np.arccos(np.clip(dots, 0.0, 1.0))
+
+
+class TagAverage:
+    """The average pose of one tag over its recent detections."""
+
+    def __init__(self, min_samples=10, max_samples=100,
+                 outlier_distance=0.01, outlier_angle=0.1,
+                 position_tolerance=0.0005, angle_tolerance=0.005):
+        """
+        Initialize the average.
+
+        Args
+        ----
+        min_samples (int): How many inliers the average needs to converge.
+        max_samples (int): How many samples to keep at most.
+        outlier_distance (float): How far, in m, a position may be from the
+        median position to count.
+        outlier_angle (float): How far, in rad, an orientation may be from
+        the average orientation to count.
+        position_tolerance (float): The standard error, in m, of the mean
+        position under which the average has converged.
+        angle_tolerance (float): The standard error, in rad, of the mean
+        orientation under which the average has converged.
+
+        Returns
+        -------
+        None
+
+        """
+        self.min_samples = min_samples
+        self.outlier_distance = outlier_distance
+        self.outlier_angle = outlier_angle
+        self.position_tolerance = position_tolerance
+        self.angle_tolerance = angle_tolerance
+
+        self.positions = np.zeros((max(max_samples, 1), 3))
+        self.quaternions = np.zeros((max(max_samples, 1), 4))
+        self.count = 0
+        self.last_stamp = None
+
+        self.position = None
+        self.quaternion = None
+        self.inliers = 0
+        self.position_error = np.inf
+        self.angle_error = np.inf
+
+    @property
+    def full(self):
+        """Whether max_samples samples have been collected."""
+        return self.count == len(self.positions)
+
+    @property
+    def converged(self):
+        """Whether the average is known well enough."""
+        return self.inliers >= self.min_samples and \
+            self.position_error <= self.position_tolerance and \
+            self.angle_error <= self.angle_tolerance
+
+    def add(self, stamp, position, quaternion):
+        """
+        Add a detection of the tag, and update the average.
+
+        Args
+        ----
+        stamp (int): When the tag was detected, in ns. A detection with the
+        same stamp as the last one is the same detection, and is ignored.
+        position (list): The x, y, z position of the tag.
+        quaternion (list): The x, y, z, w orientation of the tag.
+
+        Returns
+        -------
+        added (bool): Whether the detection was new and valid.
+
+        """
+        if self.full or stamp == self.last_stamp or not np.any(quaternion):
+            return False
+        self.last_stamp = stamp
+        self.positions[self.count] = position
+        self.quaternions[self.count] = quaternion
+        self.quaternions[self.count] /= np.linalg.norm(quaternion)
+        self.count += 1
+        self.update()
+        return True
+
+    def update(self):
+        """Average the samples that are not outliers."""
+        positions = self.positions[:self.count]
+        quaternions = self.quaternions[:self.count]
+
+        inliers = np.linalg.norm(
+            positions - np.median(positions, axis=0), axis=1) <= \
+            self.outlier_distance
+        if not np.any(inliers):
+            inliers[:] = True
+        inliers &= quaternion_angles(
+            quaternions, average_quaternions(quaternions[inliers])) <= \
+            self.outlier_angle
+
+        self.inliers = int(np.count_nonzero(inliers))
+        if not self.inliers:
+            return
+        positions = positions[inliers]
+        quaternions = quaternions[inliers]
+        self.position = positions.mean(axis=0)
+        self.quaternion = average_quaternions(quaternions)
+
+        if self.inliers < 2:
+            return
+        root_n = np.sqrt(self.inliers)
+        self.position_error = np.linalg.norm(
+            positions.std(axis=0, ddof=1)) / root_n
+        angles = quaternion_angles(quaternions, self.quaternion)
+        self.angle_error = np.sqrt(
+            np.sum(angles ** 2) / (self.inliers - 1)) / root_n
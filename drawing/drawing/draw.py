@@ -13,6 +13,38 @@ Parameters
   + robot_name (string) - the name of the robot.
   + group_name (string) - the planning group of the robot.
   + frame_id (string) - the id of the base frame of the robot.
+  + log_pose_dumps (bool) - Whether to log poses and pose queues at debug\
+  level.
+  + force_rate (float) - The rate, in Hz, at which the force at the\
+  end-effector is estimated.
+  + force_filter (string) - How the estimated force is smoothed: mean, ema\
+  or median.
+  + force_window (int) - The window of the force filter, in estimates.
+  + force_publish_rate (float) - The rate, in Hz, at which the filtered\
+  force is published.
+  + validate_force_kinematics (bool) - Whether to check, once a second, that\
+  the end-effector pose used to estimate the force agrees with TF.
+  + pipeline_planning (bool) - Whether to plan the next cartesian segment\
+  while the current one is executing.
+  + stroke_planning (bool) - Whether to plan contiguous pen-down waypoints\
+  with the same velocity as one cartesian path.
+  + split_trajectories (bool) - Whether to split trajectories into one\
+  message per point before sending them to be executed, instead of letting\
+  the executor split them as it goes.
+  + ik_cache_size (int) - How many IK solutions to cache, 0 to disable.
+  + ik_position_tolerance (float) - The distance, in m, under which target\
+  positions share cached IK solutions.
+  + ik_orientation_tolerance (float) - The quaternion difference under\
+  which target orientations share cached IK solutions.
+  + ik_seed_resolution (float) - The width, in rad, of the buckets of\
+  starting joint states that share cached IK solutions.
+  + plan_cache_size (int) - How many MoveGroup plans to cache, 0 to disable.
+  + plan_start_resolution (float) - The width, in rad, of the buckets of\
+  start states that share cached plans.
+  + plan_start_tolerance (float) - How far, in rad, any joint may be from\
+  the start of a cached plan for it to be reused.
+  + plan_goal_tolerance (float) - The distance, in rad, under which goal\
+  joint positions share cached plans.
 
 SERVICES:
   + moveit_mp_service (MovePose) - Uses the request to send action requests\
@@ -24,6 +56,8 @@ SERVICES:
 CLIENTS:
   + joint_trajectories_client (ExecuteJointTrajectories) - Send join\
   trajectories to be executed.
+  + correct_waypoints_client (CorrectWaypoints) - Move the queued pen-down\
+  waypoints to a corrected depth in the board frame.
 
 PUBLISHERS:
   + force_pub (EEForce) - Publish the force at the end-effector in the end-\
@@ -38,9 +72,16 @@ from rclpy.task import Future
 from geometry_msgs.msg import Point, Quaternion, Pose
 
 from drawing.path_plan_execute import Path_Plan_Execute
+from drawing.filters import make_filter
+from drawing.force_estimation import ForceEstimator
+from drawing.motion_cache import IKCache, PlanCache
+from drawing.motion_queue import (cartesian_items, MOVEIT, REPLAN,
+                                  MotionItem, MotionQueue)
+from drawing.pose_logging import declare_pose_dump
 
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
 from enum import Enum, auto
+from itertools import islice
 
 from action_msgs.msg import GoalStatus
 
@@ -48,12 +89,11 @@ from tf2_ros.buffer import Buffer
 from tf2_ros.transform_listener import TransformListener
 
 import tf2_ros
-from brain_interfaces.srv import (MovePose, Cartesian,
+from brain_interfaces.srv import (MovePose, Cartesian, CorrectWaypoints,
                                   ExecuteJointTrajectories, Replan)
 from brain_interfaces.msg import EEForce
 
 import numpy as np
-import transforms3d as tf
 np.set_printoptions(suppress=True)
 
 
@@ -94,6 +134,22 @@ class Drawing(Node):
         self.declare_parameter('robot_name', 'panda')
         self.declare_parameter('group_name', 'panda_manipulator')
         self.declare_parameter('frame_id', 'panda_link0')
+        self.declare_parameter('force_rate', 100.0)
+        self.declare_parameter('force_filter', 'mean')
+        self.declare_parameter('force_window', 10)
+        self.declare_parameter('force_publish_rate', 100.0)
+        self.declare_parameter('validate_force_kinematics', False)
+        self.declare_parameter('pipeline_planning', False)
+        self.declare_parameter('stroke_planning', False)
+        self.declare_parameter('split_trajectories', False)
+        self.declare_parameter('ik_cache_size', 64)
+        self.declare_parameter('ik_position_tolerance', 0.0005)
+        self.declare_parameter('ik_orientation_tolerance', 0.001)
+        self.declare_parameter('ik_seed_resolution', 0.5)
+        self.declare_parameter('plan_cache_size', 16)
+        self.declare_parameter('plan_start_resolution', 0.1)
+        self.declare_parameter('plan_start_tolerance', 0.01)
+        self.declare_parameter('plan_goal_tolerance', 0.001)
 
         # get parameters
         self.use_fake_hardware = self.get_parameter(
@@ -105,6 +161,24 @@ class Drawing(Node):
             'group_name').get_parameter_value().string_value
         self.frame_id = self.get_parameter(
             'frame_id').get_parameter_value().string_value
+        self.force_rate = self.get_parameter(
+            'force_rate').get_parameter_value().double_value
+        self.force_filter = make_filter(
+            self.get_parameter(
+                'force_filter').get_parameter_value().string_value,
+            self.get_parameter(
+                'force_window').get_parameter_value().integer_value)
+        self.force_publish_rate = self.get_parameter(
+            'force_publish_rate').get_parameter_value().double_value
+        self.validate_force_kinematics = self.get_parameter(
+            'validate_force_kinematics').get_parameter_value().bool_value
+        self.pipeline_planning = self.get_parameter(
+            'pipeline_planning').get_parameter_value().bool_value
+        self.stroke_planning = self.get_parameter(
+            'stroke_planning').get_parameter_value().bool_value
+        self.split_trajectories = self.get_parameter(
+            'split_trajectories').get_parameter_value().bool_value
+        self.pose_dump = declare_pose_dump(self)
 
         # Initialize variables
         self.joint_names = []
@@ -116,11 +190,38 @@ class Drawing(Node):
         self.execute_joint_trajectories_callback_group = \
             MutuallyExclusiveCallbackGroup()
         self.board_service_callback_group = MutuallyExclusiveCallbackGroup()
-        self.timer = self.create_timer(
-            0.001, self.timer_callback,
+        self.correct_waypoints_callback_group = \
+            MutuallyExclusiveCallbackGroup()
+
+        # the state machine is advanced by the events that change its state,
+        # so the only timers left are the ones estimating the force at the
+        # end-effector and publishing it.
+        self.force_timer = self.create_timer(
+            1.0 / self.force_rate, self.force_timer_callback,
+            callback_group=self.timer_callback_group)
+        self.force_publish_timer = self.create_timer(
+            1.0 / self.force_publish_rate, self.force_publish_callback,
             callback_group=self.timer_callback_group)
 
         self.path_planner = Path_Plan_Execute(self)
+        self.path_planner.ik_cache = IKCache(
+            capacity=self.get_parameter(
+                'ik_cache_size').get_parameter_value().integer_value,
+            position_tolerance=self.get_parameter(
+                'ik_position_tolerance').get_parameter_value().double_value,
+            orientation_tolerance=self.get_parameter(
+                'ik_orientation_tolerance').get_parameter_value().double_value,
+            seed_resolution=self.get_parameter(
+                'ik_seed_resolution').get_parameter_value().double_value)
+        self.path_planner.plan_cache = PlanCache(
+            capacity=self.get_parameter(
+                'plan_cache_size').get_parameter_value().integer_value,
+            start_resolution=self.get_parameter(
+                'plan_start_resolution').get_parameter_value().double_value,
+            start_tolerance=self.get_parameter(
+                'plan_start_tolerance').get_parameter_value().double_value,
+            goal_tolerance=self.get_parameter(
+                'plan_goal_tolerance').get_parameter_value().double_value)
 
         # these are used for computing the current location of the end-effector
         # using the tf tree.
@@ -150,6 +251,10 @@ class Drawing(Node):
             ExecuteJointTrajectories, '/joint_trajectories',
             callback_group=self.execute_joint_trajectories_callback_group)
 
+        self.correct_waypoints_client = self.create_client(
+            CorrectWaypoints, '/correct_waypoints',
+            callback_group=self.correct_waypoints_callback_group)
+
         # this publisher is used to send the current force at the end-effector
         # to the node we created to execute trajectories.
         self.force_pub = self.create_publisher(
@@ -158,10 +263,25 @@ class Drawing(Node):
         self.plan_future = Future()
         self.execute_future = Future()
 
-        self.moveit_mp_queue = []  # moveit motion planner queue
-        self.cartesian_mp_queue = []  # cartesian motion planner queue
+        self.moveit_mp_queue = MotionQueue()  # moveit motion planner queue
+        self.cartesian_mp_queue = MotionQueue()  # cartesian planner queue
 
         self.state = State.WAITING
+        self.advancing = False
+
+        # the next cartesian segment, planned while the current one executes,
+        # as (generation, items, task). A replan bumps the generation, which
+        # drops the lookahead.
+        self.lookahead = None
+        self.plan_generation = 0
+
+        # the last pose a cartesian segment was planned to, and the start and
+        # items of the stroke being executed, if it has more than one.
+        # When a stroke is replanned, the waypoints it has not reached yet are
+        # planned one segment at a time, counted down by segment_fallback.
+        self.last_target = None
+        self.stroke = None
+        self.segment_fallback = 0
 
         self.gripper_mass = 1.795750991  # kg
         self.g = 9.81  # m/s**2
@@ -170,12 +290,10 @@ class Drawing(Node):
         # in the panda_hand frame
         self.pc = np.array([-0.01, 0, 0.03])
 
-        # list bc moving average
-        self.ee_force = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]  # N
-
-        self.cartesian_velocity = []
-        self.use_force_control = []
-        self.replan = False
+        # the frames the force is estimated in come from the forward
+        # kinematics of the joint state the effort came from
+        self.force_estimator = ForceEstimator(
+            self.gripper_mass, self.g, self.pc)
 
         self.i = 0
 
@@ -190,125 +308,6 @@ class Drawing(Node):
         self.draw_obs(name="table", pos=table, size=[1.5, 1.0, 3.0])
         self.board_future = rclpy.task.Future()
 
-    def array_to_transform_matrix(self, translation, quaternion):
-        """
-        Calculate the transformation and rotation matrices.
-
-        Calculate the transformation and rotation matrices using
-        a 3x1 translation vector and a quaternion.
-
-        Args
-        ----
-        translation (numpy array): A 3x1 translation vector.
-        quaternion (numpy array): A 4x1 quaternion.
-
-        Returns
-        -------
-        transform_matrix (numpy array): A transformation matrix.
-        rotation_matrix (nuumpy array): A rotation matrix.
-
-        """
-        # Normalize the quaternion
-        quaternion /= np.linalg.norm(quaternion)
-        quaternion = [quaternion[3], quaternion[0],
-                      quaternion[1], quaternion[2]]
-
-        # Create rotation matrix from quaternion
-        rotation_matrix = tf.quaternions.quat2mat(quaternion)
-
-        # Create the transformation matrix
-        transform_matrix = np.eye(4)
-        transform_matrix[:3, :3] = rotation_matrix
-        transform_matrix[:3, 3] = translation
-
-        return transform_matrix, rotation_matrix
-
-    def calc_joint_torque_offset(self):
-        """
-        Calculate the joint torque offset in panda_joint6.
-
-        Using the location of the center of mass of the gripper and
-        the mass of the gripper and its attachments, figure out the
-        portion of the torque in panda_joint6 that is due to
-        the gripper itself and the current time.
-
-        Args
-        ----
-        None
-
-        Returns
-        -------
-        joint_torque_offset (float): The amount of torque in panda_joint6
-        that is due to the mass of the end-effector and its attachments.
-
-        """
-        # world to panda_joint6 from tf
-        pw6, quaternion_w6 = self.get_transform(
-            'panda_link0', 'panda_link6')
-
-        # transformation and rotation matrices from translation vector
-        # and quaternion.
-        Tw6, Rw6 = self.array_to_transform_matrix(pw6, quaternion_w6)
-
-        # panda_joint6 to the "flange" of the panda robot. This is
-        # defined at panda0.robot in the settings.
-        p6f, quaternion_6f = self.get_transform('panda_link6', 'panda_hand')
-
-        # transformation matrices from translation vector and quaternion.
-        T6f, R6f = self.array_to_transform_matrix(p6f, quaternion_6f)
-
-        # calculate force due to gravity in the world frame
-        Fw = np.array([0, 0, -self.gripper_mass * self.g])
-
-        # calculate force in the frame of panda_joint6
-        F6 = np.linalg.inv(Rw6) @ Fw
-
-        # calculate the expected moment in panda_joint6
-        M6 = F6 * (p6f + R6f @ self.pc)
-
-        joint_torque_offset = M6[1]
-
-        return joint_torque_offset
-
-    def calc_ee_force(self, effort_joint6):
-        """
-        Calculate the force at the end-effector.
-
-        Calculate the force at the end-effector in the xyz directions
-        in the frame of the end-effector.
-
-        Args
-        ----
-        effort_joint6 (float): The effort in panda_joint6 in Nm.
-
-        Returns
-        -------
-        Fe (float): force at the end effector.
-
-        """
-        # ee to panda_joint6 from tf
-        pe6, quaternion_e6 = self.get_transform(
-            'panda_hand_tcp', 'panda_link6')
-
-        # calc transformation and rotation matrices.
-        Te6, Re6 = self.array_to_transform_matrix(pe6, quaternion_e6)
-
-        # panda_joint6 to ee from tf
-        p6e, quaternion_6e = self.get_transform(
-            'panda_link6', 'panda_hand_tcp')
-
-        # torque in panda_joint6, which is about its y axis.
-        M6 = np.array([0, effort_joint6, 0])
-
-        # calculate the force at the ee due to the moment.
-        F6 = np.divide(M6, p6e,
-                       out=np.zeros_like(p6e), where=p6e != 0)
-
-        # transform force from the panda_joint6 frame to the ee frame.
-        Fe = Re6 @ F6
-
-        return Fe
-
     async def moveit_mp_callback(self, request, response):
         """
         Queue a pose to be planned with the MoveIT motion planner.
@@ -335,10 +334,11 @@ class Drawing(Node):
         self.plan_future = Future()
         self.execute_future = Future()
 
-        self.moveit_mp_queue.append(request.target_pose)
+        self.moveit_mp_queue.append(MotionItem(
+            request.target_pose,
+            use_force_control=request.use_force_control, source=MOVEIT))
         self.state = State.PLAN_MOVEGROUP
-        self.use_force_control.append(request.use_force_control)
-        self.replan = False
+        self.schedule()
 
         await self.plan_future
         self.get_logger().info("MOVEIT MOTION PLAN REQUEST COMPLETE")
@@ -346,6 +346,7 @@ class Drawing(Node):
         self.plan_future = Future()
         self.execute_future = Future()
         self.state = State.REMOVE_BOARD
+        self.schedule()
         await self.board_future
 
         return response
@@ -379,13 +380,10 @@ class Drawing(Node):
         self.plan_future = Future()
         self.execute_future = Future()
 
-        self.replan = request.replan
-        for pose in request.poses:
-            self.cartesian_mp_queue.append(pose)
-            self.cartesian_velocity.append(request.velocity)
+        self.cartesian_mp_queue.extend(cartesian_items(request))
 
         self.state = State.PLAN_CARTESIAN_MOVE
-        self.use_force_control = request.use_force_control
+        self.schedule()
 
         await self.plan_future
 
@@ -399,11 +397,16 @@ class Drawing(Node):
         Replan a trajectory.
 
         Replans a trajectory that previously exceeded the force
-        threshold when being executed.
+        threshold when being executed. If the trajectory was a whole stroke,
+        the correction is applied to the waypoints of the stroke that have
+        not been reached yet, and they are planned one segment at a time.
+        If asked to, every pen-down waypoint still queued is then moved to
+        the corrected depth in the board frame.
 
         Args
         ----
-        request (Pose): A pose to be replanned.
+        request (Pose): A pose to be replanned, its depth in the board frame,
+        and whether to correct the waypoints still queued.
 
         Returns
         -------
@@ -413,22 +416,107 @@ class Drawing(Node):
         """
         self.get_logger().info("REPLAN REQUEST RECEIVED")
 
-        self.get_logger().info(f"request.pose: {request.pose}")
+        self.pose_dump("request.pose", request.pose)
 
-        self.cartesian_mp_queue.insert(0, request.pose)
-        self.cartesian_velocity.insert(0, 0.015)
+        self.plan_generation += 1
+        pose = request.pose
+        if self.stroke is not None:
+            pose = self.requeue_stroke(request.pose)
+        if request.correct_remaining:
+            await self.correct_remaining(request.depth)
 
-        await self.path_planner.plan_cartesian_path(
-            [self.cartesian_mp_queue[0]], self.cartesian_velocity[0])
+        item = MotionItem(pose, 0.015, source=REPLAN)
 
-        response.joint_trajectories = self.path_planner.\
-            execute_individual_trajectories()
+        self.path_planner.planned_trajectory, _ = \
+            await self.path_planner.plan_cartesian_path(
+                [item.pose], item.velocity)
 
-        self.cartesian_mp_queue.pop(0)
-        self.cartesian_velocity.pop(0)
+        response.joint_trajectories = self.path_planner.\
+            execute_individual_trajectories(self.split_trajectories)
 
         return response
 
+    def requeue_stroke(self, corrected_pose):
+        """
+        Queue the rest of a stroke that has to be replanned.
+
+        The replan request corrects the end of the stroke. The same
+        correction is applied to the waypoints the pen has not reached yet,
+        which are queued to be planned one segment at a time.
+
+        Args
+        ----
+        corrected_pose (Pose): The corrected end of the stroke.
+
+        Returns
+        -------
+        pose (Pose): The corrected waypoint to replan to first.
+
+        """
+        start, items = self.stroke
+        self.stroke = None
+
+        end = items[-1].pose.position
+        delta = Point(x=corrected_pose.position.x - end.x,
+                      y=corrected_pose.position.y - end.y,
+                      z=corrected_pose.position.z - end.z)
+
+        points = np.array([[item.pose.position.x, item.pose.position.y,
+                            item.pose.position.z] for item in items])
+        if start is not None:
+            points = np.vstack(([[start.x, start.y, start.z]], points))
+        position, rotation = self.get_transform(
+            'panda_link0', 'panda_hand_tcp')
+        first = 0
+        if np.any(rotation):
+            first = next_waypoint(points, np.asarray(position))
+            if start is not None:
+                first -= 1
+        remaining = [
+            MotionItem(Pose(position=Point(x=item.pose.position.x + delta.x,
+                                           y=item.pose.position.y + delta.y,
+                                           z=item.pose.position.z + delta.z),
+                            orientation=corrected_pose.orientation),
+                       item.velocity, item.use_force_control, item.replan,
+                       REPLAN)
+            for item in items[first:]]
+
+        self.cartesian_mp_queue.extendleft(remaining[1:])
+        self.segment_fallback += len(remaining) - 1
+        return remaining[0].pose
+
+    async def correct_remaining(self, depth):
+        """
+        Move the pen-down waypoints still queued to a new depth.
+
+        All of them are sent to be corrected in the board frame in one call,
+        so they do not trip the force threshold one after another.
+
+        Args
+        ----
+        depth (float): The z of the pen in the board frame.
+
+        Returns
+        -------
+        None
+
+        """
+        items = [item for item in self.cartesian_mp_queue
+                 if item.use_force_control]
+        if not items:
+            return
+        if not self.correct_waypoints_client.service_is_ready():
+            self.get_logger().warn(
+                "correct_waypoints is not available, not correcting the "
+                f"{len(items)} queued waypoints")
+            return
+        correction = await self.correct_waypoints_client.call_async(
+            CorrectWaypoints.Request(poses=[item.pose for item in items],
+                                     depth=depth))
+        for item, pose in zip(items, correction.poses):
+            item.pose = pose
+        self.get_logger().info(f"corrected {len(items)} queued waypoints")
+
     def draw_obs(self, name, pos, size):
         """
         Draw an obstacle.
@@ -502,15 +590,67 @@ class Drawing(Node):
             self.get_logger().info("cartesian move was executed")
             self.state = State.PLAN_CARTESIAN_MOVE
             self.execute_future = Future()
+            self.schedule()
+
+    def movegroup_done_callback(self, future):
+        """Execute the trajectory from the moveit motion planner if found."""
+        if self.path_planner.movegroup_status ==\
+                GoalStatus.STATUS_SUCCEEDED:
+
+            self.state = State.EXECUTING
+            self.path_planner.movegroup_status = GoalStatus.STATUS_UNKNOWN
+            self.schedule()
+
+    def schedule(self):
+        """
+        Advance the state machine after an event changed its state.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        self.executor.create_task(self.advance)
+
+    async def advance(self):
+        """
+        Run the state machine until it has to wait for an event.
+
+        Only one call runs the state machine at a time. A call made while it
+        is already running returns straight away, and the running call picks
+        up the new state on its next step.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        if self.advancing:
+            return
+        self.advancing = True
+        try:
+            while self.state != State.WAITING:
+                await self.step()
+        finally:
+            self.advancing = False
 
-    async def timer_callback(self):
+    async def step(self):
         """
-        Timer loop for the drawing node.
+        Perform one transition of the state machine.
 
-        The timer loop functions as the main loop of the node, and
-        also contains a state machine. It performs actions for force
-        control, regulates when trajectories are planned, which motion
-        planner is used, and send trajectories off to be executed.
+        Regulates when trajectories are planned, which motion planner is
+        used, and sends trajectories off to be executed. Each state either
+        moves on to the next one, or goes to WAITING until a service
+        request, the moveit motion planner or the execution of a trajectory
+        moves it on again.
 
         Args
         ----
@@ -525,30 +665,24 @@ class Drawing(Node):
 
             # here we check to see if the big_move queue is empty, and if not,
             # we use the moveit motion planner to create a trajectory.
-            # then we go to the waiting loop, where we will wait for the future
-            # to return true.
-
-            self.get_logger().info("here")
+            # then we wait for the planner to call movegroup_done_callback.
 
             if not self.moveit_mp_queue:  # check if the queue is empty
-                self.state == State.PLAN_CARTESIAN_MOVE
+                self.state = State.PLAN_CARTESIAN_MOVE
                 return
 
-            self.get_logger().info("here")
-            await self.path_planner.get_goal_joint_states(
-                self.moveit_mp_queue[0])
-            self.get_logger().info("here")
+            item = self.moveit_mp_queue.popleft()
+            await self.path_planner.get_goal_joint_states(item.pose)
             self.joint_trajectories = ExecuteJointTrajectories.Request()
-            self.joint_trajectories.current_pose = self.moveit_mp_queue[0]
+            self.joint_trajectories.current_pose = item.pose
             self.joint_trajectories.use_force_control = \
-                self.use_force_control[0]
-
-            self.path_planner.plan_path()
+                item.use_force_control
 
             self.state = State.WAITING
 
-            self.moveit_mp_queue.pop(0)
-            self.use_force_control.pop(0)
+            self.path_planner.plan_path()
+            self.path_planner.movegroup_future.add_done_callback(
+                self.movegroup_done_callback)
 
         elif self.state == State.PLAN_CARTESIAN_MOVE:
 
@@ -558,31 +692,39 @@ class Drawing(Node):
             # creates a trajectory to visit all of those posesp
 
             if not self.cartesian_mp_queue:
-                self.state == State.WAITING
+                self.state = State.WAITING
+                return
 
-            self.get_logger().info(f"velocity: {self.cartesian_velocity[0]}")
+            self.get_logger().info(
+                f"velocity: {self.cartesian_mp_queue[0].velocity}")
 
-            await self.path_planner.plan_cartesian_path(
-                [self.cartesian_mp_queue[0]], self.cartesian_velocity[0])
+            items = self.cartesian_mp_queue.take(self.stroke_length())
+            head = items[0]
+
+            trajectory = await self.take_lookahead(items)
+            if trajectory is None:
+                trajectory, _ = await self.path_planner.plan_cartesian_path(
+                    [item.pose for item in items], head.velocity)
+            self.path_planner.planned_trajectory = trajectory
             self.joint_trajectories = ExecuteJointTrajectories.Request()
             # queue the remaining poses, so that if force threshold is
             # exceeded, send_trajectories can initiate a replan request
             # self.plan_future.set_result("done") directly with the april tags
             # node.
 
-            self.joint_trajectories.current_pose = self.cartesian_mp_queue[0]
-            self.joint_trajectories.replan = self.replan
-            self.joint_trajectories.use_force_control =\
-                self.use_force_control[0]
-            self.get_logger().info(
-                f"cartesian queue: {self.cartesian_mp_queue}")
-
-            if len(self.cartesian_mp_queue) == 1:
-                self.replan = False
+            self.joint_trajectories.current_pose = items[-1].pose
+            self.joint_trajectories.replan = head.replan
+            self.joint_trajectories.use_force_control = \
+                head.use_force_control
+            self.pose_dump("cartesian queue",
+                           lambda: [item.pose for item in items] +
+                           [item.pose for item in self.cartesian_mp_queue])
 
-            self.cartesian_mp_queue.pop(0)
-            self.cartesian_velocity.pop(0)
-            self.use_force_control.pop(0)
+            self.stroke = None
+            if len(items) > 1:
+                self.stroke = (self.last_target, items)
+            self.last_target = items[-1].pose.position
+            self.segment_fallback = max(self.segment_fallback - 1, 0)
 
             self.state = State.EXECUTING
 
@@ -590,47 +732,21 @@ class Drawing(Node):
 
             # send the trajectory previously planned, either by the moveit
             # motion planner or the cartesian path planner, to our node for
-            # executing trajectories.
+            # executing trajectories, and wait for execute_done_callback.
 
             self.joint_trajectories.state = "publish"
             self.joint_trajectories.joint_trajectories = \
-                self.path_planner.execute_individual_trajectories()
+                self.path_planner.execute_individual_trajectories(
+                    self.split_trajectories)
+
+            self.state = State.WAITING
 
             self.execute_future = self.joint_trajectories_client.call_async(
                 self.joint_trajectories)
             self.execute_future.add_done_callback(self.execute_done_callback)
 
-            self.state = State.WAITING
-
-        elif self.state == State.WAITING:
-
-            # calculate the current force at the end-effector, and send it to
-            # the node that is executing our trajectory. Also, check to see
-            # whether the moveit motion planner has completed planning. This
-            # will only happen if the state prior was State.PLAN_MOVEGROUP.
-
-            while not self.path_planner.current_joint_state.effort:
-                return
-
-            joint_torque_offset = self.calc_joint_torque_offset()
-
-            self.ee_force.append(self.calc_ee_force(
-                self.path_planner.current_joint_state.effort[5] -
-                joint_torque_offset)[2])
-            self.ee_force.pop(0)
-
-            if self.i % 10:  # publish the message at a frequency of 100hz
-                ee_force_avg = np.average(self.ee_force)
-
-                ee_force_msg = EEForce()
-                ee_force_msg.ee_force = ee_force_avg
-                self.force_pub.publish(ee_force_msg)
-
-            if self.path_planner.movegroup_status ==\
-                    GoalStatus.STATUS_SUCCEEDED:
-
-                self.state = State.EXECUTING
-                self.path_planner.movegroup_status = GoalStatus.STATUS_UNKNOWN
+            if self.pipeline_planning and self.cartesian_mp_queue:
+                self.start_lookahead()
 
         elif self.state == State.MAKE_BOARD:
             ansT, ansR = self.get_transform("panda_link0", "board")
@@ -639,16 +755,201 @@ class Drawing(Node):
             board_pose.orientation = Quaternion(
                 x=ansR[0], y=ansR[1], z=ansR[2], w=ansR[3])
             self.draw_obs(pos=board_pose, name="board", size=[2.0, 2.0, 0.02])
+            self.state = State.WAITING
             self.board_future.set_result("fdsa")
 
         elif self.state == State.REMOVE_BOARD:
             board_pose = Pose()
             board_pose.position.z = -0.3
             self.draw_obs(pos=board_pose, name="board", size=[0.0, 0.0, 0.0])
+            self.state = State.WAITING
             self.board_future.set_result("remove")
 
+    def stroke_length(self):
+        """
+        Return how many queued waypoints to plan as one cartesian path.
+
+        In stroke planning mode, contiguous waypoints at the front of the
+        cartesian queue are planned together while the pen is down and
+        their velocity stays the same. Otherwise, and while the rest of a
+        replanned stroke is being drawn, each waypoint is its own segment.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        count (int): The number of waypoints to plan together.
+
+        """
+        head = self.cartesian_mp_queue[0]
+        if not self.stroke_planning or self.segment_fallback or \
+                not head.use_force_control:
+            return 1
+        count = 1
+        for item in islice(self.cartesian_mp_queue, 1, None):
+            if not item.use_force_control or item.velocity != head.velocity:
+                break
+            count += 1
+        return count
+
+    def start_lookahead(self):
+        """
+        Plan the next cartesian segment while the current one executes.
+
+        The segment is planned from the joint state at the end of the
+        trajectory that was just sent, instead of the current one.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        start_state = self.path_planner.final_joint_state(
+            self.path_planner.planned_trajectory)
+        if start_state is None:
+            return
+        items = self.cartesian_mp_queue.peek(self.stroke_length())
+        task = self.executor.create_task(
+            self.path_planner.plan_cartesian_path,
+            [item.pose for item in items], items[0].velocity, start_state)
+        self.lookahead = (self.plan_generation, items, task)
+
+    async def take_lookahead(self, items):
+        """
+        Return the lookahead trajectory if it can still be used.
+
+        Args
+        ----
+        items (MotionItem[]): The items about to be planned.
+
+        Returns
+        -------
+        trajectory (RobotTrajectory): The lookahead trajectory for the items,
+        or None if there is none, it was planned for other items, or a replan
+        happened since it was started.
+
+        """
+        lookahead, self.lookahead = self.lookahead, None
+        if lookahead is None:
+            return None
+        generation, planned, task = lookahead
+        if generation != self.plan_generation or len(planned) != len(items) \
+                or any(a is not b for a, b in zip(planned, items)):
+            self.get_logger().info("dropping the lookahead trajectory")
+            return None
+        trajectory, _ = await task
+        return trajectory
+
+    def force_timer_callback(self):
+        """
+        Estimate the force at the end-effector and filter it.
+
+        Calculate the current force at the end-effector at force_rate, and
+        add it to the force filter.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        joint_state = self.path_planner.current_joint_state
+        if not joint_state.effort:
+            return
+
+        self.force_filter.update(
+            self.force_estimator.estimate(joint_state)[2])
+
+        if self.validate_force_kinematics and \
+                self.i % max(round(self.force_rate), 1) == 0:
+            self.check_force_kinematics()
+
         self.i += 1
 
+    def force_publish_callback(self):
+        """
+        Publish the filtered force at the end-effector.
+
+        Send the force to the node that is executing our trajectory, at
+        force_publish_rate, once there is an estimate of it.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        if not self.force_filter.count:
+            return
+
+        ee_force_msg = EEForce()
+        ee_force_msg.ee_force = self.force_filter.value
+        self.force_pub.publish(ee_force_msg)
+
+    def check_force_kinematics(self):
+        """
+        Compare the pose of the end-effector used for force estimation to TF.
+
+        Logs a warning if the tcp computed from the joint states is more than
+        a millimeter from where TF has it.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        position, rotation = self.get_transform(
+            'panda_link0', 'panda_hand_tcp')
+        if not np.any(rotation):
+            return
+        error = np.linalg.norm(
+            self.force_estimator.chain.tcp_in_base()[:3, 3] - position)
+        if error > 0.001:
+            self.get_logger().warn(
+                f"force kinematics are {error * 1000:.1f} mm from TF")
+
+
+def next_waypoint(points, position):
+    """
+    Return the first waypoint of a polyline that has not been reached yet.
+
+    Args
+    ----
+    points (numpy array): The (N, 3) waypoints of the polyline.
+    position (numpy array): The current position of the end-effector.
+
+    Returns
+    -------
+    index (int): The index of the end of the segment closest to position.
+
+    """
+    if len(points) < 2:
+        return 0
+    starts = points[:-1]
+    segments = points[1:] - starts
+    lengths = np.maximum(np.sum(segments * segments, axis=1), 1e-12)
+    t = np.clip(np.sum((position - starts) * segments, axis=1) / lengths,
+                0.0, 1.0)
+    distances = np.linalg.norm(starts + t[:, None] * segments - position,
+                               axis=1)
+    return int(np.argmin(distances)) + 1
+
 
 def main(args=None):
     rclpy.init(args=args)
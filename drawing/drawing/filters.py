@@ -0,0 +1,198 @@
+"""
+Smooth a stream of samples, one sample at a time.
+
+The force estimated at the end-effector is noisy, so it is filtered before
+it is published. Every filter here takes one sample at a time and keeps its
+state in a fixed array, so updating it never allocates:
+
+  + MovingAverage keeps a running sum over a ring buffer of the last samples.
+  + ExponentialMovingAverage weighs every sample by how recent it is.
+  + MovingMedian takes the median of the last samples, which ignores spikes.
+
+Use make_filter to build one by name.
+"""
+
+import numpy as np
+
+
+class MovingAverage:
+    """The mean of the last window samples."""
+
+    def __init__(self, window):
+        """
+        Initialize the filter.
+
+        Args
+        ----
+        window (int): How many samples to average.
+
+        Returns
+        -------
+        None
+
+        """
+        self.samples = np.zeros(max(int(window), 1))
+        self.reset()
+
+    def reset(self):
+        """Forget every sample."""
+        self.samples.fill(0.0)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.value = 0.0
+
+    def update(self, sample):
+        """
+        Add a sample.
+
+        Args
+        ----
+        sample (float): The new sample.
+
+        Returns
+        -------
+        value (float): The mean of the samples in the window.
+
+        """
+        window = len(self.samples)
+        self.total += sample - self.samples[self.index]
+        self.samples[self.index] = sample
+        self.index = (self.index + 1) % window
+        if self.count < window:
+            self.count += 1
+        elif self.index == 0:
+            # drop the rounding error the running sum picked up
+            self.total = float(np.sum(self.samples))
+        self.value = self.total / self.count
+        return self.value
+
+
+class ExponentialMovingAverage:
+    """An average that weighs recent samples more."""
+
+    def __init__(self, window):
+        """
+        Initialize the filter.
+
+        Args
+        ----
+        window (int): The number of samples whose simple average has the
+        same lag; the smoothing factor is 2 / (window + 1).
+
+        Returns
+        -------
+        None
+
+        """
+        self.alpha = 2.0 / (max(int(window), 1) + 1.0)
+        self.reset()
+
+    def reset(self):
+        """Forget every sample."""
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, sample):
+        """
+        Add a sample.
+
+        Args
+        ----
+        sample (float): The new sample.
+
+        Returns
+        -------
+        value (float): The average.
+
+        """
+        if self.count:
+            self.value += self.alpha * (sample - self.value)
+        else:
+            self.value = float(sample)
+        self.count += 1
+        return self.value
+
+
+class MovingMedian:
+    """The median of the last window samples."""
+
+    def __init__(self, window):
+        """
+        Initialize the filter.
+
+        Args
+        ----
+        window (int): How many samples to take the median of.
+
+        Returns
+        -------
+        None
+
+        """
+        self.samples = np.zeros(max(int(window), 1))
+        self.scratch = np.zeros_like(self.samples)
+        self.reset()
+
+    def reset(self):
+        """Forget every sample."""
+        self.samples.fill(0.0)
+        self.index = 0
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, sample):
+        """
+        Add a sample.
+
+        Args
+        ----
+        sample (float): The new sample.
+
+        Returns
+        -------
+        value (float): The median of the samples in the window.
+
+        """
+        window = len(self.samples)
+        self.samples[self.index] = sample
+        self.index = (self.index + 1) % window
+        self.count = min(self.count + 1, window)
+
+        # partition a copy, so the ring buffer keeps its order
+        scratch = self.scratch[:self.count]
+        scratch[:] = self.samples[:self.count]
+        middle = self.count // 2
+        scratch.partition(middle)
+        self.value = float(scratch[middle])
+        if self.count % 2 == 0:
+            self.value = (self.value + float(np.max(scratch[:middle]))) / 2
+        return self.value
+
+
+FILTERS = {
+    'mean': MovingAverage,
+    'ema': ExponentialMovingAverage,
+    'median': MovingMedian,
+}
+
+
+def make_filter(kind, window):
+    """
+    Build a filter by name.
+
+    Args
+    ----
+    kind (string): 'mean', 'ema' or 'median'.
+    window (int): The window of the filter, in samples.
+
+    Returns
+    -------
+    filter (MovingAverage, ExponentialMovingAverage or MovingMedian): The
+    filter.
+
+    """
+    if kind not in FILTERS:
+        raise ValueError(f"Unknown filter {kind}, expected one of "
+                         f"{', '.join(FILTERS)}")
+    return FILTERS[kind](window)
@@ -0,0 +1,95 @@
+"""
+Keep the pen pressed against the board with a constant force.
+
+While a stroke is being drawn with force control, the angle of
+panda_joint6 tilts the pen into or away from the board. ForcePID turns the
+force measured at the end-effector into a change of that angle. It is
+written in rate form: every update returns how much the angle should
+change since the last one, so it can run at any rate, and uses the time
+that actually passed between force measurements rather than a fixed step.
+
+The integral is clamped so it cannot wind up while the pen is off the
+board, and the derivative is low-pass filtered, since the force estimate
+is noisy.
+"""
+
+import math
+
+
+class ForcePID:
+    """A PID controller from end-effector force to joint angle change."""
+
+    def __init__(self, kp, ki, kd, setpoint, integral_limit=math.inf,
+                 derivative_filter=0.0, nominal_dt=0.1):
+        """
+        Initialize the controller.
+
+        Args
+        ----
+        kp (float): The proportional gain, in rad/(N s).
+        ki (float): The integral gain, in rad/(N s^2).
+        kd (float): The derivative gain, in rad/N.
+        setpoint (float): The force to hold, in N.
+        integral_limit (float): The largest magnitude of the integrated
+        force error, in N s.
+        derivative_filter (float): The time constant of the low-pass filter
+        on the derivative, in s, or 0 for no filtering.
+        nominal_dt (float): The time step assumed for the first update, in
+        s.
+
+        Returns
+        -------
+        None
+
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = setpoint
+        self.integral_limit = integral_limit
+        self.derivative_filter = derivative_filter
+        self.nominal_dt = nominal_dt
+        self.reset()
+
+    def reset(self):
+        """Forget the history of the controller."""
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.previous_error = None
+        self.previous_time = None
+
+    def update(self, force, time):
+        """
+        Update the controller with a new force measurement.
+
+        Args
+        ----
+        force (float): The force at the end-effector, in N.
+        time (float): When the force was measured, in s.
+
+        Returns
+        -------
+        adjustment (float): How much to change the joint angle by, in rad.
+
+        """
+        error = self.setpoint - force
+        if self.previous_time is None:
+            dt = self.nominal_dt
+        else:
+            dt = time - self.previous_time
+        if dt <= 0.0:
+            return 0.0
+
+        self.integral = min(max(self.integral + error * dt,
+                                -self.integral_limit), self.integral_limit)
+
+        if self.previous_error is not None:
+            raw = (error - self.previous_error) / dt
+            alpha = dt / (self.derivative_filter + dt)
+            self.derivative += alpha * (raw - self.derivative)
+
+        self.previous_error = error
+        self.previous_time = time
+
+        return dt * (self.kp * error + self.ki * self.integral +
+                     self.kd * self.derivative)
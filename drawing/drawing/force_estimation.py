@@ -0,0 +1,263 @@
+"""
+Estimate the force at the end-effector from the joint states of the Panda.
+
+The force is estimated from the effort in panda_joint6, less the part of it
+that is due to the weight of the gripper. Both need where panda_link6, the
+hand and the tcp are. Rather than looking those frames up in TF, which means
+several lookups on a shared buffer every tick and frames that may come from
+different joint samples, PandaChain computes them with the forward
+kinematics of the Panda, from the very joint state the effort came from.
+
+The chain uses the modified Denavit-Hartenberg parameters Franka publishes
+for the Panda, which match the link frames of its URDF. All transforms are
+written into buffers allocated once.
+"""
+
+import math
+
+import numpy as np
+
+JOINT_NAMES = [f'panda_joint{i}' for i in range(1, 8)]
+
+# modified Denavit-Hartenberg parameters of panda_joint1 to panda_joint7
+DH_A = np.array([0.0, 0.0, 0.0, 0.0825, -0.0825, 0.0, 0.088])  # m
+DH_D = np.array([0.333, 0.0, 0.316, 0.0, 0.384, 0.0, 0.0])  # m
+DH_ALPHA = np.array([0.0, -math.pi / 2, math.pi / 2, math.pi / 2,
+                     -math.pi / 2, math.pi / 2, math.pi / 2])  # rad
+
+FLANGE_OFFSET = 0.107  # m, panda_link7 to panda_link8
+HAND_ANGLE = -math.pi / 4  # rad, panda_link8 to panda_hand, about z
+TCP_OFFSET = 0.1034  # m, panda_hand to panda_hand_tcp
+
+
+def translation_z(offset):
+    """Return the transform of a translation along z."""
+    transform = np.eye(4)
+    transform[2, 3] = offset
+    return transform
+
+
+def rotation_z(angle):
+    """Return the transform of a rotation about z."""
+    transform = np.eye(4)
+    c, s = math.cos(angle), math.sin(angle)
+    transform[:2, :2] = [[c, -s], [s, c]]
+    return transform
+
+
+# panda_link7 to panda_hand, and panda_hand to panda_hand_tcp
+LINK7_TO_HAND = translation_z(FLANGE_OFFSET) @ rotation_z(HAND_ANGLE)
+HAND_TO_TCP = translation_z(TCP_OFFSET)
+
+
+class PandaChain:
+    """The forward kinematics of the Panda, from panda_link0 to the tcp."""
+
+    def __init__(self):
+        """
+        Allocate the transforms of the chain.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        # the transform of every joint, from the previous link to its own.
+        # Tx(a) Rx(alpha) Tz(d) Rz(q) only depends on q through its top left
+        # 3x2 block, so the rest is filled in once.
+        cos_alpha = np.cos(DH_ALPHA)
+        sin_alpha = np.sin(DH_ALPHA)
+        self.joints = np.zeros((7, 4, 4))
+        self.joints[:, 0, 3] = DH_A
+        self.joints[:, 1, 2] = -sin_alpha
+        self.joints[:, 1, 3] = -sin_alpha * DH_D
+        self.joints[:, 2, 2] = cos_alpha
+        self.joints[:, 2, 3] = cos_alpha * DH_D
+        self.joints[:, 3, 3] = 1.0
+        self.cos_alpha = cos_alpha
+        self.sin_alpha = sin_alpha
+
+        # panda_link1 to panda_link7 in panda_link0
+        self.links = np.zeros((7, 4, 4))
+        # panda_hand and panda_hand_tcp in panda_link6
+        self.hand = np.eye(4)
+        self.tcp = np.eye(4)
+        self.cos_q = np.zeros(7)
+        self.sin_q = np.zeros(7)
+
+    def update(self, positions):
+        """
+        Compute the frames of the chain for a set of joint positions.
+
+        Args
+        ----
+        positions (numpy array): The positions of panda_joint1 to
+        panda_joint7, in rad.
+
+        Returns
+        -------
+        None
+
+        """
+        np.cos(positions, out=self.cos_q)
+        np.sin(positions, out=self.sin_q)
+        joints = self.joints
+        joints[:, 0, 0] = self.cos_q
+        joints[:, 0, 1] = -self.sin_q
+        np.multiply(self.sin_q, self.cos_alpha, out=joints[:, 1, 0])
+        np.multiply(self.cos_q, self.cos_alpha, out=joints[:, 1, 1])
+        np.multiply(self.sin_q, self.sin_alpha, out=joints[:, 2, 0])
+        np.multiply(self.cos_q, self.sin_alpha, out=joints[:, 2, 1])
+
+        self.links[0] = joints[0]
+        for i in range(1, 7):
+            np.matmul(self.links[i - 1], joints[i], out=self.links[i])
+
+        np.matmul(joints[6], LINK7_TO_HAND, out=self.hand)
+        np.matmul(self.hand, HAND_TO_TCP, out=self.tcp)
+
+    @property
+    def link6(self):
+        """The transform of panda_link6 in panda_link0."""
+        return self.links[5]
+
+    def tcp_in_base(self):
+        """Return the transform of panda_hand_tcp in panda_link0."""
+        return self.link6 @ self.tcp
+
+
+class ForceEstimator:
+    """Estimate the force at the end-effector from a joint state."""
+
+    def __init__(self, gripper_mass, g, center_of_mass):
+        """
+        Initialize the estimator.
+
+        Args
+        ----
+        gripper_mass (float): The mass of the gripper and its attachments,
+        in kg.
+        g (float): The acceleration due to gravity, in m/s**2.
+        center_of_mass (numpy array): The center of mass of the gripper in
+        the panda_hand frame, in m.
+
+        Returns
+        -------
+        None
+
+        """
+        self.chain = PandaChain()
+        self.weight = np.array([0.0, 0.0, -gripper_mass * g])  # N
+        self.center_of_mass = np.asarray(center_of_mass, dtype=float)
+
+        # where panda_joint1 to panda_joint7 are in the joint state messages,
+        # worked out again whenever the joint names change
+        self.names = None
+        self.index = np.arange(7)
+
+        self.positions = np.zeros(7)
+        self.moment = np.zeros(3)
+        self.force = np.zeros(3)
+
+    def update(self, joint_state):
+        """
+        Compute the frames of the chain for a joint state.
+
+        Args
+        ----
+        joint_state (JointState): The joint state of the robot.
+
+        Returns
+        -------
+        None
+
+        """
+        if joint_state.name != self.names:
+            self.names = list(joint_state.name)
+            if all(name in self.names for name in JOINT_NAMES):
+                self.index = np.array([self.names.index(name)
+                                       for name in JOINT_NAMES])
+            else:
+                self.index = np.arange(7)
+        self.positions[:] = np.take(joint_state.position, self.index)
+        self.chain.update(self.positions)
+
+    def joint_torque_offset(self):
+        """
+        Calculate the joint torque offset in panda_joint6.
+
+        Using the location of the center of mass of the gripper and
+        the mass of the gripper and its attachments, figure out the
+        portion of the torque in panda_joint6 that is due to
+        the gripper itself.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        joint_torque_offset (float): The amount of torque in panda_joint6
+        that is due to the mass of the end-effector and its attachments.
+
+        """
+        # the force due to gravity in the frame of panda_link6. The
+        # rotation is orthonormal, so its transpose is its inverse.
+        F6 = self.chain.link6[:3, :3].T @ self.weight
+
+        # the expected moment in panda_joint6
+        hand = self.chain.hand
+        M6 = F6 * (hand[:3, 3] + hand[:3, :3] @ self.center_of_mass)
+
+        return M6[1]
+
+    def ee_force(self, effort_joint6):
+        """
+        Calculate the force at the end-effector.
+
+        Calculate the force at the end-effector in the xyz directions
+        in the frame of the end-effector.
+
+        Args
+        ----
+        effort_joint6 (float): The effort in panda_joint6 in Nm.
+
+        Returns
+        -------
+        Fe (numpy array): force at the end effector.
+
+        """
+        tcp = self.chain.tcp
+        p6e = tcp[:3, 3]
+
+        # torque in panda_joint6, which is about its y axis.
+        self.moment[1] = effort_joint6
+
+        # the force at the ee due to the moment.
+        self.force.fill(0.0)
+        np.divide(self.moment, p6e, out=self.force, where=p6e != 0)
+
+        # from the panda_link6 frame to the ee frame.
+        return tcp[:3, :3].T @ self.force
+
+    def estimate(self, joint_state):
+        """
+        Estimate the force at the end-effector from a joint state.
+
+        Args
+        ----
+        joint_state (JointState): The joint state of the robot, with
+        efforts.
+
+        Returns
+        -------
+        Fe (numpy array): force at the end effector.
+
+        """
+        self.update(joint_state)
+        effort_joint6 = joint_state.effort[self.index[5]]
+        return self.ee_force(effort_joint6 - self.joint_torque_offset())
@@ -0,0 +1,342 @@
+"""
+Precompiled stroke geometry for the characters written on the board.
+
+Rendering the alphabet with matplotlib's TextToPath is slow and drags all of
+matplotlib into the brain node, so the geometry is built once and cached on
+disk as a small NumPy archive. The cache is keyed by the font family, the
+board scale and the scale factor, and carries a format version. A warm cache
+is loaded without importing matplotlib; a stale or missing one is rebuilt.
+"""
+
+from array import array
+import hashlib
+import os
+
+import numpy as np
+
+from drawing.bezier import flatten_path
+
+# bump the version whenever the way glyphs are built changes, including
+# the flattening tolerance, so stale caches are rebuilt
+ATLAS_VERSION = 3
+FLATTEN_TOLERANCE = 0.0001  # m
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0|-/_'
+DEFAULT_FONT = 'Liberation Sans Narrow'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.ros', 'drawing')
+
+# the strokes of the hangman, in meters at a board scale of 1
+MAN_STROKES = {
+    '|': [[0.0, 0.1], [0.0, 0.05], [0.0, 0.002]],  # Body of man
+    '-': [[0.05, 0.05], [0.1, 0.05], [0.15, 0.05]],  # Arms of man
+    '/': [[0.1, 0.1], [0.075, 0.06], [0.05, 0.02]],  # Leg of man 1
+    '_': [[0.0, 0.1], [0.025, 0.06], [0.05, 0.02]],  # Leg of man 2
+}
+
+
+class Glyph:
+    """
+    The stroke geometry of one character.
+
+    The points are held as an (N, 2) float array alongside a boolean mask
+    that is True wherever the pen touches the board, so the columns can be
+    handed straight to a BoardTiles request.
+    """
+
+    __slots__ = ('points', 'pen_down', 'x', 'y')
+
+    def __init__(self, points, pen_down=None):
+        """
+        Initialize the glyph.
+
+        Args
+        ----
+        points (numpy array): An (N, 2) array of x, y points in meters.
+        pen_down (numpy array): Whether the pen is on the board at each
+        point. Defaults to the pen being down everywhere.
+
+        Returns
+        -------
+        None
+
+        """
+        self.points = np.ascontiguousarray(points, dtype=float).reshape(-1, 2)
+        if pen_down is None:
+            pen_down = np.ones(len(self.points), dtype=bool)
+        self.pen_down = np.ascontiguousarray(pen_down, dtype=bool)
+        self.x = np.ascontiguousarray(self.points[:, 0])
+        self.y = np.ascontiguousarray(self.points[:, 1])
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def from_contours(cls, contours):
+        """
+        Build a glyph from separate contours.
+
+        The pen is lifted between contours: a pen-up point over the start of
+        each following contour moves the pen there off the board, and a
+        final pen-up point lifts it off the end of the last contour.
+
+        Args
+        ----
+        contours (list): One (M, 2) array of points per contour.
+
+        Returns
+        -------
+        glyph (Glyph): The glyph with its pen-down mask.
+
+        """
+        points = []
+        pen_down = []
+        for contour in contours:
+            if points:
+                points.append(contour[:1])
+                pen_down.append(np.zeros(1, dtype=bool))
+            points.append(contour)
+            pen_down.append(np.ones(len(contour), dtype=bool))
+        if not points:
+            return cls(np.empty((0, 2)))
+        points.append(points[-1][-1:])
+        pen_down.append(np.zeros(1, dtype=bool))
+        return cls(np.concatenate(points), np.concatenate(pen_down))
+
+    def tile_arrays(self):
+        """
+        Return the glyph in the form a BoardTiles request expects.
+
+        Returns
+        -------
+        board_x (array): The x points on the board plane.
+        board_y (array): The y points on the board plane.
+        board_bool (list): Whether each point is on the board.
+
+        """
+        return (array('d', self.x.tobytes()), array('d', self.y.tobytes()),
+                self.pen_down.tolist())
+
+
+class GlyphAtlas:
+    """The stroke geometry of every character the robot can write."""
+
+    def __init__(self, font_family, board_scale, scale_factor, glyphs):
+        """
+        Initialize the atlas.
+
+        Args
+        ----
+        font_family (string): The font the letters were rendered with.
+        board_scale (float): The scale of the board.
+        scale_factor (float): The font units to meters scale factor.
+        glyphs (dict): Maps each character to its Glyph.
+
+        Returns
+        -------
+        None
+
+        """
+        self.font_family = font_family
+        self.board_scale = float(board_scale)
+        self.scale_factor = float(scale_factor)
+        self.glyphs = glyphs
+
+    def __getitem__(self, letter):
+        return self.glyphs[letter]
+
+    def __contains__(self, letter):
+        return letter in self.glyphs
+
+    def __len__(self):
+        return len(self.glyphs)
+
+    def keys(self):
+        """Return the characters in the atlas."""
+        return self.glyphs.keys()
+
+    def key(self):
+        """Return the inputs that determine the geometry of the atlas."""
+        return (ATLAS_VERSION, self.font_family, self.board_scale,
+                self.scale_factor)
+
+    @classmethod
+    def build(cls, font_family, board_scale, scale_factor, letters=LETTERS):
+        """
+        Render every character into stroke geometry.
+
+        This is the only place matplotlib is imported, so it is only paid
+        for when the cache is cold. Letter outlines are flattened from their
+        path codes, one contour per pen stroke.
+
+        Args
+        ----
+        font_family (string): The font to render the letters with.
+        board_scale (float): The scale of the board.
+        scale_factor (float): The font units to meters scale factor.
+        letters (string): The characters to render.
+
+        Returns
+        -------
+        atlas (GlyphAtlas): The rendered atlas.
+
+        """
+        from matplotlib.font_manager import FontProperties
+        from matplotlib.textpath import TextToPath
+
+        text_to_path = TextToPath()
+        fp = FontProperties(family=font_family, style="normal")
+        scale = scale_factor * board_scale
+
+        glyphs = {}
+        for letter in letters:
+            if letter == '0':  # Head of man
+                t = np.arange(26) / 25
+                points = np.column_stack(
+                    (35 * np.cos(2 * np.pi * t),
+                     35 + 35 * np.sin(2 * np.pi * t))) * scale
+                glyph = Glyph(points)
+            elif letter in MAN_STROKES:  # Body, arms and legs of man
+                glyph = Glyph(np.array(MAN_STROKES[letter]) * board_scale)
+            else:  # All letters of alphabet
+                verts, codes = text_to_path.get_text_path(fp, letter)
+                contours = flatten_path(
+                    verts, codes, FLATTEN_TOLERANCE / scale)
+                glyph = Glyph.from_contours(
+                    [contour * scale for contour in contours])
+            glyphs[letter] = glyph
+
+        return cls(font_family, board_scale, scale_factor, glyphs)
+
+    def save(self, path):
+        """
+        Write the atlas to disk.
+
+        All glyphs are packed into one contiguous point array and pen mask
+        with an offset table, and the file is written atomically so a
+        crashed node never leaves a half written cache behind.
+
+        Args
+        ----
+        path (string): The file to write the atlas to.
+
+        Returns
+        -------
+        None
+
+        """
+        letters = list(self.glyphs.keys())
+        lengths = [len(self.glyphs[letter]) for letter in letters]
+        offsets = np.zeros(len(letters) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        points = np.concatenate(
+            [self.glyphs[letter].points for letter in letters])
+        pen_down = np.concatenate(
+            [self.glyphs[letter].pen_down for letter in letters])
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file,
+                     version=np.int64(ATLAS_VERSION),
+                     font_family=np.str_(self.font_family),
+                     board_scale=np.float64(self.board_scale),
+                     scale_factor=np.float64(self.scale_factor),
+                     letters=np.array(letters),
+                     offsets=offsets,
+                     points=points,
+                     pen_down=pen_down)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an atlas from disk.
+
+        Args
+        ----
+        path (string): The file to read the atlas from.
+
+        Returns
+        -------
+        atlas (GlyphAtlas): The atlas, or None if the file is missing,
+        unreadable or written by a different version of this module.
+
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != ATLAS_VERSION:
+                    return None
+                offsets = data['offsets']
+                points = data['points']
+                pen_down = data['pen_down']
+                glyphs = {}
+                for i, letter in enumerate(data['letters']):
+                    start, end = offsets[i], offsets[i + 1]
+                    glyphs[str(letter)] = Glyph(
+                        points[start:end], pen_down[start:end])
+                return cls(str(data['font_family']),
+                           float(data['board_scale']),
+                           float(data['scale_factor']),
+                           glyphs)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def atlas_path(cache_dir, font_family, board_scale, scale_factor):
+    """
+    Return the cache file for a set of atlas inputs.
+
+    Args
+    ----
+    cache_dir (string): The directory holding cached atlases.
+    font_family (string): The font the letters are rendered with.
+    board_scale (float): The scale of the board.
+    scale_factor (float): The font units to meters scale factor.
+
+    Returns
+    -------
+    path (string): The path of the cache file.
+
+    """
+    key = repr((ATLAS_VERSION, font_family, float(board_scale),
+                float(scale_factor)))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"glyphs-{digest}.npz")
+
+
+def load_glyph_atlas(font_family=DEFAULT_FONT, board_scale=1.0,
+                     scale_factor=0.001, cache_dir=DEFAULT_CACHE_DIR,
+                     logger=None):
+    """
+    Load the glyph atlas from the cache, rebuilding it if needed.
+
+    Args
+    ----
+    font_family (string): The font the letters are rendered with.
+    board_scale (float): The scale of the board.
+    scale_factor (float): The font units to meters scale factor.
+    cache_dir (string): The directory holding cached atlases.
+    logger (RcutilsLogger): Optional logger to report cache misses on.
+
+    Returns
+    -------
+    atlas (GlyphAtlas): The glyph atlas.
+
+    """
+    path = atlas_path(cache_dir, font_family, board_scale, scale_factor)
+    atlas = GlyphAtlas.load(path)
+    expected = (ATLAS_VERSION, font_family, float(board_scale),
+                float(scale_factor))
+    if atlas is not None and atlas.key() == expected and \
+            all(letter in atlas for letter in LETTERS):
+        return atlas
+
+    if logger is not None:
+        logger.info(f"Building glyph atlas at {path}")
+    atlas = GlyphAtlas.build(font_family, board_scale, scale_factor)
+    try:
+        atlas.save(path)
+    except OSError as e:
+        # a read-only home directory should not stop the game
+        if logger is not None:
+            logger.warn(f"Could not cache glyph atlas: {e}")
+    return atlas
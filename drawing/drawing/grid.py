@@ -1,7 +1,10 @@
 import numpy as np
-from geometry_msgs.msg import Point, Quaternion, Vector3
+from geometry_msgs.msg import Point, Quaternion, Vector3, Pose
 import transforms3d as tf
 
+# tile positions are shrunk by this much to fit the board
+TILE_SCALE = 0.667
+
 
 class Grid:
     def __init__(self, xrange, yrange, cell_size):
@@ -40,6 +43,14 @@ class Grid:
             point_x += .1*position
         return [point_x, point_y]
 
+    def tile_origin(self, mode, position):
+        point_x, point_y = self.grid_to_world(mode, position)
+        return [point_x * TILE_SCALE, point_y * TILE_SCALE]
+
+
+def board_grid():
+    return Grid((0, 0.8), (0, 0.40), 0.1)
+
 
 def matrix_to_position_quaternion(matrix, point=0):
     translation = matrix[:3, 3]
@@ -76,3 +87,88 @@ def array_to_transform_matrix(translation, quaternion):
     transform_matrix[:3, 3] = translation
 
     return transform_matrix
+
+
+def transform_stack(transform, rotation, translations):
+    """
+    Compose one transform with many that share a rotation.
+
+    Args
+    ----
+    transform (numpy array): A 4x4 transformation matrix.
+    rotation (numpy array): The 3x3 rotation shared by the local frames.
+    translations (numpy array): An (N, 3) array of local frame origins.
+
+    Returns
+    -------
+    transforms (numpy array): The (N, 4, 4) transforms
+    transform @ [rotation | translation].
+
+    """
+    translations = np.asarray(translations, dtype=float).reshape(-1, 3)
+    local = np.zeros((len(translations), 4, 4))
+    local[:, :3, :3] = rotation
+    local[:, :3, 3] = translations
+    local[:, 3, 3] = 1.0
+    return transform @ local
+
+
+def transforms_to_poses(transforms):
+    """
+    Convert transforms that share a rotation into Pose messages.
+
+    The quaternion is only computed once, from the first transform.
+
+    Args
+    ----
+    transforms (numpy array): An (N, 4, 4) array of transforms with the
+    same rotation.
+
+    Returns
+    -------
+    poses (Pose[]): One Pose per transform.
+
+    """
+    if len(transforms) == 0:
+        return []
+    qw, qx, qy, qz = tf.quaternions.mat2quat(transforms[0, :3, :3]).tolist()
+    return [Pose(position=Point(x=x, y=y, z=z),
+                 orientation=Quaternion(x=qx, y=qy, z=qz, w=qw))
+            for x, y, z in transforms[:, :3, 3].tolist()]
+
+
+def move_poses(poses, positions):
+    """
+    Move Pose messages to new positions, keeping their orientations.
+
+    Args
+    ----
+    poses (Pose[]): The poses.
+    positions (numpy array): The (N, 3) x, y, z positions to move them to.
+
+    Returns
+    -------
+    poses (Pose[]): The moved poses.
+
+    """
+    return [Pose(position=Point(x=x, y=y, z=z), orientation=pose.orientation)
+            for (x, y, z), pose in zip(np.asarray(positions).tolist(), poses)]
+
+
+def pose_positions(poses):
+    """
+    Stack the positions of Pose messages.
+
+    Args
+    ----
+    poses (Pose[]): The poses.
+
+    Returns
+    -------
+    positions (numpy array): The (N, 3) x, y, z positions.
+
+    """
+    positions = np.empty((len(poses), 3))
+    for row, pose in zip(positions, poses):
+        row[:] = pose.position.x, pose.position.y, pose.position.z
+    return positions
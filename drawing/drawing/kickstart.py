@@ -7,6 +7,7 @@
 Parameters
 ----------
 mode, position
+log_pose_dumps (bool) - Whether to log poses at debug level.
 
 Services:
 --------
@@ -14,7 +15,7 @@ kickstart_service
 
 Clients For:
 ---------------
-calibrate, where_to_write, moveit_mp, cartesian_mp
+calibrate, where_to_write_batch, moveit_mp, cartesian_mp
 
 """
 
@@ -24,7 +25,10 @@ from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
 
 from std_srvs.srv import Empty
 
-from brain_interfaces.srv import BoardTiles, MovePose, Cartesian
+from brain_interfaces.srv import BoardTilesBatch, MovePose, Cartesian
+from brain_interfaces.msg import BoardTile
+
+from drawing.pose_logging import declare_pose_dump
 
 
 class Kickstart(Node):
@@ -32,6 +36,7 @@ class Kickstart(Node):
 
     def __init__(self):
         super().__init__("kickstart")
+        self.pose_dump = declare_pose_dump(self)
 
         # create kickstart service
         self.kickstart_service = self.create_service(
@@ -47,7 +52,7 @@ class Kickstart(Node):
         self.cal_client = self.create_client(
             Empty, 'calibrate', callback_group=self.cal_callback_group)
         self.tile_client = self.create_client(
-            BoardTiles, 'where_to_write',
+            BoardTilesBatch, 'where_to_write_batch',
             callback_group=self.tile_callback_group)
         self.movemp_client = self.create_client(
             MovePose, '/moveit_mp', callback_group=self.mp_callback_group)
@@ -73,32 +78,29 @@ class Kickstart(Node):
         await self.cal_client.call_async(request=Empty.Request())
         self.get_logger().info('Finished calibrating!')
 
-        # Dashes
-        # Draw dashes for word to guess
-        await self.draw_component(1, 0)
-        self.get_logger().info('Started dashes for word to guess!')
-        await self.draw_component(1, 1)
-        await self.draw_component(1, 2)
-        await self.draw_component(1, 3)
-        await self.draw_component(1, 4)
-
-        # Draw dashes for wrong letters
-        await self.draw_component(0, 0)
-        self.get_logger().info('Started dashes for wrong guesses!')
-        await self.draw_component(0, 1)
-        await self.draw_component(0, 2)
-        await self.draw_component(0, 3)
-        await self.draw_component(0, 4)
-
-        # Draw stand for hangman
-        self.get_logger().info('Drawing hangman stand!')
-        await self.draw_component(3, 0)
+        # Dashes for word to guess, dashes for wrong letters, then the stand
+        components = [(1, position) for position in range(5)] + \
+            [(0, position) for position in range(5)] + [(3, 0)]
+        tiles = [self.component_tile(mode, position)
+                 for mode, position in components]
+
+        # Get the poses of every component in one call
+        resp = await self.tile_client.call_async(
+            BoardTilesBatch.Request(tiles=tiles))
+
+        for tile, poses in zip(tiles, resp.tiles):
+            if tile.mode == 1 and tile.position == 0:
+                self.get_logger().info('Started dashes for word to guess!')
+            elif tile.mode == 0 and tile.position == 0:
+                self.get_logger().info('Started dashes for wrong guesses!')
+            elif tile.mode == 3:
+                self.get_logger().info('Drawing hangman stand!')
+            await self.draw_component(tile, poses)
 
         return response
 
-    async def draw_component(self, mode, position):
-        """Queues all of the services needed to draw individual\
-           components like the stand or dashes."""
+    def component_tile(self, mode, position):
+        """Create the tile for a component like the stand or a dash."""
         # if mode = 0 or 1 then drawing dashes
         dash_x = [0.01, 0.09, 0.09]
         dash_y = [0.0, 0.0, 0.0]
@@ -109,84 +111,53 @@ class Kickstart(Node):
         stand_y = [0.05, 0.05, 0.00, 0.00]
         stand_on = [True, True, True, False]
 
-        if mode == 0 or mode == 1:
-            # take in mode and position and draw component accordingly
-            request = BoardTiles.Request()
-            request.mode = mode
-            request.position = position
-            request.x = dash_x
-            request.y = dash_y
-            request.onboard = dash_on
-
-            # denote pose_list and initial_pose from BoardTiles response
-            resp = await self.tile_client.call_async(request)
-            pose1 = resp.initial_pose
-            pose_list = resp.pose_list
-
-            # moving to the position
-            self.get_logger().info(f"Pose List for Dash: {pose1}")
-            self.get_logger().info(f"Pose List for Dash: {pose_list}")
-            request2 = Cartesian.Request()
-            request2.poses = [pose1]
-            request2.velocity = 0.1
-            request2.replan = False
-            request2.use_force_control = [False]
-            await self.cartesian_client.call_async(request2)
-
-            request2 = Cartesian.Request()
-            request2.poses = [pose_list[0]]
-            request2.velocity = 0.015
-            request2.replan = False
-            request2.use_force_control = [dash_on[0]]
-            await self.cartesian_client.call_async(request2)
-
-            # draw remaining pose dashes with Cartesian mp
-            request3 = Cartesian.Request()
-            request3.poses = pose_list[1:]
-            request3.velocity = 0.015
-            request3.replan = True
-            request3.use_force_control = dash_on[1:]
-            self.get_logger().info(f"pose_list: {pose_list[1:]}")
-            await self.cartesian_client.call_async(request3)
-
+        # take in mode and position and draw component accordingly
+        tile = BoardTile()
+        tile.mode = mode
+        tile.position = position
         if mode == 3:
-            # take in mode and position and draw component accordingly
-            request = BoardTiles.Request()
-            request.mode = mode
-            request.position = position
-            request.x = stand_x
-            request.y = stand_y
-            request.onboard = stand_on
-
-            # denote pose_list and initial_pose from BoardTiles response
-            resp = await self.tile_client.call_async(request)
-            pose1 = resp.initial_pose
-            pose_list = resp.pose_list
-
-            self.get_logger().info(f"Pose List for Stand: {pose1}")
-            self.get_logger().info(f"Pose List for Stand: {pose_list}")
-            request2 = Cartesian.Request()
-            request2.poses = [pose1]
-            request2.velocity = 0.1
-            request2.replan = False
-            request2.use_force_control = [False]
-            await self.cartesian_client.call_async(request2)
-
-            request2 = Cartesian.Request()
-            request2.poses = [pose_list[0]]
-            request2.velocity = 0.015
-            request2.replan = False
-            request2.use_force_control = [stand_on[0]]
-            await self.cartesian_client.call_async(request2)
-
-            # draw remaining pose dashes with Cartesian mp
-            request3 = Cartesian.Request()
-            request3.poses = pose_list[1:]
-            request3.velocity = 0.015
-            request3.replan = True
-            request3.use_force_control = stand_on[1:]
-            self.get_logger().info(f"pose_list: {pose_list[1:]}")
-            await self.cartesian_client.call_async(request3)
+            tile.x = stand_x
+            tile.y = stand_y
+            tile.onboard = stand_on
+        else:
+            tile.x = dash_x
+            tile.y = dash_y
+            tile.onboard = dash_on
+        return tile
+
+    async def draw_component(self, tile, poses):
+        """Queues all of the services needed to draw individual\
+           components like the stand or dashes."""
+        # denote pose_list and initial_pose from the where_to_write response
+        pose1 = poses.initial_pose
+        pose_list = poses.pose_list
+        name = 'Stand' if tile.mode == 3 else 'Dash'
+
+        # moving to the position
+        self.pose_dump(f"Pose List for {name}", pose1)
+        self.pose_dump(f"Pose List for {name}", pose_list)
+        request2 = Cartesian.Request()
+        request2.poses = [pose1]
+        request2.velocity = 0.1
+        request2.replan = False
+        request2.use_force_control = [False]
+        await self.cartesian_client.call_async(request2)
+
+        request2 = Cartesian.Request()
+        request2.poses = [pose_list[0]]
+        request2.velocity = 0.015
+        request2.replan = False
+        request2.use_force_control = [tile.onboard[0]]
+        await self.cartesian_client.call_async(request2)
+
+        # draw remaining poses with Cartesian mp
+        request3 = Cartesian.Request()
+        request3.poses = pose_list[1:]
+        request3.velocity = 0.015
+        request3.replan = True
+        request3.use_force_control = tile.onboard[1:]
+        self.pose_dump("pose_list", lambda: pose_list[1:])
+        await self.cartesian_client.call_async(request3)
 
 
 def main(args=None):
@@ -0,0 +1,389 @@
+"""
+Cache the results of motion planning requests.
+
+The same poses are planned for over and over again: the home pose after
+every turn, the calibration pose, and the start of every tile. The caches
+here remember recent results in least recently used order, so a repeated
+request can skip the round trip to MoveIt. Results depend on the planning
+scene, so the caches are invalidated whenever an obstacle is added, moved or
+removed. CollisionScene keeps track of the boxes in the scene, so that
+publishing the same box again, or removing a box that is already gone, does
+not count as a change.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """A mapping that forgets the least recently used entry when full."""
+
+    def __init__(self, capacity=64):
+        """
+        Initialize the cache.
+
+        Args
+        ----
+        capacity (int): The largest number of entries to keep.
+
+        Returns
+        -------
+        None
+
+        """
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return the number of entries in the cache."""
+        return len(self.entries)
+
+    def get(self, key, valid=None):
+        """
+        Look up an entry and mark it as recently used.
+
+        Args
+        ----
+        key (tuple): The key of the entry.
+        valid (function): Called with the cached value, if given. The lookup
+        is a miss if it returns False.
+
+        Returns
+        -------
+        value: The cached value, or None on a miss.
+
+        """
+        if key not in self.entries or \
+                (valid is not None and not valid(self.entries[key])):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        """
+        Add an entry, evicting the least recently used one if needed.
+
+        Args
+        ----
+        key (tuple): The key of the entry.
+        value: The value to cache.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every entry, keeping the hit and miss counters."""
+        self.entries.clear()
+
+
+def quantize(values, tolerance):
+    """
+    Snap values to a grid, so values closer than tolerance tend to match.
+
+    Args
+    ----
+    values (sequence): The values to quantize.
+    tolerance (float): The spacing of the grid.
+
+    Returns
+    -------
+    key (tuple): The grid index of every value.
+
+    """
+    values = np.asarray(values, dtype=float)
+    if tolerance <= 0.0:
+        return tuple(values.tolist())
+    return tuple(np.round(values / tolerance).astype(int).tolist())
+
+
+def pose_key(pose, position_tolerance, orientation_tolerance):
+    """
+    Return a hashable key for a pose.
+
+    Args
+    ----
+    pose (Pose): The pose.
+    position_tolerance (float): The grid spacing of the position, in m.
+    orientation_tolerance (float): The grid spacing of the quaternion.
+
+    Returns
+    -------
+    key (tuple): The quantized position and orientation.
+
+    """
+    position = pose.position
+    orientation = pose.orientation
+    quaternion = np.array(
+        [orientation.w, orientation.x, orientation.y, orientation.z])
+    # q and -q are the same rotation
+    nonzero = np.flatnonzero(np.abs(quaternion) > 1e-9)
+    if len(nonzero) and quaternion[nonzero[0]] < 0.0:
+        quaternion = -quaternion
+    return (quantize([position.x, position.y, position.z],
+                     position_tolerance),
+            quantize(quaternion, orientation_tolerance))
+
+
+class CollisionScene:
+    """The collision boxes in the planning scene."""
+
+    def __init__(self):
+        """
+        Initialize the scene with no boxes.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        self.boxes = {}
+
+    @property
+    def version(self):
+        """A key that is the same whenever the boxes in the scene are."""
+        return hash(frozenset(self.boxes.items()))
+
+    def apply(self, box_id, frame_id, dimensions, pose):
+        """
+        Add, move or remove a box, as the planning scene would.
+
+        Args
+        ----
+        box_id (string): The id of the box.
+        frame_id (string): The frame the box is placed in.
+        dimensions (list): The lengths of the edges of the box. A box with
+        no size removes the box with that id.
+        pose (Pose): The pose of the box origin.
+
+        Returns
+        -------
+        changed (bool): Whether the scene is different afterwards.
+
+        """
+        dimensions = tuple(float(size) for size in dimensions)
+        if not any(dimensions):
+            return self.boxes.pop(box_id, None) is not None
+
+        position = pose.position
+        orientation = pose.orientation
+        box = (frame_id, dimensions,
+               (position.x, position.y, position.z),
+               (orientation.x, orientation.y, orientation.z, orientation.w))
+        if self.boxes.get(box_id) == box:
+            return False
+        self.boxes[box_id] = box
+        return True
+
+
+class IKCache(LRUCache):
+    """Inverse kinematics solutions, keyed by target pose and seed."""
+
+    def __init__(self, capacity=64, position_tolerance=0.0005,
+                 orientation_tolerance=0.001, seed_resolution=0.5):
+        """
+        Initialize the cache.
+
+        Args
+        ----
+        capacity (int): The largest number of solutions to keep.
+        position_tolerance (float): The grid spacing target positions are
+        quantized to, in m.
+        orientation_tolerance (float): The grid spacing target quaternions
+        are quantized to.
+        seed_resolution (float): The width of the seed configuration
+        buckets, in rad. IK solvers can return a different branch for a
+        different seed, so only seeds in the same bucket share a solution.
+
+        Returns
+        -------
+        None
+
+        """
+        super().__init__(capacity)
+        self.position_tolerance = position_tolerance
+        self.orientation_tolerance = orientation_tolerance
+        self.seed_resolution = seed_resolution
+
+    def key(self, pose, seed):
+        """
+        Return the key of an IK request.
+
+        Args
+        ----
+        pose (Pose): The target pose of the end-effector.
+        seed (sequence): The joint positions the solver starts from.
+
+        Returns
+        -------
+        key (tuple): The key of the request.
+
+        """
+        return (pose_key(pose, self.position_tolerance,
+                         self.orientation_tolerance),
+                quantize(seed, self.seed_resolution))
+
+    async def solve(self, pose, seed, solver):
+        """
+        Return a cached IK solution, or solve and cache it.
+
+        Args
+        ----
+        pose (Pose): The target pose of the end-effector.
+        seed (sequence): The joint positions the solver starts from.
+        solver (coroutine function): Called with the pose on a miss. Returns
+        the solution and whether it is valid. Only valid solutions are
+        cached.
+
+        Returns
+        -------
+        solution: The solution returned by the solver, or the cached one.
+
+        """
+        key = self.key(pose, seed)
+        solution = self.get(key)
+        if solution is None:
+            solution, valid = await solver(pose)
+            if valid:
+                self.put(key, solution)
+        return solution
+
+
+def apply_box(scene, ik_cache, box_id, frame_id, dimensions, pose):
+    """
+    Apply a box to the scene, and forget IK solutions if the scene changed.
+
+    Cached plans need no clearing: they are keyed on the scene version.
+
+    Args
+    ----
+    scene (CollisionScene): The boxes in the planning scene.
+    ik_cache (IKCache): The IK solutions found in the scene.
+    box_id (string): The id of the box.
+    frame_id (string): The frame the box is placed in.
+    dimensions (list): The lengths of the edges of the box, all 0 to remove
+    it.
+    pose (Pose): The pose of the box origin.
+
+    Returns
+    -------
+    changed (bool): Whether the scene is different afterwards.
+
+    """
+    # IK solutions may collide with a new or moved box
+    changed = scene.apply(box_id, frame_id, dimensions, pose)
+    if changed:
+        ik_cache.clear()
+    return changed
+
+
+class PlanCache(LRUCache):
+    """Planned trajectories, keyed by start state, goal and scene."""
+
+    def __init__(self, capacity=16, start_resolution=0.1,
+                 start_tolerance=0.01, goal_tolerance=0.001):
+        """
+        Initialize the cache.
+
+        Args
+        ----
+        capacity (int): The largest number of trajectories to keep.
+        start_resolution (float): The width of the start state buckets, in
+        rad.
+        start_tolerance (float): How far, in rad, any joint of the start
+        state may be from the start of a cached trajectory for it to be
+        reused.
+        goal_tolerance (float): The grid spacing goal joint positions are
+        quantized to, in rad.
+
+        Returns
+        -------
+        None
+
+        """
+        super().__init__(capacity)
+        self.start_resolution = start_resolution
+        self.start_tolerance = start_tolerance
+        self.goal_tolerance = goal_tolerance
+
+    def key(self, start, goal, scene_version):
+        """
+        Return the key of a planning request.
+
+        Args
+        ----
+        start (sequence): The joint positions the plan starts from.
+        goal (sequence): The goal joint positions.
+        scene_version (int): The version of the planning scene, see
+        CollisionScene.version.
+
+        Returns
+        -------
+        key (tuple): The key of the request.
+
+        """
+        return (quantize(start, self.start_resolution),
+                quantize(goal, self.goal_tolerance), scene_version)
+
+    def lookup(self, start, goal, scene_version):
+        """
+        Return a cached trajectory that starts close enough to start.
+
+        Args
+        ----
+        start (sequence): The joint positions the plan starts from.
+        goal (sequence): The goal joint positions.
+        scene_version (int): The version of the planning scene, see
+        CollisionScene.version.
+
+        Returns
+        -------
+        trajectory: The cached trajectory, or None on a miss.
+
+        """
+        start = np.asarray(start, dtype=float)
+
+        def starts_here(entry):
+            cached_start, _ = entry
+            return cached_start.shape == start.shape and \
+                np.all(np.abs(cached_start - start) <= self.start_tolerance)
+
+        entry = self.get(self.key(start, goal, scene_version), starts_here)
+        return None if entry is None else entry[1]
+
+    def store(self, start, goal, scene_version, trajectory):
+        """
+        Cache a planned trajectory.
+
+        Args
+        ----
+        start (sequence): The joint positions the plan starts from.
+        goal (sequence): The goal joint positions.
+        scene_version (int): The version of the planning scene, see
+        CollisionScene.version.
+        trajectory: The planned trajectory.
+
+        Returns
+        -------
+        None
+
+        """
+        start = np.array(start, dtype=float)
+        self.put(self.key(start, goal, scene_version), (start, trajectory))
@@ -0,0 +1,161 @@
+"""
+Queue the motions Drawing has been asked to plan.
+
+Every pose Drawing plans to comes with how fast to move there, whether to
+hold the pen against the board with force control, and whether the brain
+asked for it to be replanned. A MotionItem keeps all of them together, so
+they cannot drift apart the way parallel lists of them could. A MotionQueue
+holds the items in a deque, so taking items off or putting them back at the
+front does not shift the whole queue.
+"""
+
+from collections import deque
+from itertools import islice
+
+# where a motion request came from
+MOVEIT = 'moveit'
+CARTESIAN = 'cartesian'
+REPLAN = 'replan'
+
+
+class MotionItem:
+    """One pose to plan to, and how to get there."""
+
+    __slots__ = ('pose', 'velocity', 'use_force_control', 'replan', 'source')
+
+    def __init__(self, pose, velocity=0.0, use_force_control=False,
+                 replan=False, source=CARTESIAN):
+        """
+        Initialize the item.
+
+        Args
+        ----
+        pose (Pose): The pose to plan to.
+        velocity (float): The velocity of the cartesian path, in m/s.
+        use_force_control (bool): Whether to execute the trajectory with
+        force control.
+        replan (bool): Whether the trajectory may be replanned while it is
+        executed.
+        source (string): Which request queued the item: MOVEIT, CARTESIAN
+        or REPLAN.
+
+        Returns
+        -------
+        None
+
+        """
+        self.pose = pose
+        self.velocity = velocity
+        self.use_force_control = use_force_control
+        self.replan = replan
+        self.source = source
+
+    def __repr__(self):
+        return (f"MotionItem(pose={self.pose!r}, velocity={self.velocity}, "
+                f"use_force_control={self.use_force_control}, "
+                f"replan={self.replan}, source={self.source!r})")
+
+
+def cartesian_items(request):
+    """
+    Return the items of a cartesian motion plan request.
+
+    Args
+    ----
+    request (Cartesian): The poses to plan through, their velocity,
+    whether to force control each of them, and whether they may be
+    replanned. Poses with no force control flag are planned without it.
+
+    Returns
+    -------
+    items (MotionItem[]): An item for every pose, in order.
+
+    """
+    use_force_control = request.use_force_control
+    return [MotionItem(pose, request.velocity,
+                       i < len(use_force_control) and use_force_control[i],
+                       request.replan, CARTESIAN)
+            for i, pose in enumerate(request.poses)]
+
+
+class MotionQueue:
+    """A first in, first out queue of MotionItems."""
+
+    def __init__(self, items=()):
+        """
+        Initialize the queue.
+
+        Args
+        ----
+        items (MotionItem[]): The items to start with, in order.
+
+        Returns
+        -------
+        None
+
+        """
+        self.items = deque(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def append(self, item):
+        """Queue an item at the back."""
+        self.items.append(item)
+
+    def extend(self, items):
+        """Queue items at the back, in order."""
+        self.items.extend(items)
+
+    def appendleft(self, item):
+        """Queue an item at the front."""
+        self.items.appendleft(item)
+
+    def extendleft(self, items):
+        """Queue items at the front, keeping their order."""
+        self.items.extendleft(reversed(list(items)))
+
+    def popleft(self):
+        """Remove the item at the front and return it."""
+        return self.items.popleft()
+
+    def peek(self, count):
+        """
+        Return the items at the front without removing them.
+
+        Args
+        ----
+        count (int): The most items to return.
+
+        Returns
+        -------
+        items (MotionItem[]): Up to count items, in order.
+
+        """
+        return list(islice(self.items, count))
+
+    def take(self, count):
+        """
+        Remove the items at the front and return them.
+
+        Args
+        ----
+        count (int): The most items to remove.
+
+        Returns
+        -------
+        items (MotionItem[]): Up to count items, in order.
+
+        """
+        return [self.items.popleft()
+                for _ in range(min(count, len(self.items)))]
+
+    def clear(self):
+        """Drop every item."""
+        self.items.clear()
@@ -32,6 +32,7 @@ Subscribers:
 from rclpy.action import ActionClient
 from action_msgs.msg import GoalStatus
 from rclpy.callback_groups import MutuallyExclusiveCallbackGroup
+from rclpy.task import Future
 
 from std_msgs.msg import Header
 
@@ -41,16 +42,143 @@ from moveit_msgs.msg import (JointConstraint, Constraints,
                              OrientationConstraint, PlanningScene,
                              PlanningOptions, RobotState,
                              MotionPlanRequest, WorkspaceParameters,
-                             PositionIKRequest, CollisionObject)
+                             PositionIKRequest, CollisionObject,
+                             MoveItErrorCodes)
 
 from geometry_msgs.msg import Vector3, Quaternion
 from sensor_msgs.msg import JointState
-from trajectory_msgs.msg import JointTrajectoryPoint, JointTrajectory
 
 from franka_msgs.action import Homing, Grasp
 
 from shape_msgs.msg import SolidPrimitive
 
+from drawing.motion_cache import (apply_box, CollisionScene, IKCache,
+                                  PlanCache)
+from drawing.trajectory import CompactTrajectory
+
+
+def movegroup_goal_template(frame_id, group_name, robot_name):
+    """
+    Build a movegroup goal with the planning parameters that never change.
+
+    Args
+    ----
+    frame_id (string): The id of the base frame of the robot.
+    group_name (string): The planning group of the robot.
+    robot_name (string): The name of the robot.
+
+    Returns
+    -------
+    movegroup_goal_msg (MoveGroup): A MoveGroup action object, still missing
+    its stamps, start state and goal constraints.
+
+    """
+    movegroup_goal_msg = MoveGroup.Goal()
+
+    # set up the message
+    movegroup_goal_msg.request = MotionPlanRequest(
+        reference_trajectories=[],
+        pipeline_id='move_group',
+        planner_id='',
+        group_name=group_name,
+        num_planning_attempts=10,
+        allowed_planning_time=5.0,
+        max_velocity_scaling_factor=0.1,
+        max_acceleration_scaling_factor=0.1,
+        max_cartesian_speed=0.0
+    )
+
+    # set the workspace parameters
+    movegroup_goal_msg.request.workspace_parameters = WorkspaceParameters(
+        header=Header(frame_id=frame_id),
+        min_corner=Vector3(x=-1.0, y=-1.0, z=-1.0),
+        max_corner=Vector3(x=1.0, y=1.0, z=1.0))
+
+    movegroup_goal_msg.request.start_state = RobotState(
+        joint_state=JointState(header=Header(frame_id=frame_id)))
+
+    movegroup_goal_msg.request.goal_constraints = [
+        Constraints(name='goal_constraints')]
+
+    orientation_constraint = OrientationConstraint()
+    orientation_constraint.orientation = Quaternion(
+        x=1.0, y=0.0, z=0.0, w=0.0)
+    orientation_constraint.link_name = 'panda_hand_tcp'
+    orientation_constraint.absolute_x_axis_tolerance = 0.1
+    orientation_constraint.absolute_y_axis_tolerance = 0.1
+    orientation_constraint.absolute_z_axis_tolerance = 0.1
+    orientation_constraint.weight = 1.0
+
+    movegroup_goal_msg.request.trajectory_constraints.constraints = [
+        Constraints(
+            name='',
+            orientation_constraints=[orientation_constraint]
+        )]
+
+    # set the planning options
+    movegroup_goal_msg.planning_options = PlanningOptions(
+        planning_scene_diff=PlanningScene(
+            robot_state=RobotState(is_diff=True),
+            robot_model_name=robot_name),
+        plan_only=True,
+        look_around=False,
+        look_around_attempts=0,
+        max_safe_execution_cost=0.0,
+        replan=False)
+
+    return movegroup_goal_msg
+
+
+def patch_movegroup_goal(movegroup_goal_msg, stamp, start_state,
+                         goal_joint_state):
+    """
+    Fill in the parts of a movegroup goal that change with every plan.
+
+    Args
+    ----
+    movegroup_goal_msg (MoveGroup): A goal from movegroup_goal_template.
+    stamp (Time): The time to stamp the goal with.
+    start_state (JointState): The joint state to plan from.
+    goal_joint_state (JointState): The joint state to plan to.
+
+    Returns
+    -------
+    movegroup_goal_msg (MoveGroup): The same goal, patched.
+
+    """
+    request = movegroup_goal_msg.request
+    request.workspace_parameters.header.stamp = stamp
+
+    # set the start state of the robot
+    joint_state = request.start_state.joint_state
+    joint_state.header.stamp = stamp
+    joint_state.name = start_state.name
+    joint_state.position = start_state.position
+    joint_state.velocity = start_state.velocity
+    joint_state.effort = start_state.effort
+
+    # set the goal constraint, reusing the joint constraints of the last
+    # goal when the number of joints is the same
+    joint_constraints = request.goal_constraints[0].joint_constraints
+    if len(joint_constraints) != len(goal_joint_state.name):
+        joint_constraints = [
+            JointConstraint(tolerance_above=0.05, tolerance_below=0.05,
+                            weight=1.0)
+            for _ in goal_joint_state.name]
+        request.goal_constraints[0].joint_constraints = joint_constraints
+    for joint_constraint, joint_state_name, position in zip(
+            joint_constraints, goal_joint_state.name,
+            goal_joint_state.position):
+        joint_constraint.joint_name = joint_state_name
+        joint_constraint.position = position
+
+    request.trajectory_constraints.constraints[0].\
+        orientation_constraints[0].header.stamp = stamp
+    movegroup_goal_msg.planning_options.planning_scene_diff.robot_state.\
+        joint_state.header.stamp = stamp
+
+    return movegroup_goal_msg
+
 
 class Path_Plan_Execute():
 
@@ -128,13 +256,29 @@ class Path_Plan_Execute():
             self.node.get_logger().info(
                 'IK service not available, waiting again...')
 
-        self.movegroup_goal_msg = MoveGroup.Goal()
+        # only the stamps, start state and goal constraints of the goal
+        # change from one plan to the next
+        self.movegroup_goal_msg = movegroup_goal_template(
+            self.node.frame_id, self.node.group_name, self.node.robot_name)
         self.movegroup_result = None
         self.movegroup_status = GoalStatus.STATUS_UNKNOWN
+        self.movegroup_future = Future()
 
         self.goal_joint_state = None
         self.planned_trajectory = None
 
+        # the boxes published to the planning scene
+        self.scene = CollisionScene()
+
+        # IK solutions for poses that were already solved, cleared whenever
+        # the planning scene changes.
+        self.ik_cache = IKCache()
+
+        # MoveGroup plans keyed by start state, goal and the version of the
+        # scene, which only changes with the boxes in it.
+        self.plan_cache = PlanCache()
+        self.plan_key = None
+
         self.planning_scene_publisher = self.node.create_publisher(
             CollisionObject,
             '/collision_object',
@@ -145,112 +289,26 @@ class Path_Plan_Execute():
         """Receive the message from the joint state subscriber."""
         self.current_joint_state = msg
 
-    def create_movegroup_msg(self, movegroup_goal_msg):
+    def create_movegroup_msg(self):
         """
         Create a movegroup message for trajectory planning.
 
-        Create a movegroup message and populate it with the correct
-        planning parameters for the moveit motion planner.
+        Patch the prebuilt movegroup goal with the current time, the current
+        joint state and the goal joint constraints. Everything else was set
+        when the goal was built.
 
         Args
         ----
-        movegroup_goal_msg (MoveGroup): An unpopulated MoveGroup action object.
+        None
 
         Returns
         -------
         movegroup_goal_msg (MoveGroup): A populated MoveGroup action object.
 
         """
-        self.node.get_logger().info("Initial Set")
-        # set up the message
-        movegroup_goal_msg.request = MotionPlanRequest(
-            reference_trajectories=[],
-            pipeline_id='move_group',
-            planner_id='',
-            group_name='panda_manipulator',
-            num_planning_attempts=10,
-            allowed_planning_time=5.0,
-            max_velocity_scaling_factor=0.1,
-            max_acceleration_scaling_factor=0.1,
-            max_cartesian_speed=0.0
-        )
-
-        # set the workspace parameters
-        movegroup_goal_msg.request.workspace_parameters = (
-            WorkspaceParameters(
-                header=Header(stamp=self.node.get_clock().now().to_msg(),
-                              frame_id=self.node.frame_id),
-                min_corner=Vector3(x=-1.0, y=-1.0, z=-1.0),
-                max_corner=Vector3(x=1.0, y=1.0, z=1.0))
-        )
-
-        # set the start state of the robot as a RobotState variable
-        movegroup_goal_msg.request.start_state = RobotState(
-            joint_state=JointState(
-                header=Header(stamp=self.node.get_clock().now().to_msg(),
-                              frame_id=self.node.frame_id),
-                name=self.current_joint_state.name,
-                position=self.current_joint_state.position,
-                velocity=self.current_joint_state.velocity,
-                effort=self.current_joint_state.effort
-            )
-        )
-
-        # set the goal constraint
-        joint_constraints = []
-
-        # dynamically create the goal constraints based on the size of the
-        # data returned from the IK request.
-        for i, joint_state_name in enumerate(self.goal_joint_state.name):
-            joint_constraint = JointConstraint()
-            joint_constraint.joint_name = joint_state_name
-            joint_constraint.position = self.goal_joint_state.position[i]
-            joint_constraint.tolerance_above = 0.05
-            joint_constraint.tolerance_below = 0.05
-            joint_constraint.weight = 1.0
-
-            joint_constraints.append(joint_constraint)
-
-        movegroup_goal_msg.request.goal_constraints = [
-            Constraints(name='goal_constraints',
-                        joint_constraints=joint_constraints)
-        ]
-
-        orientation_constraint = OrientationConstraint()
-        orientation_constraint.header = Header(
-            stamp=self.node.get_clock().now().to_msg())
-        orientation_constraint.orientation = Quaternion(
-            x=1.0, y=0.0, z=0.0, w=0.0)
-        orientation_constraint.link_name = 'panda_hand_tcp'
-        orientation_constraint.absolute_x_axis_tolerance = 0.1
-        orientation_constraint.absolute_y_axis_tolerance = 0.1
-        orientation_constraint.absolute_z_axis_tolerance = 0.1
-        orientation_constraint.weight = 1.0
-
-        constraints = Constraints()
-        constraints.orientation_constraints = [orientation_constraint]
-
-        movegroup_goal_msg.request.trajectory_constraints.constraints = [
-            Constraints(
-                name='',
-                orientation_constraints=[orientation_constraint]
-            )]
-
-        # set the planning options
-        movegroup_goal_msg.planning_options = PlanningOptions(
-            planning_scene_diff=PlanningScene(
-                robot_state=RobotState(
-                    joint_state=JointState(header=Header(
-                        stamp=self.node.get_clock().now().to_msg())),
-                    is_diff=True),
-                robot_model_name=self.node.robot_name),
-            plan_only=True,
-            look_around=False,
-            look_around_attempts=0,
-            max_safe_execution_cost=0.0,
-            replan=False)
-
-        return movegroup_goal_msg
+        return patch_movegroup_goal(
+            self.movegroup_goal_msg, self.node.get_clock().now().to_msg(),
+            self.current_joint_state, self.goal_joint_state)
 
     async def ik_callback(self, pose, joint_state):
         """
@@ -301,7 +359,8 @@ class Path_Plan_Execute():
         Set desired goal oreintation.
 
         Set the desired goal orientation for the robot arm using the
-        IK service.
+        IK service, or a cached solution for the same pose and a similar
+        starting configuration.
 
         Args
         ----
@@ -313,13 +372,36 @@ class Path_Plan_Execute():
         -------
         None
 
+        """
+        self.goal_joint_state = await self.ik_cache.solve(
+            pose, self.current_joint_state.position, self.solve_ik)
+        self.node.get_logger().info(
+            f"IK cache hits: {self.ik_cache.hits}, "
+            f"misses: {self.ik_cache.misses}")
+
+    async def solve_ik(self, pose):
+        """
+        Solve IK for a pose from the current joint state.
+
+        Args
+        ----
+        pose (Pose): A Pose object representing the robot's desired
+        end-effector position.
+
+        Returns
+        -------
+        joint_state (JointState): The solution.
+        valid (bool): Whether the IK service found a solution.
+
         """
         result = await self.ik_callback(pose, self.current_joint_state)
         self.node.get_logger().info(
             f"solution.jiont_state: {result.solution.joint_state}")
-        self.goal_joint_state = result.solution.joint_state
+        return result.solution.joint_state, \
+            result.error_code.val == MoveItErrorCodes.SUCCESS
 
-    async def plan_cartesian_path(self, queue, velocity=0.025):
+    async def plan_cartesian_path(self, queue, velocity=0.025,
+                                  start_state=None):
         """
         Plan a cartesian path.
 
@@ -332,54 +414,69 @@ class Path_Plan_Execute():
         end-effector to travel to.
         velocity (float): The velocity at which the end-effector should move
         during execution.
+        start_state (JointState): The joint state to plan from, or None to
+        plan from the current joint state.
 
         Returns
         -------
-        None
+        trajectory (RobotTrajectory): The planned trajectory.
+        error_code (MoveItErrorCodes): The error code of the plan.
 
         """
-        self.cartesian_path_request = GetCartesianPath.Request()
+        if start_state is None:
+            start_state = self.current_joint_state
 
-        self.cartesian_path_request.header = Header(
-            stamp=self.node.get_clock().now().to_msg())
-        self.cartesian_path_request.start_state = RobotState(
+        # build the request locally: a lookahead may be planning the next
+        # segment while this one is in flight
+        request = GetCartesianPath.Request()
+
+        request.header = Header(stamp=self.node.get_clock().now().to_msg())
+        request.start_state = RobotState(
             joint_state=JointState(
                 header=Header(stamp=self.node.get_clock().now().to_msg()),
-                name=self.current_joint_state.name,
-                position=self.current_joint_state.position,
-                velocity=self.current_joint_state.velocity,
-                effort=self.current_joint_state.effort),
+                name=start_state.name,
+                position=start_state.position,
+                velocity=start_state.velocity,
+                effort=start_state.effort),
             is_diff=False
         )
 
-        self.cartesian_path_request.group_name = self.node.group_name
-        self.cartesian_path_request.waypoints = queue
-        self.cartesian_path_request.link_name = 'panda_hand_tcp'
-        self.cartesian_path_request.max_step = 0.01
-        self.cartesian_path_request.avoid_collisions = True
-        self.cartesian_path_request.max_velocity_scaling_factor = velocity
-        self.cartesian_path_request.max_acceleration_scaling_factor = 0.05
-
-        cartesian_trajectory_result = await self.cartesian_path_client.\
-            call_async(self.cartesian_path_request)
-
-        self.cartesian_trajectory_start_state = cartesian_trajectory_result.\
-            start_state
-        self.cartesian_trajectory_solution = cartesian_trajectory_result.\
-            solution
-        self.cartesian_trajectory_fraction = cartesian_trajectory_result.\
-            fraction
-        self.cartesian_trajectory_error_code = cartesian_trajectory_result.\
-            error_code
+        request.group_name = self.node.group_name
+        request.waypoints = queue
+        request.link_name = 'panda_hand_tcp'
+        request.max_step = 0.01
+        request.avoid_collisions = True
+        request.max_velocity_scaling_factor = velocity
+        request.max_acceleration_scaling_factor = 0.05
+
+        result = await self.cartesian_path_client.call_async(request)
 
         self.node.get_logger().info(
-            f"{self.cartesian_trajectory_fraction * 100}% of the path was \
-                computed!")
+            f"{result.fraction * 100}% of the path was computed!")
         self.node.get_logger().info(
-            f"cartesian_trajectory error code: \
-                {self.cartesian_trajectory_error_code}")
+            f"cartesian_trajectory error code: {result.error_code}")
 
-        self.planned_trajectory = self.cartesian_trajectory_solution
+        return result.solution, result.error_code
+
+    def final_joint_state(self, trajectory):
+        """
+        Predict the joint state at the end of a trajectory.
+
+        Args
+        ----
+        trajectory (RobotTrajectory): A planned trajectory.
+
+        Returns
+        -------
+        joint_state (JointState): The joint state at the last point of the
+        trajectory, or None if the trajectory is empty.
+
+        """
+        if not trajectory.joint_trajectory.points:
+            return None
+        return JointState(
+            name=trajectory.joint_trajectory.joint_names,
+            position=trajectory.joint_trajectory.points[-1].positions)
 
     def plan_path(self):
         """
@@ -387,7 +484,10 @@ class Path_Plan_Execute():
 
         Plan a path by passing the current jointstates and planning
         parameters, and calls the movegroup_client asynchronously to calculate
-        a valid path if possible.
+        a valid path if possible. movegroup_future is done once planning has
+        finished, whether or not it succeeded. If the same goal was already
+        planned from the same start state in the same planning scene, the
+        cached plan is used instead.
 
         Args
         ----
@@ -400,11 +500,24 @@ class Path_Plan_Execute():
         """
         self.movegroup_status = GoalStatus.STATUS_UNKNOWN
         self.movegroup_result = None
+        self.movegroup_future = Future()
         # await self.get_goal_joint_states()
         if len(self.goal_joint_state.position) > 0:
-            movegroup_goal_msg = MoveGroup.Goal()
+            self.plan_key = (self.current_joint_state.position,
+                             self.goal_joint_state.position,
+                             self.scene.version)
+            trajectory = self.plan_cache.lookup(*self.plan_key)
+            self.node.get_logger().info(
+                f"plan cache hits: {self.plan_cache.hits}, "
+                f"misses: {self.plan_cache.misses}")
+            if trajectory is not None:
+                self.node.get_logger().info("Reusing a cached plan")
+                self.planned_trajectory = trajectory
+                self.movegroup_status = GoalStatus.STATUS_SUCCEEDED
+                self.movegroup_future.set_result(self.movegroup_status)
+                return
 
-            movegroup_goal_msg = self.create_movegroup_msg(movegroup_goal_msg)
+            movegroup_goal_msg = self.create_movegroup_msg()
 
             self.node.get_logger().info("here2")
 
@@ -413,6 +526,7 @@ class Path_Plan_Execute():
                 self.movegroup_goal_response_callback)
         else:
             self.node.get_logger().error("Given pos is invalid")
+            self.movegroup_future.set_result(self.movegroup_status)
 
     def movegroup_goal_response_callback(self, future):
         """
@@ -434,6 +548,7 @@ class Path_Plan_Execute():
         self.movegroup_goal_handle_status = self.goal_handle.status
         if not self.goal_handle.accepted:
             self.node.get_logger().info('Planning Goal Rejected :P')
+            self.movegroup_future.set_result(self.movegroup_status)
             return
 
         self.node.get_logger().info('Planning Goal Accepted :)')
@@ -466,8 +581,11 @@ class Path_Plan_Execute():
 
         self.planned_trajectory = self.movegroup_result.planned_trajectory
         self.node.get_logger().info("Trajectory Planned!")
+        if self.movegroup_status == GoalStatus.STATUS_SUCCEEDED:
+            self.plan_cache.store(*self.plan_key, self.planned_trajectory)
+        self.movegroup_future.set_result(self.movegroup_status)
 
-    def execute_individual_trajectories(self):
+    def execute_individual_trajectories(self, split=True):
         """
         Reorganize a list of joint trajectories.
 
@@ -477,7 +595,9 @@ class Path_Plan_Execute():
 
         Args
         ----
-        None
+        split (bool): Whether to split the trajectory into one message per
+        point. If not, the whole trajectory is returned as it was planned,
+        for an executor that splits it as it goes.
 
         Returns
         -------
@@ -485,23 +605,10 @@ class Path_Plan_Execute():
         objects to be executed.
 
         """
-        joint_trajectories = []
-
-        for point in self.planned_trajectory.joint_trajectory.points:
-            temp = JointTrajectoryPoint()
-            temp.positions = point.positions
-            temp.velocities = point.velocities
-            temp.accelerations = point.accelerations
-            temp.effort = point.effort
-            temp.time_from_start.nanosec = 100000000  # 0.1 seconds
-            joint_trajectory = JointTrajectory()
-            joint_trajectory.joint_names = self.planned_trajectory.\
-                joint_trajectory.joint_names
-            joint_trajectory.points = [temp]
-
-            joint_trajectories.append(joint_trajectory)
-
-        return joint_trajectories
+        joint_trajectory = self.planned_trajectory.joint_trajectory
+        if not split:
+            return [joint_trajectory]
+        return list(CompactTrajectory.from_msgs([joint_trajectory]))
 
     async def feedback_callback(self, feedback_msg):
         """
@@ -562,6 +669,9 @@ class Path_Plan_Execute():
         None
 
         """
+        apply_box(self.scene, self.ik_cache, box_id, frame_id, dimensions,
+                  pose)
+
         collision_object = CollisionObject()
         collision_object.header.frame_id = frame_id
         collision_object.id = box_id
@@ -0,0 +1,79 @@
+"""
+Keep pose dumps out of the hot paths unless someone is reading them.
+
+Formatting a Pose, or a list of them, into a log line costs far more than
+computing it, and the drawing nodes used to do it for every waypoint at
+info level. Pose dumps now go through PoseDump, which logs at debug level
+and only formats its arguments when dumps are switched on with the
+log_pose_dumps parameter and the node's logger would actually print a debug
+message.
+"""
+
+from rclpy.logging import LoggingSeverity
+
+
+class PoseDump:
+    """A gated, lazily formatted debug log for poses."""
+
+    def __init__(self, logger, enabled=False):
+        """
+        Initialize the pose dump.
+
+        Args
+        ----
+        logger (RcutilsLogger): The logger of the node.
+        enabled (bool): Whether pose dumps are switched on.
+
+        Returns
+        -------
+        None
+
+        """
+        self.logger = logger
+        self.enabled = enabled
+
+    @property
+    def active(self):
+        """Whether a dump would currently be printed."""
+        return self.enabled and \
+            self.logger.is_enabled_for(LoggingSeverity.DEBUG)
+
+    def __call__(self, label, value):
+        """
+        Log a pose, or anything else, if dumps are active.
+
+        Args
+        ----
+        label (string): What is being dumped.
+        value: The value to dump. If it is callable it is only called when
+        the dump is active, so expensive values can be built lazily.
+
+        Returns
+        -------
+        None
+
+        """
+        if not self.active:
+            return
+        if callable(value):
+            value = value()
+        self.logger.debug(f"{label}: {value}")
+
+
+def declare_pose_dump(node):
+    """
+    Declare the log_pose_dumps parameter and create a PoseDump for a node.
+
+    Args
+    ----
+    node (Node): The node to create the pose dump for.
+
+    Returns
+    -------
+    pose_dump (PoseDump): The pose dump of the node.
+
+    """
+    node.declare_parameter('log_pose_dumps', False)
+    enabled = node.get_parameter(
+        'log_pose_dumps').get_parameter_value().bool_value
+    return PoseDump(node.get_logger(), enabled)
@@ -10,7 +10,39 @@ message, which contains a list of JointTrajectoryPoint messages. We must break
 up this list into individual JointTrajectory messages, with just one element in
 the JointTrajectoryPoint list. This way, we can execute the original
 RobotTrajectory discretely by publishing JointTrajectories on the
-/panda_arm_controller/joint_trajectory topic.
+/panda_arm_controller/joint_trajectory topic. The trajectory can be sent whole
+or already broken up; either way it is held as a CompactTrajectory, and each
+message is only built when it is about to be published.
+
+Trajectories can also be streamed: instead of stepping through the points,
+chunks of several points, timed as they were planned, are sent to the
+controller as a sliding window. Streaming is only used while the force
+control loop is off. While it is on, points are still stepped through, but
+every update of the loop sends the point the robot is heading to again, with
+the corrected angle and the time left to reach it, so corrections reach the
+robot at force_control_rate rather than once per point.
+
+Parameters
+----------
+  + log_pose_dumps (bool): Whether to log poses at debug level.
+  + control_rate (float): The rate, in Hz, at which the force threshold is\
+    checked and trajectories are sent to the controller.
+  + stream_trajectories (bool): Whether to stream trajectories to the\
+    controller in timed chunks instead of one point every 0.1 s.
+  + stream_window (int): How many points to send to the controller at once\
+    when streaming. The next chunk is sent once half of them are reached.
+  + force_control_rate (float): The highest rate, in Hz, at which force\
+    measurements update the force control loop.
+  + force_setpoint (float): The force, in N, the control loop holds.
+  + force_kp, force_ki, force_kd (float): The gains of the control loop, in\
+    rad/(N s), rad/(N s^2) and rad/N.
+  + force_integral_limit (float): The largest integrated force error, in\
+    N s.
+  + force_derivative_filter (float): The time constant, in s, of the filter\
+    on the derivative of the force error.
+  + correct_remaining (bool): Whether a replan also moves the pen-down\
+    waypoints still queued to the corrected depth, so one contact event\
+    fixes the rest of the stroke.
 
 SERVICES:
   + joint_trajectory_service (ExecuteJointTrajectories): Execute joint\
@@ -44,6 +76,10 @@ from brain_interfaces.srv import (ExecuteJointTrajectories, Replan,
 
 from enum import Enum, auto
 
+from drawing.force_control import ForcePID
+from drawing.pose_logging import declare_pose_dump
+from drawing.trajectory import CompactTrajectory, duration, POINT_DURATION
+
 from tf2_ros.buffer import Buffer
 from tf2_ros.transform_listener import TransformListener
 import tf2_ros
@@ -60,6 +96,49 @@ class Executor(Node):
     def __init__(self):
 
         super().__init__("Execute")
+        self.pose_dump = declare_pose_dump(self)
+
+        self.declare_parameter('control_rate', 100.0)
+        self.declare_parameter('stream_trajectories', False)
+        self.declare_parameter('stream_window', 10)
+        self.declare_parameter('force_control_rate', 50.0)
+        self.declare_parameter('force_setpoint', 2.3)
+        self.declare_parameter('force_kp', 0.029)
+        self.declare_parameter('force_ki', 0.00005)
+        self.declare_parameter('force_kd', 0.0009)
+        self.declare_parameter('force_integral_limit', 20.0)
+        self.declare_parameter('force_derivative_filter', 0.05)
+        self.declare_parameter('correct_remaining', True)
+        self.control_rate = self.get_parameter(
+            'control_rate').get_parameter_value().double_value
+        self.stream_trajectories = self.get_parameter(
+            'stream_trajectories').get_parameter_value().bool_value
+        self.stream_window = self.get_parameter(
+            'stream_window').get_parameter_value().integer_value
+        self.force_control_rate = self.get_parameter(
+            'force_control_rate').get_parameter_value().double_value
+        self.correct_remaining = self.get_parameter(
+            'correct_remaining').get_parameter_value().bool_value
+
+        # the gains default to the old 10 Hz loop, written as rates
+        self.force_pid = ForcePID(
+            kp=self.get_parameter(
+                'force_kp').get_parameter_value().double_value,
+            ki=self.get_parameter(
+                'force_ki').get_parameter_value().double_value,
+            kd=self.get_parameter(
+                'force_kd').get_parameter_value().double_value,
+            setpoint=self.get_parameter(
+                'force_setpoint').get_parameter_value().double_value,
+            integral_limit=self.get_parameter(
+                'force_integral_limit').get_parameter_value().double_value,
+            derivative_filter=self.get_parameter(
+                'force_derivative_filter').get_parameter_value().double_value,
+            nominal_dt=1.0 / self.force_control_rate)
+        self.force_update_time = None
+
+        # when stepping, a point is published every this many ticks
+        self.step_ticks = max(1, round(self.control_rate * POINT_DURATION))
 
         self.timer_callback_group = MutuallyExclusiveCallbackGroup()
         self.joint_trajectories_callback_group = \
@@ -69,7 +148,7 @@ class Executor(Node):
             MutuallyExclusiveCallbackGroup()
 
         self.timer = self.create_timer(
-            0.01, self.timer_callback,
+            1.0 / self.control_rate, self.timer_callback,
             callback_group=self.timer_callback_group)
 
         # create publishers
@@ -113,14 +192,21 @@ class Executor(Node):
 
         self.use_force_control = False
         self.use_control_loop = False
-        self.force_error = 0.0  # N
-        self.previous_force_error = 0.0  # N
         self.initial_trajectory_angle = 0.0  # rad
         self.output_angle = 0.0  # rad
-        self.integral_force_error = 0.0
+
+        # while the control loop is on, the point last sent to the robot and
+        # when it was sent, in s
+        self.sent = None
+        self.sent_time = 0.0
 
         self.replan = False
 
+        # when streaming, the time the current trajectory started, and how
+        # many of its points were sent to the controller but not reached yet
+        self.stream_start = None
+        self.streamed = 0
+
         self.future = Future()
 
         self.i = 1
@@ -166,10 +252,66 @@ class Executor(Node):
             return [0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]
 
     def force_callback(self, msg):
-        """Receive the current force at the end-effector."""
+        """
+        Receive the current force at the end-effector.
+
+        While the force control loop is on, every force measurement updates
+        the angle of panda_joint6, at most force_control_rate times a
+        second, using the time that passed since the last update, and the
+        point the robot is heading to is sent again with the new angle.
+
+        Args
+        ----
+        msg (EEForce): The force at the end-effector.
+
+        Returns
+        -------
+        None
+
+        """
         self.ee_force = msg.ee_force
         # self.use_force_control = msg.use_force_control
 
+        if not (self.use_control_loop and self.joint_trajectories and
+                self.state == State.PUBLISH):
+            return
+
+        now = self.get_clock().now().nanoseconds * 1e-9
+        if self.force_update_time is not None and \
+                now - self.force_update_time < 1.0 / self.force_control_rate:
+            return
+        self.force_update_time = now
+
+        self.output_angle += self.force_pid.update(self.ee_force, now)
+        self.send_correction(now)
+
+    def send_correction(self, now):
+        """
+        Send the point the robot is heading to again, at the output angle.
+
+        The point keeps the time it was planned to be reached at, so the
+        correction does not slow the stroke down. Once that time has passed,
+        the next point is left to timer_callback.
+
+        Args
+        ----
+        now (float): The current time, in s.
+
+        Returns
+        -------
+        None
+
+        """
+        if self.sent is None:
+            return
+        remaining = POINT_DURATION - (now - self.sent_time)
+        if remaining <= 0.0:
+            return
+        point = self.sent.points[0]
+        point.positions[5] = self.output_angle
+        point.time_from_start = duration(remaining)
+        self.pub.publish(self.sent)
+
     async def joint_trajectories_callback(self, request, response):
         """
         Receive a list of joint trajectories to be executed.
@@ -192,7 +334,11 @@ class Executor(Node):
         self.get_logger().info("message received!")
         self.i = 0
 
-        self.joint_trajectories = request.joint_trajectories
+        # split the trajectory into point messages as they are published
+        self.joint_trajectories = CompactTrajectory.from_msgs(
+            request.joint_trajectories)
+        self.stream_start = None
+        self.sent = None
         self.output_angle = self.joint_trajectories[0].points[0].positions[5]
         self.pose = request.current_pose
         self.replan = request.replan
@@ -218,7 +364,9 @@ class Executor(Node):
         Replan a trajectory that failed. First, call a service that returns
         a new pose to plan for. This pose will be based on where the robot
         collided with the whiteboard. Next, plan a cartesian path to this pose
-        and prepare it to be executed.
+        and prepare it to be executed. The depth of the new pose in the board
+        frame is passed along, so the waypoints still queued can be moved to
+        it as well.
 
         Args
         ----
@@ -232,11 +380,11 @@ class Executor(Node):
 
         """
         self.get_logger().info("joint trajectories cleared")
+        self.halt_stream()
         self.joint_trajectories.clear()
 
         # replan the trajectory!!
-        self.get_logger().info(
-            f"pose to be adjusted out of board: {self.pose}")
+        self.pose_dump("pose to be adjusted out of board", self.pose)
         update_trajectory_response = await self.update_trajectory_client.\
             call_async(UpdateTrajectory.Request(
                 input_pose=self.pose, into_board=into_the_board))
@@ -244,11 +392,68 @@ class Executor(Node):
         self.pose = update_trajectory_response.output_pose
 
         replan_response = await self.replan_client.call_async(Replan.Request(
-            pose=self.pose))
+            pose=self.pose, depth=update_trajectory_response.depth,
+            correct_remaining=self.correct_remaining))
 
-        self.joint_trajectories = replan_response.joint_trajectories
+        self.joint_trajectories = CompactTrajectory.from_msgs(
+            replan_response.joint_trajectories)
+        self.stream_start = None
+        self.sent = None
         self.output_angle = self.joint_trajectories[0].points[0].positions[5]
 
+    def stream_step(self):
+        """
+        Keep the controller a chunk of points ahead of the robot.
+
+        Points whose planned time has passed are dropped, and once half of
+        the points sent to the controller have been reached, the next
+        stream_window points are sent, timed from now.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        now = self.get_clock().now()
+        if self.stream_start is None:
+            self.stream_start = now
+            self.streamed = 0
+        elapsed = (now - self.stream_start).nanoseconds * 1e-9
+
+        self.streamed = max(
+            self.streamed - self.joint_trajectories.elapse(elapsed), 0)
+        if self.joint_trajectories and \
+                self.streamed <= self.stream_window // 2:
+            self.pub.publish(self.joint_trajectories.chunk(
+                self.stream_window, elapsed))
+            self.streamed = min(self.stream_window,
+                                len(self.joint_trajectories))
+
+    def halt_stream(self):
+        """
+        Stop the robot at the next point of a streamed trajectory.
+
+        The controller already has the rest of the chunk that was streamed
+        to it, so clearing the queue alone would not stop the robot.
+
+        Args
+        ----
+        None
+
+        Returns
+        -------
+        None
+
+        """
+        if self.stream_start is not None and self.joint_trajectories:
+            self.pub.publish(self.joint_trajectories[0])
+        self.stream_start = None
+        self.streamed = 0
+
     async def timer_callback(self):
         """
         Perform force control and execution of trajectories.
@@ -257,7 +462,9 @@ class Executor(Node):
         than a threshold, and if it is then the current trajectory is
         replanned. After the trajectory is replanned, then the trajectory is
         completed using a PID control loop with end-effector force as the
-        input, and angle of panda_joint6 in radians as the output.
+        input, and angle of panda_joint6 in radians as the output. The loop
+        itself is updated by force_callback, which also sends its corrections
+        to the robot; this applies its output to every point as it is sent.
 
         Args
         ----
@@ -282,6 +489,8 @@ class Executor(Node):
 
                 self.use_control_loop = True
                 self.use_force_control = False
+                self.force_pid.reset()
+                self.force_update_time = None
                 self.initial_trajectory_angle = self.joint_trajectories[0].\
                     points[0].positions[5]
 
@@ -289,14 +498,15 @@ class Executor(Node):
 
                 self.get_logger().info("joint trajectories cleared")
                 self.get_logger().info("poses all done")
+                self.halt_stream()
                 self.joint_trajectories.clear()
 
         elif self.joint_trajectories and self.state == State.PUBLISH and \
-                self.i % 10 == 0:
+                self.stream_trajectories and not self.use_control_loop:
+            self.stream_step()
 
-            Kp = 0.0029
-            Ki = 0.000005
-            Kd = 0.0009
+        elif self.joint_trajectories and self.state == State.PUBLISH and \
+                self.i % self.step_ticks == 0:
 
             self.get_logger().info(
                 f"user control loop: {self.use_control_loop}")
@@ -307,15 +517,9 @@ class Executor(Node):
                 self.get_logger().info(f"ee_force: {self.ee_force}")
                 self.get_logger().info(
                     f"original joint pos: {self.output_angle}")
-                force_error = 2.3 - self.ee_force
-                self.integral_force_error += force_error * 0.1
-                angle_adjustment = Kp * force_error + \
-                    Ki * self.integral_force_error + \
-                    Kd * (force_error - self.previous_force_error)
-                self.output_angle += angle_adjustment
+                # output_angle is kept up to date by force_callback
                 self.joint_trajectories[0].points[0].positions[5] = \
                     self.output_angle
-                self.previous_force_error = force_error
                 # here i'm assuming joint angle 6 is basically the same
                 # for all trjactories, which may or may not be true.
 
@@ -333,6 +537,10 @@ class Executor(Node):
                     await self.replan_trajectory(True)
                     self.use_control_loop = False
 
+                if self.use_control_loop:
+                    # force_callback corrects this point until it is reached
+                    self.sent = self.joint_trajectories[0]
+                    self.sent_time = self.get_clock().now().nanoseconds * 1e-9
                 self.pub.publish(self.joint_trajectories[0])
                 self.joint_trajectories.pop(0)
 
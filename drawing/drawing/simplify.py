@@ -0,0 +1,145 @@
+"""
+Simplify the strokes of a glyph before they are sent to the planner.
+
+Every waypoint of a letter becomes its own Cartesian planning request, so
+glyph outlines with a vertex for every Bezier control point are expensive
+to draw. The pipeline here runs Ramer-Douglas-Peucker on every pen-down
+stroke to drop the waypoints the pen can skip without straying more than a
+chord error tolerance from the original path, then resamples the result
+along its arc length so no segment is longer than a maximum spacing.
+"""
+
+import numpy as np
+
+from drawing.glyph_atlas import Glyph
+
+
+def segment_distances(points, start, end):
+    """
+    Return the distance from each point to the segment between two points.
+
+    Args
+    ----
+    points (numpy array): An (N, 2) array of points.
+    start (numpy array): The first end of the segment.
+    end (numpy array): The second end of the segment.
+
+    Returns
+    -------
+    distances (numpy array): The N distances.
+
+    """
+    chord = end - start
+    length_sq = chord @ chord
+    offsets = points - start
+    if length_sq == 0.0:
+        return np.hypot(offsets[:, 0], offsets[:, 1])
+    t = np.clip(offsets @ chord / length_sq, 0.0, 1.0)
+    nearest = offsets - t[:, None] * chord
+    return np.hypot(nearest[:, 0], nearest[:, 1])
+
+
+def rdp(points, tolerance):
+    """
+    Simplify a polyline with the Ramer-Douglas-Peucker algorithm.
+
+    Args
+    ----
+    points (numpy array): An (N, 2) array of points.
+    tolerance (float): The largest distance a dropped point may be from the
+    simplified polyline.
+
+    Returns
+    -------
+    keep (numpy array): A boolean mask of the points to keep. The first and
+    last points are always kept.
+
+    """
+    points = np.asarray(points, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = segment_distances(
+            points[first + 1:last], points[first], points[last])
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def resample(points, spacing):
+    """
+    Resample a polyline along its arc length.
+
+    Every segment longer than spacing is split into equal pieces, so the
+    shape of the polyline is unchanged but no two waypoints are more than
+    spacing apart.
+
+    Args
+    ----
+    points (numpy array): An (N, 2) array of points.
+    spacing (float): The largest allowed distance between waypoints.
+
+    Returns
+    -------
+    resampled (numpy array): The resampled (M, 2) array of points.
+
+    """
+    points = np.asarray(points, dtype=float)
+    if spacing <= 0.0 or len(points) < 2:
+        return points
+    steps = np.diff(points, axis=0)
+    pieces = np.maximum(
+        np.ceil(np.hypot(steps[:, 0], steps[:, 1]) / spacing), 1).astype(int)
+    segment = np.repeat(np.arange(len(steps)), pieces)
+    t = (np.arange(len(segment)) - np.repeat(np.cumsum(pieces) - pieces,
+                                             pieces)) / pieces[segment]
+    resampled = points[segment] + t[:, None] * steps[segment]
+    return np.vstack((resampled, points[-1:]))
+
+
+def simplify_glyph(glyph, tolerance, spacing=0.0):
+    """
+    Simplify every pen-down stroke of a glyph.
+
+    Pen-up points are kept as they are, and so are the ends of every
+    stroke, so the pen still lifts and lands in the same places.
+
+    Args
+    ----
+    glyph (Glyph): The glyph to simplify.
+    tolerance (float): The chord error allowed by the simplification.
+    spacing (float): The largest allowed distance between waypoints, or 0
+    to skip resampling.
+
+    Returns
+    -------
+    glyph (Glyph): The simplified glyph.
+
+    """
+    if len(glyph) < 3:
+        return glyph
+
+    # split the glyph into runs of pen-down and pen-up points
+    breaks = np.flatnonzero(np.diff(glyph.pen_down.view(np.int8))) + 1
+    bounds = np.concatenate(([0], breaks, [len(glyph)]))
+
+    points = []
+    pen_down = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        run = glyph.points[start:end]
+        if glyph.pen_down[start]:
+            run = resample(run[rdp(run, tolerance)], spacing)
+        points.append(run)
+        pen_down.append(np.full(len(run), glyph.pen_down[start]))
+    return Glyph(np.concatenate(points), np.concatenate(pen_down))
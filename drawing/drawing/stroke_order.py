@@ -0,0 +1,188 @@
+"""
+Order strokes so the pen spends as little time in the air as possible.
+
+Strokes are reduced to their start and end points. A nearest neighbour
+tour is built from every possible first stroke, and the best one is then
+improved with 2-opt moves and single stroke reversals until no move makes
+the pen-up travel any shorter. The stroke counts involved (the contours of
+one letter, or the tiles of one turn) are small, so every candidate tour is
+costed in full.
+"""
+
+import numpy as np
+
+from drawing.glyph_atlas import Glyph
+
+
+def travel(starts, ends, order, flipped, origin=None):
+    """
+    Return the pen-up distance of a tour.
+
+    Args
+    ----
+    starts (numpy array): The (N, 2) start points of the strokes.
+    ends (numpy array): The (N, 2) end points of the strokes.
+    order (numpy array): The order the strokes are drawn in.
+    flipped (numpy array): Whether each stroke, by index, is drawn
+    backwards.
+    origin (numpy array): Where the pen starts, if that matters.
+
+    Returns
+    -------
+    distance (float): The distance the pen travels between strokes.
+
+    """
+    first = np.where(flipped[order, None], ends[order], starts[order])
+    last = np.where(flipped[order, None], starts[order], ends[order])
+    steps = first[1:] - last[:-1]
+    distance = np.sum(np.hypot(steps[:, 0], steps[:, 1]))
+    if origin is not None:
+        distance += np.hypot(*(first[0] - origin))
+    return distance
+
+
+def nearest_neighbour(starts, ends, first, reversible, origin=None):
+    """
+    Build a tour by always drawing the closest stroke next.
+
+    Args
+    ----
+    starts (numpy array): The (N, 2) start points of the strokes.
+    ends (numpy array): The (N, 2) end points of the strokes.
+    first (int): The stroke to draw first.
+    reversible (bool): Whether strokes may be drawn backwards.
+    origin (numpy array): Where the pen starts, if that matters.
+
+    Returns
+    -------
+    order (numpy array): The order the strokes are drawn in.
+    flipped (numpy array): Whether each stroke, by index, is drawn
+    backwards.
+
+    """
+    count = len(starts)
+    flipped = np.zeros(count, dtype=bool)
+    if reversible and origin is not None:
+        flipped[first] = np.hypot(*(ends[first] - origin)) < \
+            np.hypot(*(starts[first] - origin))
+    order = [first]
+    remaining = np.ones(count, dtype=bool)
+    remaining[first] = False
+    pen = starts[first] if flipped[first] else ends[first]
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        to_start = np.hypot(*(starts[candidates] - pen).T)
+        to_end = np.hypot(*(ends[candidates] - pen).T) if reversible \
+            else np.full(len(candidates), np.inf)
+        i = int(np.argmin(np.minimum(to_start, to_end)))
+        stroke = candidates[i]
+        flipped[stroke] = to_end[i] < to_start[i]
+        pen = starts[stroke] if flipped[stroke] else ends[stroke]
+        order.append(stroke)
+        remaining[stroke] = False
+    return np.array(order), flipped
+
+
+def order_strokes(starts, ends, reversible=True, origin=None):
+    """
+    Find a stroke order with little pen-up travel.
+
+    Args
+    ----
+    starts (numpy array): The (N, 2) start points of the strokes.
+    ends (numpy array): The (N, 2) end points of the strokes.
+    reversible (bool): Whether strokes may be drawn backwards.
+    origin (numpy array): Where the pen starts, if that matters.
+
+    Returns
+    -------
+    order (numpy array): The order the strokes are drawn in.
+    flipped (numpy array): Whether each stroke, by index, is drawn
+    backwards.
+
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    count = len(starts)
+    if count == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=bool)
+
+    # keep the given order when nothing beats it
+    best = (np.arange(count), np.zeros(count, dtype=bool))
+    best_cost = travel(starts, ends, *best, origin)
+    for first in range(count):
+        tour = nearest_neighbour(starts, ends, first, reversible, origin)
+        cost = travel(starts, ends, *tour, origin)
+        if cost < best_cost - 1e-12:
+            best, best_cost = tour, cost
+
+    order, flipped = best
+    improved = True
+    while improved:
+        improved = False
+        for i in range(count - 1):
+            for j in range(i + 1, count):
+                # 2-opt: draw strokes i..j in the opposite order, and
+                # backwards if that is allowed
+                new_order = order.copy()
+                new_order[i:j + 1] = order[i:j + 1][::-1]
+                new_flipped = flipped.copy()
+                if reversible:
+                    new_flipped[order[i:j + 1]] ^= True
+                cost = travel(starts, ends, new_order, new_flipped, origin)
+                if cost < best_cost - 1e-12:
+                    order, flipped, best_cost = new_order, new_flipped, cost
+                    improved = True
+        if reversible:
+            for stroke in range(count):
+                new_flipped = flipped.copy()
+                new_flipped[stroke] ^= True
+                cost = travel(starts, ends, order, new_flipped, origin)
+                if cost < best_cost - 1e-12:
+                    flipped, best_cost = new_flipped, cost
+                    improved = True
+    return order, flipped
+
+
+def glyph_contours(glyph):
+    """
+    Split a glyph into the strokes drawn with the pen down.
+
+    Args
+    ----
+    glyph (Glyph): The glyph to split.
+
+    Returns
+    -------
+    contours (list): One (M, 2) array of points per stroke.
+
+    """
+    pen_down = glyph.pen_down.view(np.int8)
+    edges = np.diff(np.concatenate(([0], pen_down, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [glyph.points[start:end] for start, end in zip(starts, ends)]
+
+
+def order_glyph(glyph):
+    """
+    Reorder and reverse the strokes of a glyph to shorten pen-up travel.
+
+    Args
+    ----
+    glyph (Glyph): The glyph to reorder.
+
+    Returns
+    -------
+    glyph (Glyph): The reordered glyph, or the same glyph if it has only
+    one stroke.
+
+    """
+    contours = glyph_contours(glyph)
+    if len(contours) < 2:
+        return glyph
+    starts = np.array([contour[0] for contour in contours])
+    ends = np.array([contour[-1] for contour in contours])
+    order, flipped = order_strokes(starts, ends)
+    return Glyph.from_contours(
+        [contours[i][::-1] if flipped[i] else contours[i] for i in order])
@@ -0,0 +1,177 @@
+"""
+Learn how deep the pen has to go to touch the board, across the board.
+
+The board is never quite where calibration puts it: it is tilted a little,
+and may bow. Every letter used to be written at the same depth, so the pen
+tripped the force threshold, was replanned a little further out, and then
+forgot the correction for the next letter.
+
+ContactSurface fits the depth of the pen at contact, in the board frame, as
+a low-order polynomial of the position on the board:
+
+  + order 1 is a plane, depth = c0 + c1 x + c2 y.
+  + order 2 adds x^2, x y and y^2.
+
+It is fitted online with recursive least squares, one contact sample at a
+time, starting from a flat board at the prior depth. A forgetting factor
+lets it follow slow changes, such as the pen wearing down. Predictions are
+kept within limit of the prior depth, so a poorly known corner of the board
+can never send the pen far through it.
+
+A force in the contact range does not mean the pen is on the board: the arm
+also feels forces moving through free space. Samples are only accepted
+within the board bounds and within tolerance of the predicted depth, where
+the pen can only be if it is drawing.
+"""
+
+import numpy as np
+
+
+class ContactSurface:
+    """The depth of the pen at contact, as a polynomial over the board."""
+
+    def __init__(self, order=1, prior_depth=0.004, forgetting=1.0,
+                 limit=0.01, depth_deviation=0.005, slope_deviation=0.05,
+                 noise=0.0005, bounds=None, tolerance=0.003):
+        """
+        Initialize the surface as flat, at the prior depth.
+
+        Args
+        ----
+        order (int): The order of the polynomial, 1 or 2.
+        prior_depth (float): The depth, in m, before any contact is seen.
+        forgetting (float): How much the weight of past samples decays with
+        every new one, 1 to never forget.
+        limit (float): How far, in m, a prediction may be from the prior
+        depth.
+        depth_deviation (float): How far, in m, the depth is expected to be
+        from the prior depth.
+        slope_deviation (float): How steep the surface is expected to be at
+        most, in m/m.
+        noise (float): The standard deviation, in m, of a contact sample.
+        bounds (tuple): The x and y ranges, in m, of the board, or None to
+        accept samples anywhere.
+        tolerance (float): How far, in m, a sample may be from the predicted
+        depth to be taken as contact.
+
+        Returns
+        -------
+        None
+
+        """
+        if order not in (1, 2):
+            raise ValueError(f"Unsupported surface order {order}")
+        self.order = order
+        self.prior_depth = prior_depth
+        self.forgetting = forgetting
+        self.limit = limit
+        self.noise_variance = noise ** 2
+        self.bounds = bounds
+        self.tolerance = tolerance
+
+        size = 3 if order == 1 else 6
+        self.prior_covariance = np.diag(
+            [depth_deviation ** 2] + [slope_deviation ** 2] * (size - 1))
+        self.max_trace = np.trace(self.prior_covariance)
+        self.phi = np.zeros(size)
+        self.reset()
+
+    def reset(self):
+        """Forget every sample, and go back to a flat board."""
+        self.coefficients = np.zeros(len(self.phi))
+        self.coefficients[0] = self.prior_depth
+        self.covariance = self.prior_covariance.copy()
+        self.count = 0
+
+    def features(self, x, y):
+        """
+        Return the terms of the polynomial at points on the board.
+
+        Args
+        ----
+        x (numpy array): The x of the points in the board frame, in m.
+        y (numpy array): The y of the points in the board frame, in m.
+
+        Returns
+        -------
+        features (numpy array): The (N, 3) or (N, 6) terms.
+
+        """
+        x = np.asarray(x, dtype=float).reshape(-1)
+        y = np.asarray(y, dtype=float).reshape(-1)
+        columns = [np.ones_like(x), x, y]
+        if self.order == 2:
+            columns += [x * x, x * y, y * y]
+        return np.stack(columns, axis=1)
+
+    def update(self, x, y, depth):
+        """
+        Add a contact sample.
+
+        Args
+        ----
+        x (float): The x of the pen in the board frame, in m.
+        y (float): The y of the pen in the board frame, in m.
+        depth (float): The z of the pen in the board frame at contact, in m.
+
+        Returns
+        -------
+        None
+
+        """
+        phi = self.phi
+        phi[:3] = 1.0, x, y
+        if self.order == 2:
+            phi[3:] = x * x, x * y, y * y
+
+        P = self.covariance
+        Pphi = P @ phi
+        gain = Pphi / (self.noise_variance + phi @ Pphi)
+        self.coefficients += gain * (depth - phi @ self.coefficients)
+        P -= np.outer(gain, Pphi)
+
+        # forget, unless the surface is already as uncertain as it started
+        if self.forgetting < 1.0 and \
+                np.trace(P) / self.forgetting <= self.max_trace:
+            P /= self.forgetting
+        self.count += 1
+
+    def accepts(self, x, y, depth):
+        """
+        Tell whether a pen position can be a contact sample.
+
+        Args
+        ----
+        x (float): The x of the pen in the board frame, in m.
+        y (float): The y of the pen in the board frame, in m.
+        depth (float): The z of the pen in the board frame, in m.
+
+        Returns
+        -------
+        accepted (bool): Whether the pen is on the board, and within
+        tolerance of the predicted depth.
+
+        """
+        if self.bounds is not None:
+            (xmin, xmax), (ymin, ymax) = self.bounds
+            if not (xmin <= x <= xmax and ymin <= y <= ymax):
+                return False
+        return abs(depth - self.predict(x, y)[0]) <= self.tolerance
+
+    def predict(self, x, y):
+        """
+        Return the depth of the pen at contact at points on the board.
+
+        Args
+        ----
+        x (numpy array): The x of the points in the board frame, in m.
+        y (numpy array): The y of the points in the board frame, in m.
+
+        Returns
+        -------
+        depths (numpy array): The depth at every point, in m.
+
+        """
+        depths = self.features(x, y) @ self.coefficients
+        return np.clip(depths, self.prior_depth - self.limit,
+                       self.prior_depth + self.limit)
@@ -5,8 +5,42 @@ This node deals with the april tags and handels tf tree.
 2. Calibrate service: takes the arm to a specified pose and looks at the april
     tags on the board and publishes a board to robot transform.
 3. Letter pose service: gives the start pose of any letter wrt to the
-    panda_link0.
+    panda_link0, either one tile at a time or for a whole turn at once.
+    The pen goes as deep as a model of the board surface says, learned from
+    force replans and from where the pen is while it presses on the board.
 4. Update Trajectory service: Given a list of poses.
+5. Correct Waypoints service: moves a list of waypoints to the depth of the
+    pen in the board frame, all at once.
+
+Parameters
+----------
+  + log_pose_dumps (bool) - Whether to log poses at debug level.
+  + calibration_samples (int) - How many detections of a tag calibration\
+  needs at least, before it can finish.
+  + calibration_timeout (float) - How long, in s, calibration waits for the\
+  tag averages to converge before using what it has.
+  + board_tags (string[]) - The frames of the tags on the board.
+  + board_tag_offsets (float[]) - The x, y position of the board origin in\
+  the frame of each tag in board_tags, one pair after another.
+  + recalibration_tolerance (float) - How far, in m, the tags seen from\
+  where the arm is may be from where the board puts them before the arm is\
+  moved to recalibrate.
+  + recalibration_angle (float) - How far, in rad, the board may have turned\
+  before the arm is moved to recalibrate.
+  + recalibration_check_timeout (float) - How long, in s, to look for the\
+  tags from where the arm is before recalibrating.
+  + surface_order (int) - The order of the polynomial the depth of the pen at\
+  contact is fitted with across the board, 1 for a plane or 2.
+  + surface_prior_depth (float) - The depth, in m, letters are written at\
+  before any contact is seen.
+  + surface_forgetting (float) - How much the weight of past contact samples\
+  decays with every new one, 1 to never forget.
+  + surface_contact_force (float[]) - The range of force, in N, in which the\
+  pen is taken to be touching the board at the right depth.
+  + surface_sample_rate (float) - The highest rate, in Hz, at which the pen\
+  position is sampled while it touches the board.
+  + surface_contact_tolerance (float) - How far, in m, the pen may be from\
+  the predicted depth for its position to be sampled as contact.
 
 """
 
@@ -19,15 +53,32 @@ from tf2_ros import TransformBroadcaster
 import tf2_ros
 from tf2_ros.static_transform_broadcaster import StaticTransformBroadcaster
 from std_srvs.srv import Empty
-from geometry_msgs.msg import Point, Quaternion, Vector3, Pose
+from geometry_msgs.msg import Point, Quaternion, Vector3
 from geometry_msgs.msg import TransformStamped
-from brain_interfaces.srv import BoardTiles, MovePose, UpdateTrajectory
-from drawing.grid import Grid, matrix_to_position_quaternion
+from brain_interfaces.srv import (BoardTiles, BoardTilesBatch,
+                                  CorrectWaypoints, MovePose,
+                                  UpdateTrajectory)
+from brain_interfaces.msg import EEForce, TilePoses
+from drawing.grid import board_grid, matrix_to_position_quaternion
 from drawing.grid import array_to_transform_matrix
+from drawing.grid import move_poses, pose_positions
+from drawing.grid import transform_stack, transforms_to_poses
+from drawing.board_registration import BoardFrame, BoardRegistration
+from drawing.calibration import TagAverage
+from drawing.pose_logging import declare_pose_dump
+from drawing.surface_model import ContactSurface
 from enum import Enum, auto
-import modern_robotics as mr
 import numpy as np
-import time
+
+
+# orientation of the pen relative to the board when writing
+PEN_ROTATION = np.array(
+    [
+        [-0.03948997, 0.99782373, 0.05280484],
+        [0.06784999, 0.05540183, -0.99615612],
+        [-0.9969137, -0.03575537, -0.06989015],
+    ]
+)
 
 
 class State(Enum):
@@ -46,13 +97,62 @@ class Tags(Node):
 
     def __init__(self):
         super().__init__("tags")
+        self.pose_dump = declare_pose_dump(self)
+        self.declare_parameter("calibration_samples", 10)
+        self.declare_parameter("calibration_timeout", 10.0)
+        self.calibration_samples = self.get_parameter(
+            "calibration_samples").get_parameter_value().integer_value
+        self.calibration_timeout = self.get_parameter(
+            "calibration_timeout").get_parameter_value().double_value
+        self.declare_parameter("board_tags", ["tag11"])
+        self.declare_parameter("board_tag_offsets", [0.05, 0.05])
+        self.declare_parameter("recalibration_tolerance", 0.002)
+        self.declare_parameter("recalibration_angle", 0.01)
+        self.declare_parameter("recalibration_check_timeout", 1.0)
+        board_tags = self.get_parameter(
+            "board_tags").get_parameter_value().string_array_value
+        board_tag_offsets = self.get_parameter(
+            "board_tag_offsets").get_parameter_value().double_array_value
+        if len(board_tag_offsets) != 2 * len(board_tags):
+            raise ValueError("board_tag_offsets needs an x, y pair for each "
+                             "of the board_tags")
+        self.registration = BoardRegistration({
+            tag: board_tag_offsets[2 * i:2 * i + 2]
+            for i, tag in enumerate(board_tags)})
+        self.recalibration_tolerance = self.get_parameter(
+            "recalibration_tolerance").get_parameter_value().double_value
+        self.recalibration_angle = self.get_parameter(
+            "recalibration_angle").get_parameter_value().double_value
+        self.recalibration_check_timeout = self.get_parameter(
+            "recalibration_check_timeout").get_parameter_value().double_value
+        self.declare_parameter("surface_order", 1)
+        self.declare_parameter("surface_prior_depth", 0.004)
+        self.declare_parameter("surface_forgetting", 0.995)
+        self.declare_parameter("surface_contact_force", [1.5, 3.0])
+        self.declare_parameter("surface_sample_rate", 10.0)
+        self.declare_parameter("surface_contact_tolerance", 0.003)
+        self.grid = board_grid()
+        contact_tolerance = self.get_parameter(
+            "surface_contact_tolerance").get_parameter_value().double_value
+        self.surface = ContactSurface(
+            order=self.get_parameter(
+                "surface_order").get_parameter_value().integer_value,
+            prior_depth=self.get_parameter(
+                "surface_prior_depth").get_parameter_value().double_value,
+            forgetting=self.get_parameter(
+                "surface_forgetting").get_parameter_value().double_value,
+            bounds=(self.grid.xrange, self.grid.yrange),
+            tolerance=contact_tolerance)
+        self.surface_contact_force = self.get_parameter(
+            "surface_contact_force").get_parameter_value().double_array_value
+        self.surface_sample_period = 1e9 / self.get_parameter(
+            "surface_sample_rate").get_parameter_value().double_value  # ns
         self.freq = 100.0
         self.buffer = Buffer()
         self.listener = TransformListener(self.buffer, self)
 
         self.file_path_A = "A.csv"
         self.file_path_B = "B.csv"
-        self.grid = Grid((0, 0.8), (0, 0.40), 0.1)
         self.state = State.OTHER
         self.move_js_callback_group = MutuallyExclusiveCallbackGroup()
         self.make_board_callback_group = MutuallyExclusiveCallbackGroup()
@@ -75,10 +175,19 @@ class Tags(Node):
         self.where_to_write = self.create_service(
             BoardTiles, "where_to_write", self.where_to_write_callback
         )
+        self.where_to_write_batch = self.create_service(
+            BoardTilesBatch, "where_to_write_batch",
+            self.where_to_write_batch_callback
+        )
+        self.force_sub = self.create_subscription(
+            EEForce, "/ee_force", self.force_callback, 10
+        )
         self.update_trajectory = self.create_service(
             UpdateTrajectory, "update_trajectory", self.update_trajectory_cb
         )
-        self.goal_state = "not"
+        self.correct_waypoints = self.create_service(
+            CorrectWaypoints, "correct_waypoints", self.correct_waypoints_cb
+        )
 
         # create client
         self.move_js_client = self.create_client(
@@ -103,11 +212,24 @@ class Tags(Node):
         self.robot_board_write.child_frame_id = "point"
         self.robot_board_write.header.stamp = self.get_clock().now().to_msg()
 
-        # Transform to save the robot to board transform
-        self.boardT = np.eye(4)
-
-        # Create a new Future object.
-        self.future = rclpy.task.Future()
+        # the robot to board transform and its inverse, whether it has
+        # been registered yet, and how well the tags agreed with it
+        self.board = BoardFrame()
+        self.board_registered = False
+        self.board_residual = np.inf
+
+        # the latest force at the end-effector, when it was received, and
+        # when the pen position was last sampled for the surface model
+        self.ee_force = 0.0
+        self.ee_force_time = 0
+        self.surface_sample_time = 0
+
+        # the tag averages of the calibration in progress, when it started,
+        # how long it may take, and the future it resolves once they are done
+        self.calibration = {}
+        self.calibration_start = 0
+        self.calibration_timeout_active = self.calibration_timeout
+        self.calibration_future = rclpy.task.Future()
         self.future_satate = rclpy.task.Future()
         # wait for services
         while not self.move_js_client.wait_for_service(timeout_sec=1.0):
@@ -131,13 +253,32 @@ class Tags(Node):
 
     async def calibrate_callback(self, request, response):
         """
-        Search for tag 11 and create a board frame relative to that.
+        Search for the tags on the board and create a board frame from them.
 
-        First it moves to a position where camera can see the april tag.
-        Then waits for an updated transform and creates a board transform.
+        If the board has been registered before, the tags are first looked
+        for from where the arm is. If the ones seen are still where the
+        board puts them, the board has not moved and nothing else is done.
+
+        Otherwise it moves to a position where camera can see the april
+        tags. Then the timer collects fresh detections of the tags until
+        their averages converge, without blocking the executor, and the
+        board frame is fused from the average poses of every tag seen.
 
         """
-        self.state = State.CALIBRATE
+        if self.board_registered:
+            observations = await self.observe_tags(
+                self.recalibration_check_timeout)
+            drift = self.registration.residual(self.board.matrix,
+                                               observations)
+            board, _ = self.registration.register(observations)
+            if board is not None and \
+                    drift <= self.recalibration_tolerance and \
+                    rotation_angle(board, self.board.matrix) <= \
+                    self.recalibration_angle:
+                self.get_logger().info(
+                    f"board has drifted {drift * 1000:.1f} mm, "
+                    "skipping recalibration")
+                return response
 
         goal_js = MovePose.Request()
         goal_js.target_pose.position = Point(
@@ -152,29 +293,27 @@ class Tags(Node):
         goal_js.use_force_control = False
         # moving robot to calibrate position
         await self.move_js_client.call_async(goal_js)
-        time.sleep(2)
-        self.goal_state = "done"
-        ansT, ansR = await self.future
-        ansT1, ansT2 = ansT
-        ansR1, ansR2 = ansR
-        while ansT1[0] == 0.0 and ansT2[0]:
-            ansT, ansR = await self.future
-            ansT1, ansT2 = ansT
-            ansR1, ansR2 = ansR
-            self.get_logger().info("value set in service")
-        Tt1b = np.array([[1, 0, 0, 0.05], [0, 1, 0, 0.05],
-                        [0, 0, 1, 0], [0, 0, 0, 1]])
-        Trt1 = array_to_transform_matrix(ansT1, ansR1)
-        Trb1 = Trt1 @ Tt1b
-
-        self.boardT = Trb1
-        pos, rotation = matrix_to_position_quaternion(Trb1)
+
+        observations = await self.observe_tags(self.calibration_timeout)
+        Trb, residual = self.registration.register(observations)
+        if Trb is None:
+            self.get_logger().error("no board tag was seen, keeping the old "
+                                    "board")
+            return response
+        self.get_logger().info(
+            f"board registered from {len(observations)} tags, residual "
+            f"{residual * 1000:.1f} mm")
+
+        self.board.set(Trb)
+        self.board_registered = True
+        self.board_residual = residual
+        # the depths were learned in the old board frame
+        self.surface.reset()
+        pos, rotation = matrix_to_position_quaternion(Trb)
 
         self.robot_board.transform.translation = pos
         self.robot_board.transform.rotation = rotation
 
-        self.state = State.OTHER
-        self.goal_state = "not"
         return response
 
     async def where_to_write_callback(self, request, response):
@@ -194,72 +333,86 @@ class Tags(Node):
             initial_pose: a standoff position for the start of letter off-board
             pose_list: list of poses to write a letter
 
+        """
+        response.initial_pose, response.pose_list = self.tile_poses(request)
+        response.use_force_control = request.onboard
+        return response
+
+    async def where_to_write_batch_callback(self, request, response):
+        """
+        Give the poses of the end-effector to write every tile of a turn.
+
+        Args
+        ----
+            tiles (BoardTile[]): the tiles to write, each with the mode,
+            position, x, y and onboard fields of a where_to_write request
+
+        Returns
+        -------
+            tiles (TilePoses[]): the initial pose, pose list and force
+            control flags of each tile, in the same order
+
+        """
+        tiles = []
+        for tile in request.tiles:
+            initial_pose, pose_list = self.tile_poses(tile)
+            tiles.append(TilePoses(
+                initial_pose=initial_pose, pose_list=pose_list,
+                use_force_control=tile.onboard))
+        response.tiles = tiles
+        return response
+
+    def tile_poses(self, tile):
+        """
+        Compute the poses of the end-effector to write one tile.
+
+        Args
+        ----
+            tile (BoardTile): the mode, position, x, y and onboard values
+            of the tile
+
+        Returns
+        -------
+            initial_pose: a standoff position for the start of letter off-board
+            pose_list: list of poses to write a letter
+
         """
         self.get_logger().info("where_to_write1")
-        response_a = []
 
         self.get_logger().info("where_to_write2")
-        Trb = self.boardT
-        lx, ly = self.grid.grid_to_world(request.mode, request.position)
+        Trb = self.board.matrix
+        lx, ly = self.grid.tile_origin(tile.mode, tile.position)
         Tbl = np.array(
-            [[1, 0, 0, lx * 0.667], [0, 1, 0, ly * 0.667], [0, 0, 1, 0],
+            [[1, 0, 0, lx], [0, 1, 0, ly], [0, 0, 1, 0],
              [0, 0, 0, 1]]
         )
         Trl = Trb @ Tbl
 
-        x, y = request.x[0], request.y[0]
-        z = 0.12
+        # the standoff above the first point, then every point of the tile
+        count = len(tile.x)
+        translations = np.empty((count + 1, 3))
+        translations[0] = tile.x[0], tile.y[0], 0.12
+        translations[1:, 0] = tile.x
+        translations[1:, 1] = tile.y
+        translations[1:, 2] = np.where(
+            tile.onboard,
+            self.surface.predict(lx + np.asarray(tile.x),
+                                 ly + np.asarray(tile.y)),
+            0.1)
+
+        Tra = transform_stack(Trl, PEN_ROTATION, translations)
+        poses = transforms_to_poses(Tra)
+        initial_pose = poses[0]
+        response_a = poses[1:]
 
-        Tla = np.array(
-            [
-                [-0.03948997, 0.99782373, 0.05280484, x],
-                [0.06784999, 0.05540183, -0.99615612, y],
-                [-0.9969137, -0.03575537, -0.06989015, z],
-                [0.0, 0.0, 0.0, 1.0],
-            ]
-        )
-        pos = Pose()
-        Tra = Trl @ Tla
-        position, rotation = matrix_to_position_quaternion(Tra, 1)
-        pos.position = position
-        pos.orientation = rotation
         (
             self.robot_board_write.transform.translation,
             self.robot_board_write.transform.rotation,
-        ) = matrix_to_position_quaternion(Tra)
-
-        response.initial_pose = pos
-
-        for i in range(len(request.x)):
-            x, y = request.x[i], request.y[i]
-            z = 0.004 if request.onboard[i] else 0.1
-
-            Tla = np.array(
-                [
-                    [-0.03948997, 0.99782373, 0.05280484, x],
-                    [0.06784999, 0.05540183, -0.99615612, y],
-                    [-0.9969137, -0.03575537, -0.06989015, z],
-                    [0.0, 0.0, 0.0, 1.0],
-                ]
-            )
-            Tra = Trl @ Tla
-            position, rotation = matrix_to_position_quaternion(Tra, 1)
-            pos = Pose()
-            pos.position = position
-            pos.orientation = rotation
-
-            (
-                self.robot_board_write.transform.translation,
-                self.robot_board_write.transform.rotation,
-            ) = matrix_to_position_quaternion(Tra)
-            self.get_logger().info(f"pose is: {pos}")
-            response_a.append(pos)
-            self.get_logger().info(f"Now the list is: {response_a}")
+        ) = matrix_to_position_quaternion(Tra[-1])
+        self.pose_dump("pose list", response_a)
 
         self.get_logger().info("where_to_write3")
-        response.pose_list = response_a
-        response.use_force_control = request.onboard
-        return response
+        return initial_pose, response_a
 
     def update_trajectory_cb(self, request, response):
         """
@@ -273,6 +426,7 @@ class Tags(Node):
         Returns
         -------
             output_pose: updated list of poses
+            depth: the z of output_pose in the board frame
 
         """
         ansT, ansR = self.get_transform("board", "panda_hand_tcp")
@@ -286,31 +440,40 @@ class Tags(Node):
         self.get_logger().info("reached update trajcetory callback")
 
         pose = request.input_pose
-        self.get_logger().info(f"input pose: {pose}")
-
-        # change the pose
-        Trans_arr = [pose.position.x, pose.position.y, pose.position.z]
-        Rot_arr = [
-            pose.orientation.x,
-            pose.orientation.y,
-            pose.orientation.z,
-            pose.orientation.w,
-        ]
-        Tra = array_to_transform_matrix(Trans_arr, Rot_arr)
-        Trb = self.boardT
-        Tba = mr.TransInv(Trb) @ Tra
-        new_Tba = Tba
-        new_Tba[2, 3] = z
-        new_Tra = Trb @ new_Tba
-        pos = Pose()
-        position, rotation = matrix_to_position_quaternion(new_Tra, 1)
-        pos.position = position
-        pos.orientation = rotation
-
-        response.output_pose = pos
+        self.pose_dump("input pose", pose)
+
+        # move the pose to the new depth in the board frame; its orientation
+        # does not change
+        response.output_pose, = move_poses(
+            [pose], self.board.at_depth(pose_positions([pose]), z))
+        response.depth = float(z)
+
+        # remember the correction where it was needed, if the pen was found
+        if any(ansR):
+            self.surface.update(ansT[0], ansT[1], response.depth)
 
         return response
 
+    def correct_waypoints_cb(self, request, response):
+        """
+        Move waypoints to the depth of the pen in the board frame.
+
+        Args
+        ----
+            poses (Pose[]): the waypoints, in panda_link0
+            depth (float): the z of the pen in the board frame
+
+        Returns
+        -------
+            poses: the waypoints at that depth, with the same orientations
+
+        """
+        response.poses = move_poses(
+            request.poses,
+            self.board.at_depth(pose_positions(request.poses), request.depth))
+        self.pose_dump("corrected waypoints", response.poses)
+        return response
+
     def record_callback(self, request, response):
         """
         Record the transforms to calibrate the camera to the robot.
@@ -378,19 +541,123 @@ class Tags(Node):
             self.get_logger().info(f"Extrapolation exception: {e}")
             return [0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]
 
+    def lookup_tag(self, tag):
+        """
+        Look up the latest detection of a tag.
+
+        Args
+        ----
+            tag (string): the frame of the tag
+
+        Returns
+        -------
+            stamp: when the tag was detected, in ns, or None if it was not
+            trans: the x,y,z of the translational transform
+            rotation: the x,y,z,w of the rotational transform
+
+        """
+        try:
+            trans = self.buffer.lookup_transform(
+                "panda_link0", tag, rclpy.time.Time()
+            )
+        except (tf2_ros.LookupException, tf2_ros.ConnectivityException,
+                tf2_ros.ExtrapolationException):
+            return None, None, None
+        transl = trans.transform.translation
+        rot = trans.transform.rotation
+        stamp = rclpy.time.Time.from_msg(trans.header.stamp).nanoseconds
+        return (stamp, [transl.x, transl.y, transl.z],
+                [rot.x, rot.y, rot.z, rot.w])
+
+    async def observe_tags(self, timeout):
+        """
+        Average fresh detections of the tags on the board.
+
+        Args
+        ----
+            timeout (float): how long, in s, to wait for the averages to
+            converge before using what there is
+
+        Returns
+        -------
+            observations (dict): the average position, quaternion and number
+            of inliers of every tag seen, by tag frame
+
+        """
+        # only detections made from now on count
+        self.calibration = {
+            tag: TagAverage(min_samples=self.calibration_samples)
+            for tag in self.registration.tags}
+        self.calibration_start = self.get_clock().now().nanoseconds
+        self.calibration_timeout_active = timeout
+        self.calibration_future = rclpy.task.Future()
+        self.state = State.CALIBRATE
+        await self.calibration_future
+        self.state = State.OTHER
+
+        observations = {}
+        for tag, average in self.calibration.items():
+            self.get_logger().info(
+                f"{tag}: {average.inliers} of {average.count} detections, "
+                f"position error {average.position_error:.5f} m")
+            if average.position is not None:
+                observations[tag] = (average.position, average.quaternion,
+                                     average.inliers)
+        return observations
+
+    def collect_tag_samples(self):
+        """Add new detections of the tags to the calibration."""
+        for tag, average in self.calibration.items():
+            stamp, trans, rotation = self.lookup_tag(tag)
+            if stamp is not None and stamp >= self.calibration_start:
+                average.add(stamp, trans, rotation)
+
+        elapsed = (self.get_clock().now().nanoseconds -
+                   self.calibration_start) * 1e-9
+        if all(average.converged or average.full
+               for average in self.calibration.values()) or \
+                elapsed > self.calibration_timeout_active:
+            if not self.calibration_future.done():
+                self.calibration_future.set_result(True)
+
+    def force_callback(self, msg):
+        """Receive the force at the end-effector."""
+        self.ee_force = msg.ee_force
+        self.ee_force_time = self.get_clock().now().nanoseconds
+
+    def sample_surface(self):
+        """Add the pen position to the surface model while it is in contact."""
+        now = self.get_clock().now().nanoseconds
+        low, high = self.surface_contact_force
+        if now - self.surface_sample_time < self.surface_sample_period or \
+                now - self.ee_force_time > self.surface_sample_period or \
+                not low <= self.ee_force <= high:
+            return
+        ansT, ansR = self.get_transform("board", "panda_hand_tcp")
+        # the force alone does not tell that the pen is drawing
+        if not any(ansR) or not self.surface.accepts(*ansT):
+            return
+        self.surface_sample_time = now
+        self.surface.update(ansT[0], ansT[1], ansT[2])
+
     async def timer_callback(self):
         """Publish the panda_link0 to board transform constantly."""
-        if self.state == State.CALIBRATE and self.goal_state == "done":
-            ansT1, ansR1 = self.get_transform("panda_link0", "tag11")
-            ansT2, ansR2 = self.get_transform("panda_link0", "tag12")
-            # self.get_logger().info(f'{ansT, ansR}')
-            self.future.set_result([[ansT1, ansT2], [ansR1, ansR2]])
+        if self.state == State.CALIBRATE:
+            self.collect_tag_samples()
+        elif self.board_registered:
+            self.sample_surface()
         self.robot_board.header.stamp = self.get_clock().now().to_msg()
         self.robot_board_write.header.stamp = self.get_clock().now().to_msg()
         self.broadcaster.sendTransform(self.robot_board)
         self.broadcaster.sendTransform(self.robot_board_write)
 
 
+def rotation_angle(a, b):
+    """Return the angle, in rad, between the rotations of two transforms."""
+    cos = (np.trace(a[:3, :3].T @ b[:3, :3]) - 1.0) / 2.0
+    return float(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
 def Tags_entry(args=None):
     rclpy.init(args=args)
     node = Tags()
@@ -0,0 +1,247 @@
+"""
+Hold a planned joint trajectory as arrays, and split it into points lazily.
+
+The executor publishes a trajectory one point at a time, each point as its
+own JointTrajectory. Building all of those messages up front, and sending
+them through a service request, copies every array of every point several
+times. A CompactTrajectory keeps the positions, velocities, accelerations
+and efforts of all points in contiguous arrays with the joint names stored
+once, and only builds the message for a point when it is asked for.
+
+It supports the list operations the executor uses on its queue of
+trajectories: len, indexing, pop(0) and clear. It also keeps the planned
+time of every point, so the executor can stream time-parameterized chunks
+of several points to the controller instead of stepping through them.
+"""
+
+from array import array
+
+from builtin_interfaces.msg import Duration
+import numpy as np
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+
+# how long the controller gets to reach each point
+POINT_DURATION = 0.1  # s
+
+
+def point_array(points, field):
+    """Stack one field of a list of JointTrajectoryPoint messages."""
+    rows = [getattr(point, field) for point in points]
+    if not rows or not len(rows[0]):
+        return np.zeros((len(rows), 0))
+    return np.array(rows, dtype=float)
+
+
+def duration(seconds):
+    """Return a Duration message for a time in seconds."""
+    nanoseconds = int(round(seconds * 1e9))
+    return Duration(sec=nanoseconds // 1000000000,
+                    nanosec=nanoseconds % 1000000000)
+
+
+class CompactTrajectory:
+    """A joint trajectory stored as arrays, one row per point."""
+
+    def __init__(self, joint_names, positions, velocities=None,
+                 accelerations=None, effort=None, times=None,
+                 step=POINT_DURATION):
+        """
+        Initialize the trajectory.
+
+        Args
+        ----
+        joint_names (list): The names of the joints, shared by every point.
+        positions (numpy array): The (N, J) joint positions.
+        velocities (numpy array): The (N, J) joint velocities, if known.
+        accelerations (numpy array): The (N, J) joint accelerations, if
+        known.
+        effort (numpy array): The (N, J) joint efforts, if known.
+        times (numpy array): The N planned times from start, in s. If they
+        are not increasing, the points are taken to be step apart.
+        step (float): The time from start of every point message, in s.
+
+        Returns
+        -------
+        None
+
+        """
+        self.joint_names = list(joint_names)
+        self.positions = np.asarray(positions, dtype=float)
+        count = len(self.positions)
+        empty = np.zeros((count, 0))
+        self.velocities = empty if velocities is None else \
+            np.asarray(velocities, dtype=float)
+        self.accelerations = empty if accelerations is None else \
+            np.asarray(accelerations, dtype=float)
+        self.effort = empty if effort is None else \
+            np.asarray(effort, dtype=float)
+        self.time_from_start = duration(step)
+
+        # planned times, counted from the first point
+        times = None if times is None else np.asarray(times, dtype=float)
+        if times is None or len(times) != count or \
+                np.any(np.diff(times) <= 0.0):
+            times = np.arange(count) * step
+        self.times = times - times[0] if count else times
+
+        # the index of the first point not popped yet, and its message,
+        # which is kept so changes made to it stick until it is popped
+        self.start = 0
+        self.head = None
+
+    @classmethod
+    def from_msgs(cls, joint_trajectories, step=POINT_DURATION):
+        """
+        Build a trajectory from JointTrajectory messages.
+
+        Accepts both a whole trajectory in one message and a trajectory
+        already split into one message per point.
+
+        Args
+        ----
+        joint_trajectories (JointTrajectory[]): The messages, in order.
+        step (float): The time from start of every point message, in s.
+
+        Returns
+        -------
+        trajectory (CompactTrajectory): The trajectory.
+
+        """
+        points = [point for joint_trajectory in joint_trajectories
+                  for point in joint_trajectory.points]
+        joint_names = joint_trajectories[0].joint_names if \
+            joint_trajectories else []
+        times = [point.time_from_start.sec +
+                 point.time_from_start.nanosec * 1e-9 for point in points]
+        return cls(joint_names,
+                   point_array(points, 'positions'),
+                   point_array(points, 'velocities'),
+                   point_array(points, 'accelerations'),
+                   point_array(points, 'effort'),
+                   times, step)
+
+    def __len__(self):
+        """Return the number of points not popped yet."""
+        return len(self.positions) - self.start
+
+    def __getitem__(self, index):
+        """
+        Return the message of a point that has not been popped yet.
+
+        Args
+        ----
+        index (int): The index of the point, counted from the first point
+        not popped yet.
+
+        Returns
+        -------
+        joint_trajectory (JointTrajectory): A message with just that point.
+
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('trajectory index out of range')
+        if index == 0:
+            if self.head is None:
+                self.head = self.point(self.start)
+            return self.head
+        return self.point(self.start + index)
+
+    def __iter__(self):
+        """Yield the message of every point not popped yet."""
+        for index in range(len(self)):
+            yield self[index]
+
+    def point(self, index):
+        """
+        Build the message for one point.
+
+        Args
+        ----
+        index (int): The index of the point in the whole trajectory.
+
+        Returns
+        -------
+        joint_trajectory (JointTrajectory): A message with just that point.
+
+        """
+        return JointTrajectory(
+            joint_names=self.joint_names,
+            points=[self.point_msg(index, self.time_from_start)])
+
+    def point_msg(self, index, time_from_start):
+        """Build the JointTrajectoryPoint of one point."""
+        return JointTrajectoryPoint(
+            positions=array('d', self.positions[index].tobytes()),
+            velocities=array('d', self.velocities[index].tobytes()),
+            accelerations=array('d', self.accelerations[index].tobytes()),
+            effort=array('d', self.effort[index].tobytes()),
+            time_from_start=time_from_start)
+
+    def chunk(self, count, elapsed):
+        """
+        Build one message for the next points, timed from now.
+
+        Args
+        ----
+        count (int): The most points to put in the message.
+        elapsed (float): The time since the trajectory started, in s.
+
+        Returns
+        -------
+        joint_trajectory (JointTrajectory): A message with the next count
+        points, with their planned times shifted so that now is 0.
+
+        """
+        end = min(self.start + count, len(self.positions))
+        points = [
+            self.point_msg(index,
+                           duration(max(self.times[index] - elapsed, 0.0)))
+            for index in range(self.start, end)]
+        return JointTrajectory(joint_names=self.joint_names, points=points)
+
+    def elapse(self, elapsed):
+        """
+        Pop every point whose planned time has passed.
+
+        Args
+        ----
+        elapsed (float): The time since the trajectory started, in s.
+
+        Returns
+        -------
+        count (int): The number of points popped.
+
+        """
+        end = int(np.searchsorted(self.times, elapsed, side='right'))
+        count = max(end - self.start, 0)
+        if count:
+            self.start = end
+            self.head = None
+        return count
+
+    def pop(self, index=0):
+        """
+        Remove the first point and return its message.
+
+        Args
+        ----
+        index (int): Must be 0; points are only ever popped from the front.
+
+        Returns
+        -------
+        joint_trajectory (JointTrajectory): A message with just that point.
+
+        """
+        if index != 0:
+            raise IndexError('points can only be popped from the front')
+        joint_trajectory = self[0]
+        self.start += 1
+        self.head = None
+        return joint_trajectory
+
+    def clear(self):
+        """Drop every point that has not been popped yet."""
+        self.start = len(self.positions)
+        self.head = None
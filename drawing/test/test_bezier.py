@@ -0,0 +1,56 @@
+from drawing.bezier import (CLOSEPOLY, CURVE3, CURVE4, LINETO, MOVETO,
+                            de_casteljau, flatten_path)
+from drawing.glyph_atlas import Glyph
+
+import numpy as np
+
+
+def test_de_casteljau_matches_bernstein_form():
+    control_points = np.array([[0.0, 0.0], [1.0, 2.0], [3.0, 2.0],
+                               [4.0, 0.0]])
+    t = np.linspace(0.0, 1.0, 7)[:, None]
+    expected = ((1 - t) ** 3 * control_points[0] +
+                3 * (1 - t) ** 2 * t * control_points[1] +
+                3 * (1 - t) * t ** 2 * control_points[2] +
+                t ** 3 * control_points[3])
+
+    np.testing.assert_allclose(
+        de_casteljau(control_points, t[:, 0]), expected)
+
+
+def test_curves_stay_within_tolerance():
+    vertices = [[0.0, 0.0], [50.0, 100.0], [100.0, 0.0], [0.0, 0.0]]
+    codes = [MOVETO, CURVE3, CURVE3, CLOSEPOLY]
+    tolerance = 0.1
+
+    contour, = flatten_path(vertices, codes, tolerance)
+
+    # the flattened curve is x = 100 t, y = 200 t (1 - t)
+    curve = contour[:-1]
+    t = curve[:, 0] / 100
+    np.testing.assert_allclose(curve[:, 1], 200 * t * (1 - t))
+    mid = (curve[:-1] + curve[1:]) / 2
+    t_mid = mid[:, 0] / 100
+    assert np.max(200 * t_mid * (1 - t_mid) - mid[:, 1]) <= tolerance
+    np.testing.assert_array_equal(contour[-1], [0.0, 0.0])
+
+
+def test_moveto_starts_a_new_contour():
+    vertices = [[0.0, 0.0], [1.0, 0.0], [0.0, 0.0],
+                [5.0, 5.0], [6.0, 6.0], [7.0, 5.0], [8.0, 8.0]]
+    codes = [MOVETO, LINETO, CLOSEPOLY, MOVETO, CURVE4, CURVE4, CURVE4]
+
+    contours = flatten_path(vertices, codes, 0.01)
+
+    assert len(contours) == 2
+    np.testing.assert_array_equal(contours[0], [[0, 0], [1, 0], [0, 0]])
+    np.testing.assert_array_equal(contours[1][[0, -1]], [[5, 5], [8, 8]])
+
+
+def test_pen_lifts_between_contours():
+    glyph = Glyph.from_contours([np.array([[0.0, 0.0], [1.0, 0.0]]),
+                                 np.array([[2.0, 2.0], [3.0, 2.0]])])
+
+    np.testing.assert_array_equal(
+        glyph.points, [[0, 0], [1, 0], [2, 2], [2, 2], [3, 2], [3, 2]])
+    assert glyph.pen_down.tolist() == [True, True, False, True, True, False]
@@ -0,0 +1,103 @@
+import math
+
+from drawing.board_registration import BoardFrame, BoardRegistration
+
+import numpy as np
+import pytest
+import transforms3d as tf
+
+# a board tilted about x, as seen from the robot
+BOARD_QUATERNION = np.array([math.sin(0.2), 0.0, 0.0, math.cos(0.2)])
+BOARD_ROTATION = tf.quaternions.quat2mat(np.roll(BOARD_QUATERNION, 1))
+BOARD_ORIGIN = np.array([0.4, -0.3, 0.2])
+
+
+def seen_at(offset):
+    """Where a tag whose board origin is at offset in its frame is seen."""
+    return BOARD_ORIGIN - BOARD_ROTATION @ [offset[0], offset[1], 0.0]
+
+
+def test_single_tag_matches_the_tag_offset():
+    registration = BoardRegistration({'tag11': (0.05, 0.05)})
+
+    board, residual = registration.register({
+        'tag11': (seen_at((0.05, 0.05)), BOARD_QUATERNION, 10)})
+
+    # what calibrate_callback did: Trt1 @ Tt1b
+    Trt1 = np.eye(4)
+    Trt1[:3, :3] = BOARD_ROTATION
+    Trt1[:3, 3] = seen_at((0.05, 0.05))
+    Tt1b = np.array([[1, 0, 0, 0.05], [0, 1, 0, 0.05],
+                     [0, 0, 1, 0], [0, 0, 0, 1]])
+    np.testing.assert_allclose(board, Trt1 @ Tt1b, atol=1e-12)
+    assert residual == pytest.approx(0.0)
+
+
+def test_tags_are_fused():
+    offsets = {'tag11': (0.05, 0.05), 'tag12': (-0.6, 0.05),
+               'tag13': (0.05, -0.3)}
+    registration = BoardRegistration(offsets)
+    noise = {'tag11': [0.001, 0.0, 0.0], 'tag12': [-0.001, 0.0, 0.0],
+             'tag13': [0.0, 0.0, 0.0]}
+
+    board, residual = registration.register({
+        tag: (seen_at(offset) + noise[tag], BOARD_QUATERNION, 10)
+        for tag, offset in offsets.items()})
+
+    np.testing.assert_allclose(board[:3, 3], BOARD_ORIGIN, atol=1e-9)
+    assert residual == pytest.approx(math.sqrt(2 / 3) * 0.001)
+
+
+def test_unknown_tags_are_ignored():
+    registration = BoardRegistration({'tag11': (0.05, 0.05)})
+
+    board, residual = registration.register({
+        'tag56': (BOARD_ORIGIN, BOARD_QUATERNION, 10)})
+
+    assert board is None
+    assert residual == math.inf
+
+
+def test_residual_measures_drift():
+    registration = BoardRegistration({'tag11': (0.05, 0.05)})
+    observations = {'tag11': (seen_at((0.05, 0.05)), BOARD_QUATERNION, 10)}
+    board, _ = registration.register(observations)
+
+    moved = {'tag11': (seen_at((0.05, 0.05)) + [0.0, 0.003, 0.0],
+                       BOARD_QUATERNION, 10)}
+
+    assert registration.residual(board, observations) == pytest.approx(0.0)
+    assert registration.residual(board, moved) == pytest.approx(0.003)
+
+
+def test_board_frame_inverse():
+    board = BoardFrame()
+    matrix = np.eye(4)
+    matrix[:3, :3] = BOARD_ROTATION
+    matrix[:3, 3] = BOARD_ORIGIN
+    board.set(matrix)
+
+    np.testing.assert_allclose(board.inverse, np.linalg.inv(matrix),
+                               atol=1e-12)
+    points = np.random.default_rng(0).uniform(-1.0, 1.0, (5, 3))
+    np.testing.assert_allclose(board.from_board(board.to_board(points)),
+                               points, atol=1e-12)
+
+
+def test_at_depth_moves_points_along_the_board_normal():
+    matrix = np.eye(4)
+    matrix[:3, :3] = BOARD_ROTATION
+    matrix[:3, 3] = BOARD_ORIGIN
+    board = BoardFrame(matrix)
+    onboard = np.array([[0.1, 0.2, 0.01], [0.3, 0.05, -0.02]])
+    points = board.from_board(onboard)
+
+    moved = board.at_depth(points, 0.004)
+
+    np.testing.assert_allclose(board.to_board(moved),
+                               [[0.1, 0.2, 0.004], [0.3, 0.05, 0.004]],
+                               atol=1e-12)
+    # the board is tilted, so more than z changes in the base frame
+    np.testing.assert_allclose(moved - points,
+                               np.outer([-0.006, 0.024], BOARD_ROTATION[:, 2]),
+                               atol=1e-12)
@@ -0,0 +1,67 @@
+import math
+
+from drawing.calibration import (average_quaternions, quaternion_angles,
+                                 TagAverage)
+
+import numpy as np
+import pytest
+
+
+def about_z(angle):
+    return np.array([0.0, 0.0, math.sin(angle / 2), math.cos(angle / 2)])
+
+
+def test_average_ignores_quaternion_sign():
+    quaternions = np.array([about_z(0.1), -about_z(0.3)])
+
+    average = average_quaternions(quaternions)
+
+    assert quaternion_angles([average], about_z(0.2))[0] == \
+        pytest.approx(0.0, abs=1e-9)
+    assert average[3] > 0.0
+
+
+def test_converges_on_clean_detections():
+    rng = np.random.default_rng(0)
+    average = TagAverage(min_samples=10)
+    position = np.array([0.5, -0.2, 0.1])
+
+    stamps = 0
+    while not average.converged:
+        stamps += 1
+        average.add(stamps, position + rng.normal(0.0, 0.0005, 3),
+                    about_z(0.3 + rng.normal(0.0, 0.002)))
+
+    assert 10 <= stamps < 100
+    np.testing.assert_allclose(average.position, position, atol=0.001)
+    assert quaternion_angles([average.quaternion], about_z(0.3))[0] < 0.005
+
+
+def test_outliers_are_dropped():
+    average = TagAverage(min_samples=3)
+    for stamp in range(10):
+        average.add(stamp, [0.5, 0.0, 0.0], about_z(0.3))
+    average.add(10, [0.6, 0.0, 0.0], about_z(0.3))
+    average.add(11, [0.5, 0.0, 0.0], about_z(1.3))
+
+    assert average.inliers == 10
+    np.testing.assert_allclose(average.position, [0.5, 0.0, 0.0])
+
+
+def test_repeated_and_missing_detections_are_ignored():
+    average = TagAverage()
+
+    assert average.add(1, [0.5, 0.0, 0.0], about_z(0.3))
+    assert not average.add(1, [0.5, 0.0, 0.0], about_z(0.3))
+    assert not average.add(2, [0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0])
+    assert average.count == 1
+    assert not average.converged
+
+
+def test_stops_when_full():
+    average = TagAverage(max_samples=3)
+    for stamp in range(5):
+        average.add(stamp, [stamp, 0.0, 0.0], about_z(0.3))
+
+    assert average.full
+    assert average.count == 3
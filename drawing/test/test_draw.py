@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+from drawing.draw import Drawing
+from drawing.motion_queue import MotionItem, MotionQueue
+
+from geometry_msgs.msg import Point, Pose
+
+
+class StandInCorrection:
+    """Answers /correct_waypoints requests, moving every pose to the depth."""
+
+    def __init__(self):
+        self.requests = []
+
+    def service_is_ready(self):
+        return True
+
+    async def call_async(self, request):
+        self.requests.append(request)
+        return SimpleNamespace(poses=[
+            Pose(position=Point(x=pose.position.x, y=pose.position.y,
+                                z=request.depth))
+            for pose in request.poses])
+
+
+def at(x):
+    return Pose(position=Point(x=x, y=0.0, z=0.1))
+
+
+def test_correct_remaining_only_moves_force_controlled_items():
+    items = [MotionItem(at(0.1), 0.02, True), MotionItem(at(0.2), 0.02),
+             MotionItem(at(0.3), 0.02, True)]
+    client = StandInCorrection()
+    drawing = SimpleNamespace(
+        cartesian_mp_queue=MotionQueue(items),
+        correct_waypoints_client=client,
+        get_logger=lambda: SimpleNamespace(info=print, warn=print))
+
+    asyncio.run(Drawing.correct_remaining(drawing, 0.004))
+
+    assert len(client.requests) == 1
+    assert [item.pose.position.z for item in drawing.cartesian_mp_queue] == \
+        [0.004, 0.1, 0.004]
+    assert [item.pose.position.x for item in drawing.cartesian_mp_queue] == \
+        [0.1, 0.2, 0.3]
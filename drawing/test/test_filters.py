@@ -0,0 +1,58 @@
+from drawing.filters import (ExponentialMovingAverage, make_filter,
+                             MovingAverage, MovingMedian)
+
+import numpy as np
+import pytest
+
+
+def test_moving_average_matches_the_window():
+    samples = np.random.default_rng(0).normal(2.3, 0.5, 1000)
+    average = MovingAverage(10)
+
+    values = [average.update(sample) for sample in samples]
+
+    assert values[0] == pytest.approx(samples[0])
+    assert values[4] == pytest.approx(np.mean(samples[:5]))
+    assert values[-1] == pytest.approx(np.mean(samples[-10:]))
+
+
+def test_ema_converges():
+    ema = ExponentialMovingAverage(9)
+
+    assert ema.alpha == pytest.approx(0.2)
+    assert ema.update(1.0) == 1.0
+    for _ in range(100):
+        ema.update(3.0)
+    assert ema.value == pytest.approx(3.0)
+
+
+def test_median_ignores_spikes():
+    median = MovingMedian(5)
+
+    for sample in [2.0, 2.1, 50.0, 2.2, 1.9]:
+        median.update(sample)
+
+    assert median.value == pytest.approx(2.1)
+    # the oldest sample, 2.0, makes way for 2.4
+    assert median.update(2.4) == pytest.approx(2.2)
+
+
+def test_median_of_a_partial_window():
+    median = MovingMedian(5)
+
+    median.update(1.0)
+    assert median.update(3.0) == pytest.approx(2.0)
+
+
+def test_reset():
+    for kind in ('mean', 'ema', 'median'):
+        filter_ = make_filter(kind, 4)
+        filter_.update(1.0)
+        filter_.reset()
+        assert filter_.count == 0
+        assert filter_.update(5.0) == pytest.approx(5.0)
+
+
+def test_unknown_filter():
+    with pytest.raises(ValueError):
+        make_filter('kalman', 10)
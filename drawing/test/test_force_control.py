@@ -0,0 +1,70 @@
+from drawing.force_control import ForcePID
+
+import pytest
+
+
+def test_matches_the_old_loop_at_ten_hertz():
+    pid = ForcePID(kp=0.029, ki=0.00005, kd=0.0009, setpoint=2.3)
+
+    pid.update(2.0, 0.0)
+    adjustment = pid.update(1.5, 0.1)
+
+    # the old loop: Kp * e + Ki * sum(e * 0.1) + Kd * (e - e_previous)
+    error, previous = 2.3 - 1.5, 2.3 - 2.0
+    expected = 0.0029 * error + 0.000005 * (previous + error) * 0.1 + \
+        0.0009 * (error - previous)
+    assert adjustment == pytest.approx(expected)
+
+
+def test_adjustment_scales_with_measured_dt():
+    slow = ForcePID(kp=0.029, ki=0.0, kd=0.0, setpoint=2.3)
+    fast = ForcePID(kp=0.029, ki=0.0, kd=0.0, setpoint=2.3)
+
+    slow.update(2.3, 0.0)
+    fast.update(2.3, 0.0)
+    total_slow = slow.update(1.3, 0.1)
+    total_fast = sum(fast.update(1.3, t) for t in (0.025, 0.05, 0.075, 0.1))
+
+    assert total_fast == pytest.approx(total_slow)
+
+
+def test_integral_is_clamped():
+    pid = ForcePID(kp=0.0, ki=1.0, kd=0.0, setpoint=2.3, integral_limit=0.5)
+
+    for i in range(100):
+        pid.update(0.0, i * 0.1)
+
+    assert pid.integral == pytest.approx(0.5)
+    # the error changing sign unwinds the integral straight away
+    pid.update(4.6, 10.0)
+    assert pid.integral < 0.5
+
+
+def test_derivative_is_filtered():
+    raw = ForcePID(kp=0.0, ki=0.0, kd=1.0, setpoint=0.0)
+    filtered = ForcePID(kp=0.0, ki=0.0, kd=1.0, setpoint=0.0,
+                        derivative_filter=0.1)
+
+    for pid in (raw, filtered):
+        pid.update(0.0, 0.0)
+    spike_raw = raw.update(1.0, 0.01)
+    spike_filtered = filtered.update(1.0, 0.01)
+
+    assert abs(spike_filtered) < abs(spike_raw) / 5
+
+
+def test_repeated_timestamps_are_ignored():
+    pid = ForcePID(kp=0.029, ki=0.00005, kd=0.0009, setpoint=2.3)
+
+    pid.update(2.0, 1.0)
+    assert pid.update(1.0, 1.0) == 0.0
+
+
+def test_reset_forgets_history():
+    pid = ForcePID(kp=0.029, ki=1.0, kd=0.0, setpoint=2.3)
+    pid.update(0.0, 0.0)
+    pid.update(0.0, 0.1)
+    pid.reset()
+
+    assert pid.integral == 0.0
+    assert pid.previous_time is None
@@ -0,0 +1,91 @@
+import math
+from types import SimpleNamespace
+
+from drawing.force_estimation import (DH_A, DH_ALPHA, DH_D, ForceEstimator,
+                                      HAND_TO_TCP, JOINT_NAMES, LINK7_TO_HAND,
+                                      PandaChain)
+
+import numpy as np
+import pytest
+
+READY = np.array([0.0, -math.pi / 4, 0.0, -3 * math.pi / 4, 0.0,
+                  math.pi / 2, math.pi / 4])
+CENTER_OF_MASS = np.array([-0.01, 0, 0.03])
+
+
+def dh_transform(a, alpha, d, q):
+    tx = np.eye(4)
+    tx[0, 3] = a
+    rx = np.eye(4)
+    rx[1:3, 1:3] = [[math.cos(alpha), -math.sin(alpha)],
+                    [math.sin(alpha), math.cos(alpha)]]
+    tz = np.eye(4)
+    tz[2, 3] = d
+    rz = np.eye(4)
+    rz[:2, :2] = [[math.cos(q), -math.sin(q)], [math.sin(q), math.cos(q)]]
+    return tx @ rx @ tz @ rz
+
+
+def joint_state(positions, effort=None, names=JOINT_NAMES):
+    return SimpleNamespace(name=list(names), position=list(positions),
+                           effort=list(effort or [0.0] * len(names)))
+
+
+def test_flange_at_zero():
+    chain = PandaChain()
+    chain.update(np.zeros(7))
+
+    flange = chain.link6 @ chain.joints[6]
+    np.testing.assert_allclose(flange[:3, 3] + flange[:3, 2] * 0.107,
+                               [0.088, 0.0, 0.926], atol=1e-9)
+
+
+def test_tcp_at_ready():
+    chain = PandaChain()
+    chain.update(READY)
+
+    tcp = chain.tcp_in_base()
+    np.testing.assert_allclose(tcp[:3, 3], [0.3069, 0.0, 0.4869], atol=1e-4)
+    # pointing down at the table
+    np.testing.assert_allclose(tcp[:3, 2], [0.0, 0.0, -1.0], atol=1e-9)
+
+
+def test_matches_the_tf_calculation():
+    q = np.array([0.3, -0.5, 0.2, -2.0, 0.1, 1.7, 0.6])
+    links = [np.eye(4)]
+    for a, alpha, d, angle in zip(DH_A, DH_ALPHA, DH_D, q):
+        links.append(links[-1] @ dh_transform(a, alpha, d, angle))
+    Tw6 = links[6]
+    T6f = np.linalg.inv(Tw6) @ links[7] @ LINK7_TO_HAND
+    T6e = T6f @ HAND_TO_TCP
+    Te6 = np.linalg.inv(T6e)
+
+    # what calc_joint_torque_offset and calc_ee_force did with TF frames
+    F6 = np.linalg.inv(Tw6[:3, :3]) @ np.array([0, 0, -1.8 * 9.81])
+    offset = (F6 * (T6f[:3, 3] + T6f[:3, :3] @ CENTER_OF_MASS))[1]
+    M6 = np.array([0, 1.5 - offset, 0])
+    p6e = T6e[:3, 3]
+    expected = Te6[:3, :3] @ np.divide(M6, p6e, out=np.zeros(3),
+                                       where=p6e != 0)
+
+    estimator = ForceEstimator(1.8, 9.81, CENTER_OF_MASS)
+    effort = [0.0] * 7
+    effort[5] = 1.5
+    force = estimator.estimate(joint_state(q, effort))
+
+    assert estimator.joint_torque_offset() == pytest.approx(offset)
+    np.testing.assert_allclose(force, expected, atol=1e-12)
+
+
+def test_joints_are_found_by_name():
+    names = ['panda_finger_joint1'] + JOINT_NAMES[::-1]
+    positions = [0.04] + list(READY[::-1])
+    effort = [0.0] * 8
+    effort[2] = 1.5  # panda_joint6
+
+    estimator = ForceEstimator(1.8, 9.81, CENTER_OF_MASS)
+    shuffled = estimator.estimate(joint_state(positions, effort, names))
+
+    in_order = ForceEstimator(1.8, 9.81, CENTER_OF_MASS).estimate(
+        joint_state(READY, [0.0] * 5 + [1.5, 0.0]))
+    np.testing.assert_allclose(shuffled, in_order)
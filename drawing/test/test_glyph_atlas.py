@@ -0,0 +1,70 @@
+import subprocess
+import sys
+
+from drawing.glyph_atlas import (Glyph, GlyphAtlas, LETTERS, atlas_path,
+                                 load_glyph_atlas)
+
+import numpy as np
+import pytest
+
+
+def make_atlas(board_scale=1.0):
+    glyphs = {letter: Glyph(np.full((i + 1, 2), float(i)),
+                            np.arange(i + 1) % 2 == 0)
+              for i, letter in enumerate(LETTERS)}
+    return GlyphAtlas('Test Sans', board_scale, 0.001 * board_scale, glyphs)
+
+
+def test_save_load_round_trip(tmp_path):
+    atlas = make_atlas()
+    path = str(tmp_path / 'atlas.npz')
+    atlas.save(path)
+
+    loaded = GlyphAtlas.load(path)
+
+    assert loaded.key() == atlas.key()
+    assert list(loaded.keys()) == list(atlas.keys())
+    for letter in LETTERS:
+        np.testing.assert_array_equal(loaded[letter].points,
+                                      atlas[letter].points)
+        np.testing.assert_array_equal(loaded[letter].pen_down,
+                                      atlas[letter].pen_down)
+
+
+def test_cache_path_depends_on_inputs(tmp_path):
+    a = atlas_path(str(tmp_path), 'Test Sans', 1.0, 0.001)
+    assert a == atlas_path(str(tmp_path), 'Test Sans', 1.0, 0.001)
+    assert a != atlas_path(str(tmp_path), 'Test Sans', 2.0, 0.002)
+    assert a != atlas_path(str(tmp_path), 'Other Sans', 1.0, 0.001)
+
+
+def test_warm_cache_is_not_rebuilt(tmp_path, monkeypatch):
+    atlas = make_atlas()
+    atlas.save(atlas_path(str(tmp_path), 'Test Sans', 1.0, 0.001))
+
+    def fail(*args, **kwargs):
+        raise AssertionError('atlas should have come from the cache')
+
+    monkeypatch.setattr(GlyphAtlas, 'build', fail)
+    loaded = load_glyph_atlas('Test Sans', 1.0, 0.001, str(tmp_path))
+
+    np.testing.assert_array_equal(loaded['B'].points, atlas['B'].points)
+
+
+def test_warm_load_does_not_import_matplotlib(tmp_path):
+    make_atlas().save(atlas_path(str(tmp_path), 'Test Sans', 1.0, 0.001))
+    script = (
+        "import sys\n"
+        "from drawing.glyph_atlas import load_glyph_atlas\n"
+        f"load_glyph_atlas('Test Sans', 1.0, 0.001, {str(tmp_path)!r})\n"
+        "assert 'matplotlib' not in sys.modules\n")
+    subprocess.run([sys.executable, '-c', script], check=True)
+
+
+def test_changed_inputs_rebuild(tmp_path):
+    pytest.importorskip('matplotlib')
+    small = load_glyph_atlas('DejaVu Sans', 1.0, 0.001, str(tmp_path))
+    large = load_glyph_atlas('DejaVu Sans', 2.0, 0.002, str(tmp_path))
+
+    assert len(list(tmp_path.iterdir())) == 2
+    np.testing.assert_allclose(large['A'].points, small['A'].points * 4)
@@ -0,0 +1,50 @@
+from drawing.grid import (matrix_to_position_quaternion, move_poses,
+                          pose_positions, transform_stack,
+                          transforms_to_poses)
+
+from geometry_msgs.msg import Point, Pose, Quaternion
+import numpy as np
+import transforms3d as tf
+
+
+def test_transform_stack_matches_per_point_product():
+    transform = np.eye(4)
+    transform[:3, :3] = tf.euler.euler2mat(0.1, 0.2, 0.3)
+    transform[:3, 3] = [0.3, 0.1, 0.5]
+    rotation = tf.euler.euler2mat(-0.4, 0.0, 1.2)
+    translations = np.array([[0.01, 0.02, 0.004], [0.05, 0.0, 0.1]])
+
+    stack = transform_stack(transform, rotation, translations)
+
+    for i, translation in enumerate(translations):
+        local = np.eye(4)
+        local[:3, :3] = rotation
+        local[:3, 3] = translation
+        np.testing.assert_allclose(stack[i], transform @ local)
+
+
+def test_transforms_to_poses_matches_single_conversion():
+    stack = transform_stack(
+        np.eye(4), tf.euler.euler2mat(0.5, -0.2, 0.1),
+        [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+
+    poses = transforms_to_poses(stack)
+
+    for pose, transform in zip(poses, stack):
+        position, rotation = matrix_to_position_quaternion(transform, 1)
+        assert pose.position == position
+        assert pose.orientation == rotation
+
+
+def test_move_poses_keeps_orientations():
+    poses = [Pose(position=Point(x=0.1, y=0.2, z=0.3),
+                  orientation=Quaternion(x=1.0, y=0.0, z=0.0, w=0.0)),
+             Pose(position=Point(x=0.4, y=0.5, z=0.6),
+                  orientation=Quaternion(x=0.0, y=1.0, z=0.0, w=0.0))]
+    positions = np.array([[0.0, 0.1, 0.2], [0.3, 0.4, 0.5]])
+
+    moved = move_poses(poses, positions)
+
+    np.testing.assert_allclose(pose_positions(moved), positions)
+    assert [pose.orientation for pose in moved] == \
+        [pose.orientation for pose in poses]
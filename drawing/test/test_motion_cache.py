@@ -0,0 +1,203 @@
+import asyncio
+from types import SimpleNamespace
+
+from drawing.motion_cache import (apply_box, CollisionScene, IKCache,
+                                  LRUCache, PlanCache)
+
+
+def make_pose(x, y, z, qx=1.0, qy=0.0, qz=0.0, qw=0.0):
+    return SimpleNamespace(
+        position=SimpleNamespace(x=x, y=y, z=z),
+        orientation=SimpleNamespace(x=qx, y=qy, z=qz, w=qw))
+
+
+class StandInIK:
+    """Answers IK requests like /compute_ik and counts the calls."""
+
+    def __init__(self, valid=True):
+        self.calls = 0
+        self.valid = valid
+
+    async def __call__(self, pose):
+        self.calls += 1
+        return [pose.position.x, pose.position.y, pose.position.z], self.valid
+
+
+def solve(cache, pose, seed, solver):
+    return asyncio.run(cache.solve(pose, seed, solver))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(capacity=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_repeated_pose_hits_cache():
+    cache = IKCache()
+    ik = StandInIK()
+    home = make_pose(-0.5, 0.0, 0.4)
+    seed = [0.0] * 7
+
+    first = solve(cache, home, seed, ik)
+    second = solve(cache, make_pose(-0.5, 0.0001, 0.4), seed, ik)
+
+    assert second is first
+    assert ik.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_negated_quaternion_hits_cache():
+    cache = IKCache()
+    ik = StandInIK()
+    seed = [0.0] * 7
+
+    solve(cache, make_pose(0.3, 0.0, 0.4, qx=1.0), seed, ik)
+    solve(cache, make_pose(0.3, 0.0, 0.4, qx=-1.0), seed, ik)
+
+    assert ik.calls == 1
+
+
+def test_different_pose_or_seed_misses():
+    cache = IKCache(seed_resolution=0.5)
+    ik = StandInIK()
+    pose = make_pose(0.3, 0.0, 0.4)
+
+    solve(cache, pose, [0.0] * 7, ik)
+    solve(cache, make_pose(0.31, 0.0, 0.4), [0.0] * 7, ik)
+    solve(cache, pose, [0.0] * 6 + [1.5], ik)
+
+    assert ik.calls == 3
+    assert cache.hits == 0
+
+
+def test_failed_solutions_are_not_cached():
+    cache = IKCache()
+    ik = StandInIK(valid=False)
+    pose = make_pose(2.0, 0.0, 0.4)
+
+    solve(cache, pose, [0.0] * 7, ik)
+    solve(cache, pose, [0.0] * 7, ik)
+
+    assert ik.calls == 2
+    assert len(cache) == 0
+
+
+def test_clear_invalidates_solutions():
+    cache = IKCache()
+    ik = StandInIK()
+    pose = make_pose(0.3, 0.0, 0.4)
+
+    solve(cache, pose, [0.0] * 7, ik)
+    cache.clear()
+    solve(cache, pose, [0.0] * 7, ik)
+
+    assert ik.calls == 2
+
+
+def test_republishing_the_same_box_keeps_solutions():
+    scene = CollisionScene()
+    cache = IKCache()
+    ik = StandInIK()
+    table = make_pose(0.0, 0.0, -0.5)
+    pose = make_pose(0.3, 0.0, 0.4)
+
+    assert apply_box(scene, cache, 'table', 'panda_link0', [1.5, 1.0, 3.0],
+                     table)
+    solve(cache, pose, [0.0] * 7, ik)
+    assert not apply_box(scene, cache, 'table', 'panda_link0',
+                         [1.5, 1.0, 3.0], table)
+    # removing a board that was never added
+    assert not apply_box(scene, cache, 'board', 'panda_link0',
+                         [0.0, 0.0, 0.0], make_pose(0, 0, -0.3))
+    solve(cache, pose, [0.0] * 7, ik)
+
+    assert ik.calls == 1
+    assert cache.hits == 1
+
+
+def test_moving_a_box_forgets_solutions():
+    scene = CollisionScene()
+    cache = IKCache()
+    ik = StandInIK()
+    pose = make_pose(0.3, 0.0, 0.4)
+
+    apply_box(scene, cache, 'board', 'panda_link0', [2.0, 2.0, 0.02],
+              make_pose(0.5, 0.0, 0.2))
+    solve(cache, pose, [0.0] * 7, ik)
+    apply_box(scene, cache, 'board', 'panda_link0', [2.0, 2.0, 0.02],
+              make_pose(0.5, 0.0, 0.21))
+    solve(cache, pose, [0.0] * 7, ik)
+
+    assert ik.calls == 2
+
+
+def test_moving_or_removing_a_box_is_a_change():
+    scene = CollisionScene()
+    board = make_pose(0.5, 0.0, 0.2)
+
+    assert scene.apply('board', 'panda_link0', [2.0, 2.0, 0.02], board)
+    assert scene.apply('board', 'panda_link0', [2.0, 2.0, 0.02],
+                       make_pose(0.5, 0.0, 0.21))
+    assert scene.apply('board', 'panda_link0', [0.0, 0.0, 0.0], board)
+    assert not scene.apply('board', 'panda_link0', [0.0, 0.0, 0.0], board)
+
+
+def test_plan_is_reused_from_a_close_start():
+    cache = PlanCache(start_tolerance=0.01)
+    start = [0.0, -0.79, 0.0, -2.36, 0.0, 1.57, 0.79]
+    goal = [0.1, -0.5, 0.0, -2.0, 0.0, 1.5, 0.79]
+    cache.store(start, goal, 0, 'trajectory')
+
+    nearby = [q + 0.005 for q in start]
+    assert cache.lookup(nearby, goal, 0) == 'trajectory'
+    assert cache.hits == 1
+
+
+def test_plan_misses_on_far_start_goal_or_new_scene():
+    cache = PlanCache(start_tolerance=0.01)
+    start = [0.0] * 7
+    goal = [0.5] * 7
+    cache.store(start, goal, 0, 'trajectory')
+
+    assert cache.lookup([0.0] * 6 + [0.2], goal, 0) is None
+    assert cache.lookup(start, [0.5] * 6 + [0.6], 0) is None
+    assert cache.lookup(start, goal, 1) is None
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_repeated_request_hits_the_plan_cache():
+    scene = CollisionScene()
+    cache = PlanCache()
+    scene.apply('table', 'panda_link0', [1.5, 1.0, 3.0],
+                make_pose(0.0, 0.0, -0.5))
+    start = [0.0, -0.79, 0.0, -2.36, 0.0, 1.57, 0.79]
+    goal = [0.1, -0.5, 0.0, -2.0, 0.0, 1.5, 0.79]
+    board = make_pose(0.0, 0.0, -0.3)
+
+    # the first MovePose request is planned, then the board is removed
+    assert cache.lookup(start, goal, scene.version) is None
+    cache.store(start, goal, scene.version, 'trajectory')
+    scene.apply('board', 'panda_link0', [0.0, 0.0, 0.0], board)
+
+    assert cache.lookup(start, goal, scene.version) == 'trajectory'
+
+    scene.apply('board', 'panda_link0', [2.0, 2.0, 0.02], board)
+    assert cache.lookup(start, goal, scene.version) is None
+
+
+def test_plan_start_must_match_within_tolerance():
+    # both starts fall in the same bucket, but are too far apart
+    cache = PlanCache(start_tolerance=0.01)
+    goal = [0.5] * 7
+    cache.store([0.0] * 7, goal, 0, 'trajectory')
+
+    assert cache.lookup([0.009] * 7, goal, 0) == 'trajectory'
+    assert cache.lookup([0.0] * 6 + [0.02], goal, 0) is None
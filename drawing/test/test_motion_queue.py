@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from drawing.motion_queue import (CARTESIAN, cartesian_items, MotionItem,
+                                  MotionQueue)
+
+
+def queue_of(*names):
+    return MotionQueue(MotionItem(name) for name in names)
+
+
+def test_settings_stay_with_items_put_back():
+    queue = MotionQueue([MotionItem('a', 0.02, True, True),
+                         MotionItem('b', 0.03, False, True),
+                         MotionItem('c', 0.04, True, False),
+                         MotionItem('d', 0.05, False, False)])
+
+    # a stroke is taken, and the part of it not reached is put back
+    stroke = queue.take(3)
+    queue.extendleft(stroke[1:])
+
+    assert [(item.pose, item.velocity, item.use_force_control, item.replan)
+            for item in queue] == [('b', 0.03, False, True),
+                                   ('c', 0.04, True, False),
+                                   ('d', 0.05, False, False)]
+
+
+def test_missing_force_flags_default_to_off():
+    request = SimpleNamespace(poses=['a', 'b', 'c'], velocity=0.02,
+                              use_force_control=[True], replan=True)
+
+    items = cartesian_items(request)
+
+    assert [item.pose for item in items] == ['a', 'b', 'c']
+    assert [item.use_force_control for item in items] == \
+        [True, False, False]
+    assert all(item.velocity == 0.02 and item.replan and
+               item.source == CARTESIAN for item in items)
+
+
+def test_take_removes_items_in_order():
+    queue = queue_of('a', 'b', 'c')
+
+    assert [item.pose for item in queue.take(2)] == ['a', 'b']
+    assert [item.pose for item in queue.take(5)] == ['c']
+    assert not queue
+
+
+def test_peek_leaves_items_queued():
+    queue = queue_of('a', 'b', 'c')
+
+    first = queue.peek(2)
+
+    assert len(queue) == 3
+    assert queue.take(2) == first
+
+
+def test_extendleft_keeps_order():
+    queue = queue_of('c', 'd')
+
+    queue.extendleft(MotionItem(name) for name in ('a', 'b'))
+    queue.appendleft(MotionItem('start'))
+
+    assert [item.pose for item in queue] == ['start', 'a', 'b', 'c', 'd']
+    assert queue.popleft().pose == 'start'
@@ -0,0 +1,69 @@
+from drawing.glyph_atlas import Glyph, LETTERS, load_glyph_atlas
+from drawing.simplify import rdp, resample, segment_distances, simplify_glyph
+
+import numpy as np
+import pytest
+
+
+def max_deviation(original, simplified):
+    """Return how far the original points stray from the simplified path."""
+    return max(
+        min(segment_distances(p[None], a, b)[0]
+            for a, b in zip(simplified[:-1], simplified[1:]))
+        for p in original)
+
+
+def test_rdp_drops_collinear_points():
+    points = np.column_stack((np.linspace(0.0, 1.0, 11), np.zeros(11)))
+    assert rdp(points, 1e-6).tolist() == [True] + [False] * 9 + [True]
+
+
+def test_rdp_keeps_corners():
+    points = np.array([[0.0, 0.0], [0.5, 0.0], [1.0, 0.0], [1.0, 0.5],
+                       [1.0, 1.0]])
+    assert rdp(points, 1e-3).tolist() == [True, False, True, False, True]
+
+
+def test_resample_caps_spacing():
+    points = np.array([[0.0, 0.0], [0.1, 0.0], [0.1, 0.025]])
+    resampled = resample(points, 0.03)
+
+    steps = np.hypot(*np.diff(resampled, axis=0).T)
+    assert steps.max() <= 0.03 + 1e-12
+    np.testing.assert_allclose(resampled[[0, 4, -1]], points)
+
+
+def test_pen_up_points_are_kept():
+    glyph = Glyph([[0.0, 0.0], [0.01, 0.0], [0.02, 0.0], [0.02, 0.0],
+                   [0.02, 0.01], [0.02, 0.02]],
+                  [True, True, True, False, True, True])
+    simplified = simplify_glyph(glyph, 1e-4)
+
+    assert simplified.pen_down.tolist() == [True, True, False, True, True]
+    np.testing.assert_allclose(simplified.points[[1, 2, 3]],
+                               [[0.02, 0.0], [0.02, 0.0], [0.02, 0.01]])
+
+
+def test_waypoints_removed_per_glyph(tmp_path):
+    pytest.importorskip('matplotlib')
+    atlas = load_glyph_atlas('DejaVu Sans', cache_dir=str(tmp_path))
+    tolerance = 0.0005
+
+    print(f"\n{'glyph':>5} {'before':>6} {'after':>6} {'removed':>7}")
+    before_total = after_total = 0
+    for letter in LETTERS:
+        glyph = atlas[letter]
+        simplified = simplify_glyph(glyph, tolerance)
+        print(f"{letter:>5} {len(glyph):>6} {len(simplified):>6} "
+              f"{len(glyph) - len(simplified):>7}")
+        before_total += len(glyph)
+        after_total += len(simplified)
+
+        assert len(simplified) <= len(glyph)
+        if len(simplified) > 1:
+            assert max_deviation(glyph.points, simplified.points) <= \
+                tolerance + 1e-12
+    print(f"{'all':>5} {before_total:>6} {after_total:>6} "
+          f"{before_total - after_total:>7}")
+
+    assert after_total < before_total
@@ -0,0 +1,51 @@
+from drawing.glyph_atlas import Glyph
+from drawing.stroke_order import (glyph_contours, order_glyph, order_strokes,
+                                  travel)
+
+import numpy as np
+import pytest
+
+
+def test_strokes_are_chained_end_to_start():
+    # three dashes on a line, given out of order and pointing the wrong way
+    starts = np.array([[0.3, 0.0], [0.1, 0.0], [0.5, 0.0]])
+    ends = np.array([[0.2, 0.0], [0.0, 0.0], [0.4, 0.0]])
+
+    order, flipped = order_strokes(starts, ends)
+
+    assert travel(starts, ends, order, flipped) == pytest.approx(0.2)
+    assert travel(starts, ends, order, flipped) < \
+        travel(starts, ends, np.arange(3), np.zeros(3, dtype=bool))
+
+
+def test_fixed_direction_strokes_are_not_flipped():
+    starts = np.array([[1.0, 0.0], [0.0, 0.0], [2.0, 0.0]])
+    ends = starts + [0.5, 0.0]
+
+    order, flipped = order_strokes(starts, ends, reversible=False)
+
+    assert order.tolist() == [1, 0, 2]
+    assert not flipped.any()
+
+
+def test_origin_picks_the_first_stroke():
+    starts = np.array([[0.0, 0.0], [1.0, 0.0]])
+    ends = starts + [0.0, 0.1]
+
+    order, flipped = order_strokes(starts, ends, origin=np.array([1.0, 0.2]))
+
+    assert order[0] == 1 and flipped[1]
+
+
+def test_order_glyph_keeps_every_stroke():
+    glyph = Glyph.from_contours([
+        np.array([[0.0, 0.0], [0.0, 1.0]]),
+        np.array([[5.0, 0.0], [5.0, 1.0]]),
+        np.array([[0.1, 1.0], [0.1, 0.0]])])
+
+    ordered = order_glyph(glyph)
+
+    contours = glyph_contours(ordered)
+    assert len(contours) == 3
+    np.testing.assert_array_equal(contours[1], [[0.1, 1.0], [0.1, 0.0]])
+    assert len(ordered) == len(glyph)
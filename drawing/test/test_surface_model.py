@@ -0,0 +1,94 @@
+from drawing.surface_model import ContactSurface
+
+import numpy as np
+import pytest
+
+
+def test_flat_at_the_prior_depth_before_any_contact():
+    surface = ContactSurface(prior_depth=0.004)
+
+    np.testing.assert_allclose(surface.predict([0.0, 0.3], [0.0, 0.2]),
+                               [0.004, 0.004])
+
+
+def test_learns_a_tilted_board():
+    rng = np.random.default_rng(0)
+    surface = ContactSurface(prior_depth=0.004)
+
+    def depth(x, y):
+        return 0.002 + 0.01 * x - 0.005 * y
+
+    for _ in range(200):
+        x, y = rng.uniform(0.0, 0.5), rng.uniform(0.0, 0.3)
+        surface.update(x, y, depth(x, y) + rng.normal(0.0, 0.0003))
+
+    xs = np.array([0.05, 0.25, 0.45])
+    ys = np.array([0.25, 0.15, 0.05])
+    np.testing.assert_allclose(surface.predict(xs, ys), depth(xs, ys),
+                               atol=0.0003)
+
+
+def test_a_single_contact_moves_the_whole_board():
+    surface = ContactSurface(prior_depth=0.004)
+
+    surface.update(0.1, 0.1, 0.001)
+
+    # mostly through the offset, so nearby letters start deeper too
+    assert surface.predict(0.1, 0.1)[0] == pytest.approx(0.001, abs=0.0005)
+    assert surface.predict(0.2, 0.1)[0] < 0.003
+
+
+def test_second_order_fits_a_bow():
+    surface = ContactSurface(order=2, prior_depth=0.0)
+
+    def depth(x, y):
+        return 0.02 * (x - 0.25) ** 2 + 0.01 * (y - 0.15) ** 2
+
+    for x in np.linspace(0.0, 0.5, 11):
+        for y in np.linspace(0.0, 0.3, 7):
+            surface.update(x, y, depth(x, y))
+
+    assert surface.predict(0.25, 0.15)[0] == pytest.approx(0.0, abs=1e-4)
+    assert surface.predict(0.0, 0.0)[0] == \
+        pytest.approx(depth(0.0, 0.0), abs=1e-4)
+
+
+def test_predictions_are_limited():
+    surface = ContactSurface(prior_depth=0.004, limit=0.01)
+
+    for _ in range(50):
+        surface.update(0.0, 0.0, 0.0)
+        surface.update(0.01, 0.0, 0.001)
+
+    assert surface.predict(10.0, 0.0)[0] == pytest.approx(0.014)
+
+
+def test_forgetting_does_not_wind_up():
+    surface = ContactSurface(forgetting=0.9)
+
+    for _ in range(1000):
+        surface.update(0.1, 0.1, 0.004)
+
+    assert np.trace(surface.covariance) <= surface.max_trace + 1e-12
+
+
+def test_off_board_samples_are_rejected():
+    surface = ContactSurface(bounds=((0.0, 0.8), (0.0, 0.4)))
+
+    assert surface.accepts(0.3, 0.2, 0.005)
+    assert not surface.accepts(-0.1, 0.2, 0.004)
+    assert not surface.accepts(0.3, 0.5, 0.004)
+
+
+def test_samples_away_from_the_surface_are_rejected():
+    surface = ContactSurface(prior_depth=0.004, tolerance=0.003)
+
+    # the arm pushing against something in free space
+    assert not surface.accepts(0.3, 0.2, -0.05)
+    assert not surface.accepts(0.3, 0.2, 0.008)
+    assert surface.accepts(0.3, 0.2, 0.002)
+
+
+def test_unsupported_order():
+    with pytest.raises(ValueError):
+        ContactSurface(order=3)
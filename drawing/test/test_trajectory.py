@@ -0,0 +1,101 @@
+from drawing.trajectory import CompactTrajectory
+
+import numpy as np
+import pytest
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+
+JOINT_NAMES = [f'panda_joint{i}' for i in range(1, 8)]
+
+
+def planned_trajectory(count):
+    positions = np.linspace(0.0, 1.0, count * 7).reshape(count, 7)
+    return JointTrajectory(
+        joint_names=JOINT_NAMES,
+        points=[JointTrajectoryPoint(positions=row.tolist(),
+                                     velocities=(row * 0.1).tolist())
+                for row in positions])
+
+
+def test_whole_and_split_trajectories_match():
+    whole = planned_trajectory(5)
+    split = [JointTrajectory(joint_names=JOINT_NAMES, points=[point])
+             for point in whole.points]
+
+    a = CompactTrajectory.from_msgs([whole])
+    b = CompactTrajectory.from_msgs(split)
+
+    np.testing.assert_array_equal(a.positions, b.positions)
+    np.testing.assert_array_equal(a.velocities, b.velocities)
+    assert a.accelerations.shape == (5, 0)
+
+
+def test_point_messages_are_built_lazily():
+    whole = planned_trajectory(3)
+    trajectory = CompactTrajectory.from_msgs([whole])
+
+    head = trajectory[0]
+    assert head.joint_names == JOINT_NAMES
+    assert len(head.points) == 1
+    assert list(head.points[0].positions) == list(whole.points[0].positions)
+    assert head.points[0].time_from_start.nanosec == 100000000
+
+
+def test_changes_to_the_head_stick_until_it_is_popped():
+    trajectory = CompactTrajectory.from_msgs([planned_trajectory(3)])
+
+    trajectory[0].points[0].positions[5] = 2.0
+    popped = trajectory.pop(0)
+
+    assert popped.points[0].positions[5] == 2.0
+    assert len(trajectory) == 2
+    assert trajectory[0].points[0].positions[5] != 2.0
+
+
+def test_clear_empties_the_queue():
+    trajectory = CompactTrajectory.from_msgs([planned_trajectory(3)])
+    trajectory.clear()
+
+    assert not trajectory
+    with pytest.raises(IndexError):
+        trajectory[0]
+
+
+def timed_trajectory(times):
+    joint_trajectory = planned_trajectory(len(times))
+    for point, time in zip(joint_trajectory.points, times):
+        point.time_from_start.sec = int(time)
+        point.time_from_start.nanosec = int(round((time % 1.0) * 1e9))
+    return joint_trajectory
+
+
+def test_planned_times_are_kept():
+    trajectory = CompactTrajectory.from_msgs(
+        [timed_trajectory([0.0, 0.05, 0.15, 0.3])])
+
+    np.testing.assert_allclose(trajectory.times, [0.0, 0.05, 0.15, 0.3])
+
+
+def test_split_trajectories_are_stepped():
+    split = [JointTrajectory(joint_names=JOINT_NAMES, points=[point])
+             for point in timed_trajectory([0.1, 0.1, 0.1]).points]
+
+    trajectory = CompactTrajectory.from_msgs(split)
+
+    np.testing.assert_allclose(trajectory.times, [0.0, 0.1, 0.2])
+
+
+def test_chunks_are_timed_from_now():
+    trajectory = CompactTrajectory.from_msgs(
+        [timed_trajectory([0.0, 0.05, 0.15, 0.3, 0.5])])
+
+    assert trajectory.elapse(0.1) == 2
+    chunk = trajectory.chunk(2, 0.1)
+
+    assert len(chunk.points) == 2
+    assert chunk.points[0].time_from_start.nanosec == 50000000
+    assert chunk.points[1].time_from_start.nanosec == 200000000
+    assert list(chunk.points[0].positions) == \
+        list(trajectory[0].points[0].positions)
+
+    assert trajectory.elapse(1.0) == 3
+    assert not trajectory